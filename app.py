@@ -1,27 +1,70 @@
 # app.py
 # Import the required libraries
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Response, abort, current_app, make_response, render_template, request, redirect, url_for, flash, session, jsonify, g, get_flashed_messages, stream_template, send_file, send_from_directory
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import and_, or_, event, func, case, select, inspect, text, literal, literal_column, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, configure_mappers
 from flask_migrate import Migrate
-from datetime import datetime, date
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import safe_join
+from itsdangerous import BadSignature, URLSafeSerializer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, defaultdict, deque, namedtuple
+from datetime import datetime, date, timedelta
+from itertools import groupby, islice
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from multiprocessing import get_context
+import atexit
+import click
+import csv
+import gc
+import gzip
+import mimetypes
 import os
 import random
-import copy
+import re
+import hashlib
+import heapq
+import hmac
+import io
+import json
+import math
+import queue
+import socket
+import sys
+import threading
+import time
+import urllib.request
+import zipfile
 import pytz
 
+# flock-based write slots (see RATE LIMITING) need fcntl, which Windows lacks
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Setting the timezone for the quiz
 LOCAL_TZ = pytz.timezone('Asia/Kolkata')
 
-# Setting up the Flask Application
-app = Flask(__name__)
-app.config['SECRET_KEY'] = '#KAS22f3000668'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Initializing the database and migration extensions; they are bound to the app in create_app()
+db = SQLAlchemy()
+migrate = Migrate()
+
+# Routes are collected here and registered on the application in create_app(),
+# so endpoint names stay the plain view function names.
+_routes = []
 
-# Initializing the database and migration
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+def route(rule, **options):
+    def decorator(view_func):
+        _routes.append((rule, view_func, options))
+        return view_func
+    return decorator
 
 ##########################################
 #                MODELS                  #
@@ -33,8 +76,9 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # User's login name, must be unique and cannot be null
     username = db.Column(db.String(100), unique=True, nullable=False)
-    # Password for user authentication, required field
-    password = db.Column(db.String(100), nullable=False)
+    # Salted password hash for user authentication, required field.
+    # Rows created before hashing was introduced hold plaintext and are upgraded on the next login.
+    password = db.Column(db.String(256), nullable=False)
     # Full name of the user, optional field
     full_name = db.Column(db.String(100))
     # Educational or professional qualification of the user, optional field
@@ -47,7 +91,10 @@ class User(db.Model):
     points = db.Column(db.Integer, default=0)
     # Establishing a one-to-many relationship with the Score model;
     # A user can have multiple score records. The 'backref' allows reverse access.
-    scores = db.relationship('Score', backref='user', lazy=True, cascade="all, delete-orphan")
+    # Scores are removed with set-based deletes (see purge_user), so the ORM never loads them for a delete.
+    scores = db.relationship('Score', backref='user', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    # One-to-many relationship with the per-quiz best scores of the user.
+    best_scores = db.relationship('UserQuizBest', backref='user', lazy=True, cascade="all, delete-orphan")
 
 # Subject model for the subject
 class Subject(db.Model):
@@ -57,9 +104,12 @@ class Subject(db.Model):
     name = db.Column(db.String(100), nullable=False)
     # Detailed description of the subject; can include syllabus or other info
     description = db.Column(db.Text)
-    # Establishes a one-to-many relationship with the Chapter model.
-    # If a subject is deleted, all its associated chapters will also be deleted.
-    chapters = db.relationship('Chapter', backref='subject', lazy=True, cascade="all, delete-orphan")
+    # Set when the subject is soft-deleted and waiting for the background purge
+    deleted_at = db.Column(db.DateTime)
+    # Establishes a one-to-many relationship with the Chapter model, hiding soft-deleted chapters.
+    # Deleting a subject removes its chapters with set-based deletes (see delete_subject_tree).
+    chapters = db.relationship('Chapter', backref='subject', lazy=True, passive_deletes=True,
+                               primaryjoin="and_(Subject.id == Chapter.subject_id, Chapter.deleted_at.is_(None))")
 
 # Chapter model
 class Chapter(db.Model):
@@ -71,9 +121,12 @@ class Chapter(db.Model):
     name = db.Column(db.String(100), nullable=False)
     # Description of the chapter; optional field for additional details
     description = db.Column(db.Text)
-    # One-to-many relationship with the Quiz model.
-    # Deleting a chapter will cascade and delete all associated quizzes.
-    quizzes = db.relationship('Quiz', backref='chapter', lazy=True, cascade="all, delete-orphan")
+    # Set when the chapter is soft-deleted and waiting for the background purge
+    deleted_at = db.Column(db.DateTime)
+    # One-to-many relationship with the Quiz model, hiding soft-deleted quizzes.
+    # Deleting a chapter removes its quizzes with set-based deletes (see delete_chapter_tree).
+    quizzes = db.relationship('Quiz', backref='chapter', lazy=True, passive_deletes=True,
+                              primaryjoin="and_(Chapter.id == Quiz.chapter_id, Quiz.deleted_at.is_(None))")
 
 # Quiz model
 class Quiz(db.Model):
@@ -93,19 +146,33 @@ class Quiz(db.Model):
     question_limit = db.Column(db.Integer, nullable=False, default=10)
     # The scheduled start time for the quiz; this field is required
     scheduled_at = db.Column(db.DateTime, nullable=False)
+    # Set when the quiz is soft-deleted and waiting for the background purge
+    deleted_at = db.Column(db.DateTime)
+    # Where attempts draw their question_limit questions from: 'quiz' (own questions) or 'chapter'
+    # (all questions of the chapter's quizzes)
+    pool_scope = db.Column(db.String(20), default='quiz')
+    # Draw questions proportionally from each difficulty level of the pool
+    stratify_by_difficulty = db.Column(db.Boolean, default=False)
+    # Bumped whenever the question pool of the quiz changes; attempts regenerate their
+    # question and option order from (attempt seed, version)
+    version = db.Column(db.Integer, nullable=False, default=1)
     # One-to-many relationship with the Question model.
-    # All questions linked to this quiz will be deleted if the quiz is removed.
-    questions = db.relationship('Question', backref='quiz', lazy=True, cascade="all, delete-orphan")
+    # Questions are removed with the quiz by set-based deletes (see purge_quizzes).
+    questions = db.relationship('Question', backref='quiz', lazy=True, cascade="all, delete-orphan",
+                                passive_deletes=True)
     # One-to-many relationship with the Score model.
-    # Scores related to this quiz will also be removed if the quiz is deleted.
-    scores = db.relationship('Score', backref='quiz', lazy=True, cascade="all, delete-orphan")
+    # Scores are removed with the quiz by set-based deletes (see purge_quizzes).
+    scores = db.relationship('Score', backref='quiz', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    # Best scores and the score histogram of the quiz are removed together with the quiz.
+    best_scores = db.relationship('UserQuizBest', backref='quiz', lazy=True, cascade="all, delete-orphan")
+    score_histogram = db.relationship('QuizScoreHistogram', lazy=True, cascade="all, delete-orphan")
 
 # Question model
 class Question(db.Model):
     # Unique identifier for the question (primary key)
     id = db.Column(db.Integer, primary_key=True)
     # Foreign key linking the question to a specific quiz; quiz must exist
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     # The text of the question; required field
     question_statement = db.Column(db.Text, nullable=False)
     # Options for the answer
@@ -117,112 +184,2933 @@ class Question(db.Model):
     correct_option = db.Column(db.String(20))
     # Explanation for the correct answer, providing additional context
     explanation = db.Column(db.Text)
+    # Difficulty level (1 = easy, 2 = medium, 3 = hard); optional, used for stratified sampling
+    difficulty = db.Column(db.Integer)
 
 # Score model
 class Score(db.Model):
     # Unique identifier for the score record (primary key)
     id = db.Column(db.Integer, primary_key=True)
     # Foreign key linking the score to a specific quiz; quiz must exist
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     # Foreign key linking the score to a specific user; user must exist
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     # Timestamp when the quiz was attempted; defaults to current UTC time
     time_stamp_of_attempt = db.Column(db.DateTime, default=datetime.utcnow)
     # The total score achieved by the user in the quiz
     total_scored = db.Column(db.Integer)
+    # Seed and quiz version of the attempt; together they reproduce the questions and option order shown
+    attempt_seed = db.Column(db.Integer)
+    quiz_version = db.Column(db.Integer)
+
+# Attempts moved out of the Score table by the archival job ("flask archive-scores").
+# Same columns as Score, ids included; read through all_scores() together with the live rows.
+class ScoreArchive(db.Model):
+    __tablename__ = 'score_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    time_stamp_of_attempt = db.Column(db.DateTime)
+    total_scored = db.Column(db.Integer)
+    attempt_seed = db.Column(db.Integer)
+    quiz_version = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+# Daily totals of the archived attempts of a quiz, so charts over time keep their history
+# without reading the archive. Live attempts are aggregated from Score directly.
+class DailyQuizStat(db.Model):
+    __tablename__ = 'daily_quiz_stat'
+    day = db.Column(db.Date, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_scored = db.Column(db.Integer, nullable=False, default=0)
+
+# Best score of a user in a quiz.
+# One row per (user, quiz); the row is only rewritten when a new attempt beats the stored best.
+class UserQuizBest(db.Model):
+    __tablename__ = 'user_quiz_best'
+    # Composite primary key; also serves as the index for "all best scores of a user"
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True, index=True)
+    # Highest total_scored over all attempts of the user in the quiz
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    # Timestamp of the attempt that set the best score
+    achieved_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Histogram of best scores per quiz: how many users have a given best score.
+# Used to compute the percentile of a user within a quiz without scanning the Score table.
+class QuizScoreHistogram(db.Model):
+    __tablename__ = 'quiz_score_histogram'
+    # Composite primary key (quiz_id, score)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    score = db.Column(db.Integer, primary_key=True)
+    # Number of users whose best score in the quiz equals `score`
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+
+# Per-worker snapshot of the active-attempt tracker.
+# Each gunicorn worker rewrites its own rows; admins read the sum over recently updated workers.
+class ActiveAttemptStat(db.Model):
+    __tablename__ = 'active_attempt_stat'
+    # Worker identity ("host:pid") and quiz make up the primary key
+    worker_id = db.Column(db.String(64), primary_key=True)
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    # Event counters since the worker started
+    started = db.Column(db.Integer, nullable=False, default=0)
+    saved = db.Column(db.Integer, nullable=False, default=0)
+    submitted = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+    # Time of the last flush; rows of dead workers age out
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# Latest attempt of each student at each quiz, shared by all workers so an attempt started in one
+# worker and submitted in another is reconciled. Workers write their start and finish events in
+# batches; both writes only move the timestamps forward, so the order of the batches does not matter.
+class ActiveAttempt(db.Model):
+    __tablename__ = 'active_attempt'
+    quiz_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    # End of the quiz time plus ATTEMPT_EXPIRY_GRACE; unfinished attempts past it count as expired
+    deadline = db.Column(db.DateTime, nullable=False, index=True)
+    # Submission (or expiry) time; the attempt is in progress while this is null or before started_at
+    finished_at = db.Column(db.DateTime)
+    # Flush that counted the attempt as expired ("host:pid:n")
+    expired_by = db.Column(db.String(80), index=True)
+
+# Points awarded by attempts recorded in a score shard (partitioned mode only, see SCORE PARTITIONS).
+# Kept next to the attempts so a submission never writes to the main database; a user's points
+# are User.points plus the user's row in every shard.
+class ShardUserPoints(db.Model):
+    __tablename__ = 'user_points'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+
+# Version counter of a family of cached data ("catalog", "questions").
+# Writes bump the counter in their own transaction; workers drop their local copies when it changes.
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+    namespace = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Question pool of a quiz at one version, recorded when the first attempt draws from that version.
+# Attempts store only (seed, version); their paper is redrawn from this snapshot, so display,
+# submission and review see the same questions after the quiz has changed.
+class QuestionPoolSnapshot(db.Model):
+    __tablename__ = 'question_pool_snapshot'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)
+    # Draw settings of the quiz at that version
+    question_limit = db.Column(db.Integer)
+    stratify_by_difficulty = db.Column(db.Boolean, nullable=False, default=False)
+    # JSON list of [question id, difficulty] pairs, ordered by question id
+    questions = db.Column(db.Text, nullable=False)
+
+# Final submission of one attempt, keyed by the attempt seed.
+# The primary key makes the submission idempotent: a retried submission finds the row and gets the
+# original result instead of recording a second score.
+class QuizSubmission(db.Model):
+    __tablename__ = 'quiz_submission'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), primary_key=True, index=True)
+    attempt_seed = db.Column(db.Integer, primary_key=True)
+    # Result returned to every submission of the attempt
+    total_scored = db.Column(db.Integer, nullable=False)
+    question_count = db.Column(db.Integer, nullable=False)
+    submitted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Append-only log of student activity (logins, attempt starts, saves, submissions).
+# Rows are written in batches by the activity log's flush thread, never by the request itself.
+class ActivityEvent(db.Model):
+    __tablename__ = 'activity_log'
+    # Lookups are per user over a time range, or over everyone by time.
+    __table_args__ = (db.Index('ix_activity_log_user_time', 'user_id', 'occurred_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, index=True)
+    # No foreign keys: the log outlives deleted users and quizzes
+    user_id = db.Column(db.Integer)
+    quiz_id = db.Column(db.Integer)
+    event = db.Column(db.String(32), nullable=False)
+    # Free-form context, e.g. the client address or the score
+    detail = db.Column(db.String(255))
+
+# A client that exhausted its token bucket for an endpoint in one worker, blocked in all of them.
+# Rows are only written on a violation, so the table stays tiny.
+class RateLimitBlock(db.Model):
+    __tablename__ = 'rate_limit_block'
+    # "user:<id>" for logged-in clients, "ip:<address>" otherwise
+    client = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(64), primary_key=True)
+    # UTC time the block ends
+    until = db.Column(db.DateTime, nullable=False, index=True)
+
+# A heavy operation run in the background by the job runner (see BACKGROUND JOBS).
+# Jobs survive restarts: queued jobs, and running jobs of a worker that died, are picked up again.
+class Job(db.Model):
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    # Handler name (e.g. "purge_deleted") and its keyword arguments as JSON
+    kind = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    # queued, running, done, failed or cancelled
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    # Units of work done out of `total` (None while unknown), and the latest status line or error
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    # File produced by the job, relative to JOB_RESULT_DIR
+    result = db.Column(db.String(255))
+    # Set by an admin; the handler stops at its next progress report
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    # Admin who started the job (None for jobs started by the application)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Worker ("host:pid") running the job and the last time it confirmed it still does
+    worker = db.Column(db.String(64))
+    heartbeat_at = db.Column(db.DateTime)
 
 ##########################################
 #         INITIAL SETUP & DB             #
 ##########################################
 # Create the tables and initialize the admin
-@app.before_first_request
-def create_tables():
+
+# Columns added after the first release: (table, column, SQL type).
+# db.create_all() does not alter existing tables, so upgrade_schema() adds them to older databases.
+ADDED_COLUMNS = [
+    ('subject', 'deleted_at', 'DATETIME'),
+    ('chapter', 'deleted_at', 'DATETIME'),
+    ('quiz', 'deleted_at', 'DATETIME'),
+    ('quiz', 'pool_scope', "VARCHAR(20) DEFAULT 'quiz'"),
+    ('quiz', 'stratify_by_difficulty', 'BOOLEAN DEFAULT 0'),
+    ('question', 'difficulty', 'INTEGER'),
+    ('quiz', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('score', 'attempt_seed', 'INTEGER'),
+    ('score', 'quiz_version', 'INTEGER'),
+]
+
+# Add missing columns and indexes to a database created by an older version of the app.
+def upgrade_schema():
+    inspector = inspect(db.engine)
+    for table, column, sql_type in ADDED_COLUMNS:
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        if column not in existing:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {sql_type}'))
+    db.session.commit()
+    # active_attempt_stat lost its per-worker 'active' column (attempts in progress are in active_attempt).
+    # Its rows are rewritten by every flush, so an old table is simply recreated.
+    if 'active' in {col['name'] for col in inspector.get_columns('active_attempt_stat')}:
+        ActiveAttemptStat.__table__.drop(db.engine)
+        ActiveAttemptStat.__table__.create(db.engine)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+# Create the schema, upgrade older databases and bootstrap the default admin.
+# Run once per deployment with "flask --app app init-db" instead of on a worker's first request.
+def init_db():
     db.create_all()
+    upgrade_schema()
     # Check if an admin user already exists
     admin = User.query.filter_by(role='admin').first()
     # If no admin exists, create a default admin use
     if not admin:
-        default_admin = User(username='admin@example.com', password='admin', full_name='Quiz Master', role='admin')
+        default_admin = User(username='admin@example.com', password=generate_password_hash('admin'),
+                             full_name='Quiz Master', role='admin')
         # Add the default admin to the session
         db.session.add(default_admin)
         # Commit the transaction to persist the admin
         db.session.commit()
+    # One version counter per cache namespace
+    seed_cache_versions()
+    # Score tables of the shards (partitioned mode)
+    create_score_shards()
+    # Populate the best-score tables from existing attempts on databases created before they existed.
+    for score_session in score_router.sessions():
+        if score_session.query(UserQuizBest).first() is None and score_session.query(Score).first() is not None:
+            rebuild_best_scores(score_session)
+
+# True when soft-deleted subjects, chapters or quizzes are waiting for the purge.
+def purge_pending():
+    return Quiz.query.filter(Quiz.deleted_at.isnot(None)).first() is not None \
+        or Chapter.query.filter(Chapter.deleted_at.isnot(None)).first() is not None \
+        or Subject.query.filter(Subject.deleted_at.isnot(None)).first() is not None
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables, upgrade an older schema and create the default admin."""
+    init_db()
+    # Finish purges left over from a previous run.
+    if purge_pending():
+        purge_soft_deleted()
+    click.echo('Initialized the database.')
+
+##########################################
+#          PASSWORD VERIFICATION         #
+##########################################
+
+# Prefixes of the hash formats produced by werkzeug; any other stored value is a legacy plaintext password.
+PASSWORD_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+# Raised when too many logins are already waiting for a password verification.
+class LoginOverloaded(Exception):
+    pass
+
+# Process pool running the KDF and the semaphore bounding the logins admitted to it (created lazily per worker,
+# from a request thread, so its processes are spawned; see spawn_pool).
+_verify_pool = None
+_verify_slots = None
+_verify_pool_lock = threading.Lock()
+# Cache of recent successful verifications: key -> (expiry, stored password hash)
+_auth_cache = {}
+_auth_cache_lock = threading.Lock()
+
+# Return the verification pool and its admission semaphore, creating them on first use.
+def _get_verify_pool():
+    global _verify_pool, _verify_slots
+    if _verify_slots is None:
+        with _verify_pool_lock:
+            if _verify_slots is None:
+                workers = current_app.config['LOGIN_VERIFY_WORKERS']
+                if workers > 0:
+                    _verify_pool = spawn_pool(workers)
+                _verify_slots = threading.BoundedSemaphore(current_app.config['LOGIN_MAX_PENDING'])
+    return _verify_pool, _verify_slots
+
+# Run a CPU-heavy password function in the pool, admitting at most LOGIN_MAX_PENDING callers at a time.
+def _run_in_verify_pool(fn, *args):
+    global _verify_pool
+    pool, slots = _get_verify_pool()
+    if not slots.acquire(timeout=current_app.config['LOGIN_ADMISSION_TIMEOUT']):
+        raise LoginOverloaded()
+    try:
+        if pool is None:
+            return fn(*args)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A pool worker died; start a fresh pool for later calls and finish this one inline.
+            with _verify_pool_lock:
+                if _verify_pool is pool:
+                    _verify_pool = spawn_pool(current_app.config['LOGIN_VERIFY_WORKERS'])
+            return fn(*args)
+    finally:
+        slots.release()
+
+# Hash a password for storage.
+def hash_password(password):
+    return _run_in_verify_pool(generate_password_hash, password)
+
+# Key of the auth cache; keyed by an HMAC so the cache never holds plaintext passwords.
+def _auth_cache_key(username, password):
+    message = f'{username}\0{password}'.encode()
+    return hmac.new(current_app.config['SECRET_KEY'].encode(), message, hashlib.sha256).hexdigest()
+
+# Hash of a random password, verified against when the username is unknown so that the response
+# time does not tell which usernames exist. Created on the first such login in each process.
+_dummy_password_hash = None
+_dummy_password_hash_lock = threading.Lock()
+
+def dummy_password_hash():
+    global _dummy_password_hash
+    with _dummy_password_hash_lock:
+        if _dummy_password_hash is None:
+            _dummy_password_hash = hash_password(os.urandom(16).hex())
+        return _dummy_password_hash
+
+# Verify a login attempt for `user` (None when the username is unknown, which never succeeds).
+# Recently verified credentials are answered from the auth cache; plaintext rows are upgraded to a hash.
+# Raises LoginOverloaded when the verification pool is saturated.
+def check_login(user, password):
+    if user is None:
+        # Spend the same KDF time as a wrong password for an existing user.
+        _run_in_verify_pool(check_password_hash, dummy_password_hash(), password)
+        return False
+    key = _auth_cache_key(user.username, password)
+    now = time.monotonic()
+    with _auth_cache_lock:
+        entry = _auth_cache.get(key)
+    # A cache hit only counts while the stored hash is unchanged (e.g. no password reset since).
+    if entry and entry[0] > now and entry[1] == user.password:
+        return True
+    if user.password.startswith(PASSWORD_HASH_PREFIXES):
+        valid = _run_in_verify_pool(check_password_hash, user.password, password)
+    else:
+        # Legacy plaintext row: compare in constant time and store a hash on success.
+        valid = hmac.compare_digest(user.password.encode(), password.encode())
+        if valid:
+            user.password = hash_password(password)
+            db.session.commit()
+    if valid:
+        with _auth_cache_lock:
+            if len(_auth_cache) >= current_app.config['LOGIN_CACHE_SIZE']:
+                # Drop expired entries first; start over if the cache is still full.
+                for stale in [k for k, v in _auth_cache.items() if v[0] <= now]:
+                    del _auth_cache[stale]
+                if len(_auth_cache) >= current_app.config['LOGIN_CACHE_SIZE']:
+                    _auth_cache.clear()
+            _auth_cache[key] = (now + current_app.config['LOGIN_CACHE_TTL'], user.password)
+    return valid
+
+# Response for a login or registration turned away by admission control.
+def login_overloaded_response(template, **context):
+    flash('Too many sign-ins right now. Please try again in a few seconds.', 'warning')
+    response = make_response(render_template(template, **context), 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+##########################################
+#          RATE LIMITING                 #
+##########################################
+
+# Quiz endpoints (and methods) that write a Score. At most WRITE_MAX_INFLIGHT of them run at once
+# over all workers, so a burst of submissions queues briefly instead of piling up on the SQLite writer.
+QUIZ_WRITE_ENDPOINTS = {
+    'attempt_quiz': ('POST',),
+    'auto_submit_quiz': ('POST',),
+    'submit_quiz_attempt': ('POST',),
+}
+
+# Per-worker token buckets per (client, endpoint), with blocks shared through the database.
+# A bucket holds up to `capacity` tokens and refills completely in `per_seconds`; each request takes
+# one. When a bucket runs dry the worker records a block in rate_limit_block, and every worker
+# re-reads the live blocks at most every RATE_LIMIT_SYNC_INTERVAL seconds, so spreading requests
+# over the workers does not multiply the allowance for long.
+class RateLimiter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (client, endpoint) -> (tokens, monotonic time of the last update, monotonic time it is full again)
+        self._buckets = {}
+        # (client, endpoint) -> UTC end of the block, as of the last sync
+        self._blocks = {}
+        self._next_sync = 0.0
+
+    # Seconds the client has to wait before calling `endpoint` again; 0 when the call is admitted.
+    def acquire(self, client, endpoint, capacity, per_seconds):
+        self._sync()
+        key = (client, endpoint)
+        blocked_until = self._blocks.get(key)
+        if blocked_until is not None:
+            remaining = (blocked_until - datetime.utcnow()).total_seconds()
+            if remaining > 0:
+                return remaining
+        rate = capacity / per_seconds
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            admitted = tokens >= 1
+            if admitted:
+                tokens -= 1
+            if len(self._buckets) >= current_app.config['RATE_LIMIT_MAX_BUCKETS']:
+                # Full buckets are the same as no bucket.
+                for stale in [k for k, v in self._buckets.items() if v[2] <= now]:
+                    del self._buckets[stale]
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        if admitted:
+            return 0
+        wait = (1 - tokens) / rate
+        self._share_block(key, wait)
+        return wait
+
+    # Reload the live blocks written by all workers.
+    def _sync(self):
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + current_app.config['RATE_LIMIT_SYNC_INTERVAL']
+        rows = db.session.query(RateLimitBlock.client, RateLimitBlock.endpoint, RateLimitBlock.until).filter(
+            RateLimitBlock.until > datetime.utcnow()).all()
+        self._blocks = {(client, endpoint): until for client, endpoint, until in rows}
+
+    # Record a block for `wait` seconds unless an equally long one is already known.
+    def _share_block(self, key, wait):
+        now = datetime.utcnow()
+        until = now + timedelta(seconds=wait)
+        known = self._blocks.get(key)
+        if known is not None and known >= until:
+            return
+        self._blocks[key] = until
+        try:
+            db.session.execute(RateLimitBlock.__table__.delete().where(RateLimitBlock.until <= now))
+            db.session.merge(RateLimitBlock(client=key[0], endpoint=key[1], until=until))
+            db.session.commit()
+        except Exception:
+            # The local bucket still applies; other workers just learn about the block later.
+            db.session.rollback()
+
+rate_limiter = RateLimiter()
+
+# Slots bounding the quiz writes in flight on this host, shared by all workers: WRITE_MAX_INFLIGHT
+# lock files in WRITE_SLOT_DIR, each held with an exclusive flock by the request using it. The kernel
+# drops the locks of a worker that dies, so a killed worker never leaks a slot. Without fcntl
+# (Windows development servers) the slots are a semaphore of the process.
+class WriteSlots:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._semaphore = None
+        self._directory = None
+
+    # Take a slot, waiting up to `timeout` seconds; returns the slot's handle or None.
+    def acquire(self, timeout):
+        config = current_app.config
+        if fcntl is None:
+            with self._lock:
+                if self._semaphore is None:
+                    self._semaphore = threading.BoundedSemaphore(config['WRITE_MAX_INFLIGHT'])
+            return self._semaphore if self._semaphore.acquire(timeout=timeout) else None
+        if self._directory != config['WRITE_SLOT_DIR']:
+            os.makedirs(config['WRITE_SLOT_DIR'], exist_ok=True)
+            self._directory = config['WRITE_SLOT_DIR']
+        count = config['WRITE_MAX_INFLIGHT']
+        deadline = time.monotonic() + timeout
+        # Start at a random slot so concurrent requests do not all probe slot 0 first.
+        first = random.randrange(count)
+        while True:
+            for index in range(count):
+                path = os.path.join(self._directory, f'slot-{(first + index) % count}.lock')
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    os.close(fd)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(config['WRITE_SLOT_POLL_INTERVAL'])
+
+    def release(self, slot):
+        if fcntl is None:
+            slot.release()
+        else:
+            # Closing the descriptor releases its lock.
+            os.close(slot)
+
+write_slots = WriteSlots()
+
+# Response for a request turned away by rate limiting or write admission control.
+def too_many_requests(message, retry_after):
+    return Response(message, status=429, headers={'Retry-After': str(max(1, math.ceil(retry_after)))})
+
+# before_request hook: apply the token bucket of the endpoint (RATE_LIMITS), then take a write slot
+# for quiz submissions. The slot is released by release_write_slot when the request ends.
+def admit_request():
+    limit = current_app.config['RATE_LIMITS'].get(request.endpoint)
+    if limit:
+        client = f"user:{session['user_id']}" if session.get('user_id') else f'ip:{request.remote_addr}'
+        wait = rate_limiter.acquire(client, request.endpoint, *limit)
+        if wait:
+            return too_many_requests('Too many requests. Please slow down.', wait)
+    if request.method in QUIZ_WRITE_ENDPOINTS.get(request.endpoint, ()):
+        slot = write_slots.acquire(current_app.config['WRITE_ADMISSION_TIMEOUT'])
+        if slot is None:
+            return too_many_requests('The server is busy saving other submissions. Please retry.',
+                                     current_app.config['WRITE_RETRY_AFTER'])
+        g.write_slot = slot
+
+# teardown_request hook
+def release_write_slot(exc):
+    slot = g.pop('write_slot', None)
+    if slot is not None:
+        write_slots.release(slot)
+
+##########################################
+#          SCORE PARTITIONS              #
+##########################################
+# With SCORE_SHARDS > 0 the per-attempt tables (SHARDED_MODELS) live in SCORE_SHARDS separate
+# SQLite files (SQLAlchemy binds scores_0 ... scores_<n-1>) instead of database.db, so submissions
+# to different subjects (or quizzes, see SCORE_SHARD_KEY) take different write locks. All rows of
+# a quiz live in the shard picked by score_router.shard_of(); users, the catalog and everything
+# else stay in the main database. Writes go through score_router.session(quiz_id); readers that
+# span quizzes run on every session of score_router.sessions() and merge the results.
+# With SCORE_SHARDS = 0 (the default) both hand out db.session and nothing changes.
+
+SHARDED_MODELS = (Score, ScoreArchive, DailyQuizStat, UserQuizBest, QuizScoreHistogram, QuizSubmission,
+                  ShardUserPoints)
+
+# Name of the SQLAlchemy bind of a shard.
+def shard_bind_key(index):
+    return f'scores_{index}'
+
+# {quiz id: subject id} of every quiz, soft-deleted ones included; cached with the catalog.
+def load_quiz_subjects():
+    return dict(db.session.query(Quiz.id, Chapter.subject_id).join(Chapter, Chapter.id == Quiz.chapter_id))
+
+def quiz_subject(quiz_id):
+    subjects = cache_coherence.get('catalog', 'quiz_subjects', load_quiz_subjects)
+    if quiz_id in subjects:
+        return subjects[quiz_id]
+    # A quiz created by another worker since this worker's last catalog check.
+    return db.session.query(Chapter.subject_id).join(Quiz, Quiz.chapter_id == Chapter.id
+                                                     ).filter(Quiz.id == quiz_id).scalar()
+
+class ScoreRouter:
+    # Number of shards; 0 when the score tables are in the main database.
+    @property
+    def count(self):
+        return current_app.config['SCORE_SHARDS']
+
+    @property
+    def partitioned(self):
+        return self.count > 0
+
+    # Shard holding the rows of a quiz. Quizzes never move between chapters or subjects, so the
+    # shard of a quiz is fixed. Rows of a quiz that no longer exists are placed by quiz id.
+    def shard_of(self, quiz_id):
+        key = quiz_id
+        if current_app.config['SCORE_SHARD_KEY'] == 'subject':
+            key = quiz_subject(quiz_id)
+            if key is None:
+                key = quiz_id
+        return key % self.count
+
+    def engine(self, index):
+        return db.engines[shard_bind_key(index)]
+
+    # Session for the score rows of a quiz.
+    def session(self, quiz_id):
+        if not self.partitioned:
+            return db.session
+        return self._shard_session(self.shard_of(quiz_id))
+
+    # One session per shard, for fan-out reads and for writes that span quizzes.
+    def sessions(self):
+        if not self.partitioned:
+            return [db.session]
+        return [self._shard_session(index) for index in range(self.count)]
+
+    # Shard sessions are opened on first use and kept for the rest of the app context.
+    def _shard_session(self, index):
+        sessions = g.setdefault('score_sessions', {})
+        if index not in sessions:
+            sessions[index] = Session(bind=self.engine(index))
+        return sessions[index]
+
+    # Close the shard sessions of the app context. Runs at app-context teardown; background loops
+    # that keep one app context call it next to db.session.remove().
+    def remove(self, exc=None):
+        for shard_session in g.pop('score_sessions', {}).values():
+            shard_session.close()
+
+score_router = ScoreRouter()
+
+# Create the score tables in every shard.
+def create_score_shards():
+    tables = [model.__table__ for model in SHARDED_MODELS]
+    for index in range(score_router.count):
+        db.metadata.create_all(bind=score_router.engine(index), tables=tables)
+
+# Add points to a user, in the session that records the attempt.
+def award_points(score_session, user, points):
+    if not score_router.partitioned:
+        user.points += points
+        return
+    stmt = sqlite_insert(ShardUserPoints).values(user_id=user.id, points=points)
+    score_session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'], set_={'points': ShardUserPoints.points + stmt.excluded.points}))
+
+# {user id: points} of every user with role 'user', including the points kept in the shards.
+def user_points():
+    points = Counter(dict(db.session.query(User.id, func.coalesce(User.points, 0)).filter(User.role == 'user')))
+    if score_router.partitioned:
+        for score_session in score_router.sessions():
+            for user_id, shard_points in score_session.query(ShardUserPoints.user_id, ShardUserPoints.points):
+                if user_id in points:
+                    points[user_id] += shard_points
+    return points
+
+# Move the per-attempt rows of the main database into the shards, `chunk_size` rows per
+# transaction. Each chunk is inserted into its shards (rows already there are skipped) before it is
+# deleted from the main database, so an interrupted split can simply be run again.
+# Points stay in User.points. Returns {table name: rows moved}.
+def split_scores(chunk_size):
+    moved = Counter()
+    rowid = literal_column('rowid')
+    for model in SHARDED_MODELS:
+        if model is ShardUserPoints:
+            continue
+        table = model.__table__
+        while True:
+            rows = db.session.execute(select(rowid, *table.c).order_by(rowid).limit(chunk_size)).all()
+            if not rows:
+                break
+            by_shard = defaultdict(list)
+            for row in rows:
+                values = dict(row._mapping)
+                del values['rowid']
+                by_shard[score_router.shard_of(values['quiz_id'])].append(values)
+            for index, values in by_shard.items():
+                with score_router.engine(index).begin() as connection:
+                    connection.execute(sqlite_insert(table).on_conflict_do_nothing(), values)
+            db.session.execute(table.delete().where(rowid.in_([row.rowid for row in rows])))
+            db.session.commit()
+            moved[table.name] += len(rows)
+    return moved
+
+# Run once with the application stopped, after setting SCORE_SHARDS (and SCORE_SHARD_KEY).
+@click.command('split-scores')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Rows moved per transaction.')
+@with_appcontext
+def split_scores_command(chunk_size):
+    """Move the quiz attempts of the main database into the score shards."""
+    if not score_router.partitioned:
+        raise click.ClickException('Set SCORE_SHARDS (e.g. FLASK_SCORE_SHARDS=4) to the number of shards first.')
+    create_score_shards()
+    moved = split_scores(chunk_size)
+    for table_name, rows in moved.items():
+        click.echo(f'{table_name}: moved {rows} rows')
+    click.echo(f'Split the score tables into {score_router.count} shards by {current_app.config["SCORE_SHARD_KEY"]}.')
+
+##########################################
+#          SCORING HELPERS               #
+##########################################
+
+# Add `delta` users to the histogram bucket (quiz_id, score).
+def _bump_score_histogram(score_session, quiz_id, score, delta):
+    bucket = score_session.get(QuizScoreHistogram, (quiz_id, score))
+    if bucket is None:
+        bucket = QuizScoreHistogram(quiz_id=quiz_id, score=score, user_count=0)
+        score_session.add(bucket)
+    bucket.user_count += delta
+
+# Update the best score of a user in a quiz after a new attempt.
+# Nothing is written unless the attempt beats the stored best.
+def update_best_score(score_session, user_id, quiz_id, score):
+    best = score_session.get(UserQuizBest, (user_id, quiz_id))
+    if best is None:
+        score_session.add(UserQuizBest(user_id=user_id, quiz_id=quiz_id, best_score=score))
+        _bump_score_histogram(score_session, quiz_id, score, 1)
+    elif score > best.best_score:
+        _bump_score_histogram(score_session, quiz_id, best.best_score, -1)
+        _bump_score_histogram(score_session, quiz_id, score, 1)
+        best.best_score = score
+        best.achieved_at = datetime.utcnow()
+
+# Record a finished attempt: award points, store the Score row and maintain the best-score tables.
+# `quiz_version` is the version the attempt's paper was drawn at (default: the current one).
+# Everything goes through the quiz's score session; the caller commits it
+# (score_router.session(quiz.id).commit()).
+def record_quiz_score(user, quiz, score, attempt_seed=None, quiz_version=None):
+    score_session = score_router.session(quiz.id)
+    # Award points (example: 10 per correct answer)
+    award_points(score_session, user, score * 10)
+    new_score = Score(quiz_id=quiz.id, user_id=user.id, total_scored=score, attempt_seed=attempt_seed,
+                      quiz_version=quiz.version if quiz_version is None else quiz_version)
+    score_session.add(new_score)
+    update_best_score(score_session, user.id, quiz.id, score)
+    return new_score
+
+# Remove a user's entries from the score histograms of one score session before the user is deleted.
+def forget_best_scores(score_session, user_id):
+    for best in score_session.query(UserQuizBest).filter_by(user_id=user_id).all():
+        _bump_score_histogram(score_session, best.quiz_id, best.best_score, -1)
+
+# Rebuild the best-score and histogram tables of one score session from all its attempts
+# (live and archived) with two set-based statements.
+def rebuild_best_scores(score_session):
+    score_session.query(UserQuizBest).delete()
+    score_session.query(QuizScoreHistogram).delete()
+    scores = all_scores()
+    best_select = select(
+        scores.c.user_id,
+        scores.c.quiz_id,
+        func.max(scores.c.total_scored),
+        func.max(scores.c.time_stamp_of_attempt)
+    ).group_by(scores.c.user_id, scores.c.quiz_id)
+    score_session.execute(UserQuizBest.__table__.insert().from_select(
+        ['user_id', 'quiz_id', 'best_score', 'achieved_at'], best_select))
+    histogram_select = select(
+        UserQuizBest.quiz_id,
+        UserQuizBest.best_score,
+        func.count()
+    ).group_by(UserQuizBest.quiz_id, UserQuizBest.best_score)
+    score_session.execute(QuizScoreHistogram.__table__.insert().from_select(
+        ['quiz_id', 'score', 'user_count'], histogram_select))
+    score_session.commit()
 
 # Route to view details for a specific subject
-@app.route('/admin/subject/view/<int:subject_id>')
+@route('/admin/subject/view/<int:subject_id>')
 def view_subject(subject_id):
     # Check if the current session has an admin role
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the subject by its ID, or return a 404 error if not founds
-    subject = Subject.query.get_or_404(subject_id)
+    subject = get_live_or_404(Subject, subject_id)
     # Render the template to display subject details along with its chapters
     return render_template('subject_details.html', subject=subject)
 
 # View details for a specific chapter (list its quizzes)
-@app.route('/admin/chapter/view/<int:chapter_id>')
+@route('/admin/chapter/view/<int:chapter_id>')
 def view_chapter(chapter_id):
     # Ensure that only an admin can access this route
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the chapter by its ID or return a 404 error if not found
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = get_live_or_404(Chapter, chapter_id)
     # Render the template showing details of the chapter and its quizzes
     return render_template('chapter_details.html', chapter=chapter)
 
 # View details for a specific quiz (list its questions)
-@app.route('/admin/quiz/view/<int:quiz_id>')
+@route('/admin/quiz/view/<int:quiz_id>')
 def view_quiz(quiz_id):
     # Only allow admin users to access this route
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the quiz by its ID or return a 404 error if not found
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_live_or_404(Quiz, quiz_id)
     # Render the template to display quiz details including its questions
     return render_template('quiz_details.html', quiz=quiz)
 
 # Route to view all questions for a specific chapter by aggregating questions from all its quizzes
-@app.route('/admin/chapter/questions/<int:chapter_id>')
+@route('/admin/chapter/questions/<int:chapter_id>')
 def view_chapter_questions(chapter_id):
     # Verify that the user is an admin before allowing access
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the chapter using its ID or return a 404 error if not found
-    chapter = Chapter.query.get_or_404(chapter_id)
-    questions = []
-    # Loop through each quiz in the chapter and collect all questions
-    for quiz in chapter.quizzes:
-        questions.extend(quiz.questions)
-    # Render the template to display all questions associated with the chapter
-    return render_template('chapter_questions.html', chapter=chapter, questions=questions)
+    chapter = get_live_or_404(Chapter, chapter_id)
+    # Stream the questions of all live quizzes in the chapter, quiz by quiz
+    return stream_page('chapter_questions.html', chapter=chapter,
+                       questions=iter_chapter_questions(chapter.id))
+
+
+##########################################
+#          CACHE COHERENCE               #
+##########################################
+
+# Namespaces of cached data shared by all workers:
+#   catalog   - subjects, chapters and quizzes (names, descriptions, schedules)
+#   questions - question content and the question pools drawn from it
+CACHE_NAMESPACES = ('catalog', 'questions')
+
+def seed_cache_versions():
+    existing = {namespace for (namespace,) in db.session.query(CacheVersion.namespace)}
+    for namespace in CACHE_NAMESPACES:
+        if namespace not in existing:
+            db.session.add(CacheVersion(namespace=namespace, version=0))
+    db.session.commit()
+
+# Mark cached data as changed, in the caller's transaction: the bump commits (or rolls back)
+# together with the write, so no worker drops its copy before the new data is visible.
+def bump_cache_version(*namespaces):
+    db.session.execute(CacheVersion.__table__.update().where(
+        CacheVersion.namespace.in_(namespaces)).values(version=CacheVersion.version + 1))
+    # Re-check on this worker's next request instead of waiting for the interval.
+    cache_coherence.recheck()
+
+# Per-process caches kept coherent with the version counters.
+# Each namespace has a dict of cached values plus any external caches registered with on_change();
+# check() reads all counters (one small query, at most every CACHE_CHECK_INTERVAL seconds) and
+# empties the namespaces whose counter moved since the last check.
+class CacheCoherence:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {namespace: {} for namespace in CACHE_NAMESPACES}
+        self._handlers = defaultdict(list)
+        self._seen = {}
+        self._next_check = 0.0
+
+    # Call `handler` whenever `namespace` changes.
+    def on_change(self, namespace, handler):
+        self._handlers[namespace].append(handler)
+
+    # Cached value of `key`, computed by `loader` on a miss.
+    # The dict of a namespace is replaced (not cleared) on a change, so a loader that raced the
+    # change stores its result in the discarded dict.
+    def get(self, namespace, key, loader):
+        entries = self._entries[namespace]
+        try:
+            return entries[key]
+        except KeyError:
+            value = entries[key] = loader()
+            return value
+
+    def recheck(self):
+        self._next_check = 0.0
+
+    def check(self, interval):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + interval
+        versions = dict(db.session.execute(select(CacheVersion.namespace, CacheVersion.version)).all())
+        for namespace in CACHE_NAMESPACES:
+            version = versions.get(namespace, 0)
+            if self._seen.get(namespace) != version:
+                self._seen[namespace] = version
+                self._entries[namespace] = {}
+                for handler in self._handlers[namespace]:
+                    handler()
+
+cache_coherence = CacheCoherence()
+
+# before_request hook: drop local entries changed by other workers.
+def check_cache_versions():
+    cache_coherence.check(current_app.config['CACHE_CHECK_INTERVAL'])
+
+##########################################
+#          QUESTION POOLS                #
+##########################################
+
+# Question pool of a quiz version: its question ids (ordered by id), the ids grouped by difficulty
+# and the draw settings of that version.
+QuestionPool = namedtuple('QuestionPool', ['ids', 'strata', 'question_limit', 'stratify_by_difficulty'])
+
+# Cached pools: (quiz id, version) -> (expiry, QuestionPool)
+_question_pools = {}
+_question_pools_lock = threading.Lock()
+
+# Record the pool the quiz draws from as the snapshot of its version.
+# Only (id, difficulty) pairs are read. Pool changes bump the quiz version in the same transaction,
+# so the snapshot is only inserted while the quiz row still has the version it was loaded with.
+# Returns the snapshot, or None if the quiz has changed since it was loaded.
+def _snapshot_question_pool(quiz):
+    query = db.session.query(Question.id, Question.difficulty)
+    if quiz.pool_scope == 'chapter':
+        query = query.join(Quiz, Quiz.id == Question.quiz_id).filter(
+            Quiz.chapter_id == quiz.chapter_id, Quiz.deleted_at.is_(None))
+    else:
+        query = query.filter(Question.quiz_id == quiz.id)
+    questions = json.dumps([tuple(pair) for pair in query.order_by(Question.id)], separators=(',', ':'))
+    current = select(Quiz.id, Quiz.version, Quiz.question_limit, func.coalesce(Quiz.stratify_by_difficulty, False),
+                     literal(questions)).where(Quiz.id == quiz.id, Quiz.version == quiz.version)
+    with db.engine.begin() as connection:
+        inserted = connection.execute(sqlite_insert(QuestionPoolSnapshot).from_select(
+            ['quiz_id', 'version', 'question_limit', 'stratify_by_difficulty', 'questions'],
+            current).on_conflict_do_nothing()).rowcount
+    if inserted:
+        return QuestionPoolSnapshot(quiz_id=quiz.id, version=quiz.version, question_limit=quiz.question_limit,
+                                    stratify_by_difficulty=bool(quiz.stratify_by_difficulty), questions=questions)
+    # Another worker recorded this version first, or the quiz has moved on.
+    return db.session.get(QuestionPoolSnapshot, (quiz.id, quiz.version))
+
+# Pool of the quiz at `version` (by default `quiz.version`), cached for QUESTION_POOL_TTL seconds.
+# Pools of past versions come from their snapshot; the current pool is recorded on first use.
+# Returns None for a past version that no attempt ever drew from.
+def question_pool(quiz, version=None):
+    key = (quiz.id, quiz.version if version is None else version)
+    now = time.monotonic()
+    with _question_pools_lock:
+        entry = _question_pools.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    snapshot = db.session.get(QuestionPoolSnapshot, key)
+    if snapshot is None and key[1] == quiz.version:
+        snapshot = _snapshot_question_pool(quiz)
+    if snapshot is None:
+        return None
+    strata = defaultdict(list)
+    ids = []
+    for question_id, difficulty in json.loads(snapshot.questions):
+        ids.append(question_id)
+        strata[difficulty].append(question_id)
+    pool = QuestionPool(tuple(ids), {difficulty: tuple(members) for difficulty, members in strata.items()},
+                        snapshot.question_limit, snapshot.stratify_by_difficulty)
+    with _question_pools_lock:
+        # Drop expired pools (e.g. of older versions) before the cache grows large.
+        if len(_question_pools) >= 1000:
+            for stale in [k for k, v in _question_pools.items() if v[0] <= now]:
+                del _question_pools[stale]
+        _question_pools[key] = (now + current_app.config['QUESTION_POOL_TTL'], pool)
+    return pool
+
+# Forget cached pools after questions or quizzes change (a purged quiz's id may be reused).
+def invalidate_question_pools():
+    with _question_pools_lock:
+        _question_pools.clear()
+
+cache_coherence.on_change('questions', invalidate_question_pools)
 
+# Record a change to the question pool of quiz `quiz_id` (or, without it, only to the shared pool of
+# the chapter) in the caller's transaction: bump the version of that quiz and of the quizzes of the
+# chapter that draw from the chapter pool, and the "questions" cache namespace. Quizzes of the
+# chapter with their own pool keep their version.
+def question_pool_changed(chapter_id, quiz_id=None):
+    affected = and_(Quiz.chapter_id == chapter_id, Quiz.pool_scope == 'chapter')
+    if quiz_id is not None:
+        affected = or_(Quiz.id == quiz_id, affected)
+    db.session.execute(Quiz.__table__.update().where(affected).values(version=Quiz.version + 1))
+    bump_cache_version('questions')
+
+# Draw question ids from a pool: question_limit ids in random order.
+# random.sample picks k ids from the cached tuple without touching the rest of the pool;
+# pass a seeded `rng` to make the draw reproducible.
+def sample_question_ids(pool, rng=random):
+    ids, strata = pool.ids, pool.strata
+    k = pool.question_limit if pool.question_limit and pool.question_limit < len(ids) else len(ids)
+    if not pool.stratify_by_difficulty or len(strata) < 2 or k == len(ids):
+        return rng.sample(ids, k)
+    # Split k over the difficulty levels in proportion to their size (largest remainder first).
+    quotas = {difficulty: k * len(members) / len(ids) for difficulty, members in strata.items()}
+    counts = {difficulty: int(quota) for difficulty, quota in quotas.items()}
+    by_remainder = sorted(quotas, key=lambda difficulty: quotas[difficulty] - counts[difficulty], reverse=True)
+    for difficulty in by_remainder[:k - sum(counts.values())]:
+        counts[difficulty] += 1
+    chosen = []
+    for difficulty in sorted(counts, key=lambda difficulty: (difficulty is None, difficulty or 0)):
+        chosen.extend(rng.sample(strata[difficulty], counts[difficulty]))
+    rng.shuffle(chosen)
+    return chosen
+
+##########################################
+#          ATTEMPT PERMUTATIONS          #
+##########################################
+# An attempt is stored as [seed, quiz version, start time]. Its questions and the order of each
+# question's options are regenerated from seed and version whenever they are needed (display,
+# auto-submit, review).
+
+_seed_source = random.SystemRandom()
+
+# Seed of a new attempt; 48 bits keeps it well inside SQLite's integer range.
+def new_attempt_seed():
+    return _seed_source.getrandbits(48)
+
+# Deterministic generator for one use of an attempt seed.
+# String seeds are hashed with SHA-512 by random.Random, so results do not depend on PYTHONHASHSEED.
+def _attempt_rng(seed, *parts):
+    return random.Random(':'.join(str(part) for part in (seed,) + parts))
+
+# Question ids of the attempt, in the order shown to the student, drawn from the pool of quiz `version`.
+# Attempts at a version without a snapshot (begun before snapshots were recorded) draw from the
+# current pool.
+def attempt_question_ids(quiz, seed, version):
+    pool = question_pool(quiz, version) or question_pool(quiz)
+    if pool is None:
+        return []
+    return sample_question_ids(pool, _attempt_rng(seed, 'questions', quiz.id, version))
+
+# (option_key, option_text) pairs of a question, in the order shown to the student.
+def attempt_options(question, seed):
+    options = [(key, getattr(question, key)) for key in ('option1', 'option2', 'option3', 'option4')
+               if getattr(question, key)]
+    _attempt_rng(seed, 'options', question.id).shuffle(options)
+    return options
+
+# Questions of a paper (question ids in display order), with their options in display order.
+# Questions deleted since the paper was drawn are left out.
+def paper_questions(question_ids, seed):
+    questions_by_id = {q.id: q for q in Question.query.filter(Question.id.in_(question_ids))} if question_ids else {}
+    return [(questions_by_id[qid], attempt_options(questions_by_id[qid], seed))
+            for qid in question_ids if qid in questions_by_id]
+
+# Questions of the attempt, in display order.
+def attempt_questions(quiz, seed, version):
+    return paper_questions(attempt_question_ids(quiz, seed, version), seed)
+
+##########################################
+#          OFFLINE ATTEMPTS              #
+##########################################
+# The attempt page (or the JSON bundle) carries everything the browser needs to finish the quiz
+# offline: the questions without their answers and a signed attempt token. Answers are kept in
+# the browser's localStorage and sent once, with the token, when the student submits.
+
+# Seconds of a quiz's "HH:MM" duration.
+def quiz_duration_seconds(quiz):
+    parts = quiz.time_duration.split(':')
+    return int(parts[0]) * 3600 + int(parts[1]) * 60
+
+# Start the session's attempt at `quiz` if there is none.
+# The attempt is stored as [seed, quiz version, start time]; the version pins its paper until the
+# attempt is submitted, even if the quiz changes meanwhile.
+# Returns (seed, quiz version, start time, True if the attempt was just started).
+def attempt_state(quiz):
+    attempt_key = f'quiz_attempt_{quiz.id}'
+    started = attempt_key not in session
+    if started:
+        if question_pool(quiz) is None:
+            # The quiz changed since it was loaded: start the attempt at its new version.
+            db.session.refresh(quiz)
+            question_pool(quiz)
+        session[attempt_key] = [new_attempt_seed(), quiz.version, int(time.time())]
+    state = session[attempt_key]
+    if len(state) != 3:
+        # Attempts begun without a recorded start time count from now; question ids stored by
+        # older releases are dropped.
+        state = (state + [int(time.time())])[:3]
+        session[attempt_key] = state
+    seed, version, start = state
+    return seed, version, start, started
+
+def _attempt_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='quiz-attempt')
+
+# Signed token naming the attempt: user, quiz, seed, quiz version and start time.
+def attempt_token(user_id, quiz_id, seed, version, start):
+    return _attempt_serializer().dumps([user_id, quiz_id, seed, version, start])
+
+# (seed, version, start) of a valid token for this user and quiz, or None.
+# Question ids carried by tokens of older releases are ignored.
+def load_attempt_token(token, user_id, quiz_id):
+    try:
+        token_user, token_quiz, seed, version, start = _attempt_serializer().loads(token)[:5]
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if token_user != user_id or token_quiz != quiz_id:
+        return None
+    return seed, version, start
+
+# The answer-free paper of an attempt.
+def attempt_bundle(quiz, seed, version, start):
+    duration = quiz_duration_seconds(quiz)
+    return {
+        'quiz_id': quiz.id,
+        'version': version,
+        'token': attempt_token(session['user_id'], quiz.id, seed, version, start),
+        'started_at': start,
+        'deadline': start + duration,
+        'duration_seconds': duration,
+        'submit_url': url_for('submit_quiz_attempt', quiz_id=quiz.id),
+        'sync_url': url_for('sync_quiz_answers', quiz_id=quiz.id),
+        'questions': [{'id': question.id,
+                       'question_statement': question.question_statement,
+                       'options': options}
+                      for question, options in attempt_questions(quiz, seed, version)],
+    }
+
+# Answers of a submission as {question id: option key}; anything else is dropped.
+def clean_answers(answers):
+    if not isinstance(answers, dict):
+        return {}
+    return {str(question_id): answer for question_id, answer in answers.items()
+            if isinstance(answer, str) and answer in ('option1', 'option2', 'option3', 'option4')}
+
+# Grade and record the final submission of an attempt, once, against its paper (drawn from the
+# pool of quiz `version`).
+# Returns (submission, True) for a new submission and (existing submission, False) for a retry.
+def submit_attempt(user, quiz, seed, answers, version):
+    score_session = score_router.session(quiz.id)
+    existing = score_session.get(QuizSubmission, (user.id, quiz.id, seed))
+    if existing is not None:
+        return existing, False
+    questions = attempt_questions(quiz, seed, version)
+    score = sum(1 for question, _ in questions if answers.get(str(question.id)) == question.correct_option)
+    submission = QuizSubmission(user_id=user.id, quiz_id=quiz.id, attempt_seed=seed,
+                                total_scored=score, question_count=len(questions))
+    score_session.add(submission)
+    try:
+        # Claim the attempt before touching points and best scores.
+        score_session.flush()
+    except IntegrityError:
+        # A concurrent retry of the same submission got there first.
+        score_session.rollback()
+        return score_session.get(QuizSubmission, (user.id, quiz.id, seed)), False
+    record_quiz_score(user, quiz, score, attempt_seed=seed, quiz_version=version)
+    score_session.commit()
+    return submission, True
+
+##########################################
+#          DELETES & PURGE               #
+##########################################
+
+# Maximum number of ids bound into one IN (...) clause.
+ID_BATCH = 500
+
+# Fetch a subject, chapter or quiz by id; soft-deleted rows are treated as missing.
+def get_live_or_404(model, object_id):
+    obj = model.query.get_or_404(object_id)
+    if obj.deleted_at is not None:
+        abort(404)
+    return obj
+
+# Delete rows of `model` matching `criterion`, PURGE_CHUNK_SIZE rows per transaction,
+# so a large delete never holds the SQLite write lock for long.
+# Runs on `db_session` (a score session) or the main session.
+def _delete_in_chunks(model, criterion, db_session=None):
+    db_session = db_session or db.session
+    chunk = current_app.config['PURGE_CHUNK_SIZE']
+    while True:
+        victims = select(model.id).where(criterion).limit(chunk)
+        result = db_session.execute(model.__table__.delete().where(model.id.in_(victims)))
+        db_session.commit()
+        if result.rowcount < chunk:
+            break
+
+# Remove quizzes together with their questions, scores and best-score rows using set-based deletes.
+# The score rows are deleted in every score session; the quizzes may be spread over the shards.
+# `progress(done, total)` is called after every batch of quizzes.
+def purge_quizzes(quiz_ids, progress=None):
+    for start in range(0, len(quiz_ids), ID_BATCH):
+        if progress:
+            progress(start, len(quiz_ids))
+        batch = quiz_ids[start:start + ID_BATCH]
+        for score_session in score_router.sessions():
+            _delete_in_chunks(Score, Score.quiz_id.in_(batch), score_session)
+            _delete_in_chunks(ScoreArchive, ScoreArchive.quiz_id.in_(batch), score_session)
+            score_session.execute(DailyQuizStat.__table__.delete().where(DailyQuizStat.quiz_id.in_(batch)))
+            score_session.execute(QuizSubmission.__table__.delete().where(QuizSubmission.quiz_id.in_(batch)))
+            score_session.execute(UserQuizBest.__table__.delete().where(UserQuizBest.quiz_id.in_(batch)))
+            score_session.execute(QuizScoreHistogram.__table__.delete().where(QuizScoreHistogram.quiz_id.in_(batch)))
+            score_session.commit()
+        _delete_in_chunks(Question, Question.quiz_id.in_(batch))
+        db.session.execute(ActiveAttempt.__table__.delete().where(ActiveAttempt.quiz_id.in_(batch)))
+        db.session.execute(QuestionPoolSnapshot.__table__.delete().where(QuestionPoolSnapshot.quiz_id.in_(batch)))
+        db.session.execute(Quiz.__table__.delete().where(Quiz.id.in_(batch)))
+        db.session.commit()
+
+# Number of question and score rows hanging off the given quizzes.
+def _quiz_tree_size(quiz_ids):
+    size = 0
+    for start in range(0, len(quiz_ids), ID_BATCH):
+        batch = quiz_ids[start:start + ID_BATCH]
+        size += db.session.query(func.count(Question.id)).filter(Question.quiz_id.in_(batch)).scalar()
+        for score_session in score_router.sessions():
+            size += score_session.query(func.count(Score.id)).filter(Score.quiz_id.in_(batch)).scalar()
+    return size
+
+# Delete a set of quizzes, chapters and subjects (the ids of one deleted tree).
+# Small trees are purged inline; large ones are marked deleted and purged by a background job.
+# Returns True when the purge was deferred.
+def _delete_tree(subject_ids, chapter_ids, quiz_ids):
+    if _quiz_tree_size(quiz_ids) > current_app.config['PURGE_INLINE_LIMIT']:
+        bump_cache_version('catalog', 'questions')
+        now = datetime.utcnow()
+        for model, ids in ((Subject, subject_ids), (Chapter, chapter_ids), (Quiz, quiz_ids)):
+            for start in range(0, len(ids), ID_BATCH):
+                db.session.execute(model.__table__.update().where(
+                    model.id.in_(ids[start:start + ID_BATCH])).values(deleted_at=now))
+        db.session.commit()
+        request_purge()
+        return True
+    purge_quizzes(quiz_ids)
+    bump_cache_version('catalog', 'questions')
+    for model, ids in ((Chapter, chapter_ids), (Subject, subject_ids)):
+        for start in range(0, len(ids), ID_BATCH):
+            db.session.execute(model.__table__.delete().where(model.id.in_(ids[start:start + ID_BATCH])))
+    db.session.commit()
+    leaderboard_broadcaster.notify()
+    return False
+
+def delete_quiz_tree(quiz_id):
+    # The quiz's questions leave the chapter pool of its chapter.
+    chapter_id = db.session.query(Quiz.chapter_id).filter(Quiz.id == quiz_id).scalar()
+    question_pool_changed(chapter_id)
+    return _delete_tree([], [], [quiz_id])
+
+def delete_chapter_tree(chapter_id):
+    quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).filter(Quiz.chapter_id == chapter_id)]
+    return _delete_tree([], [chapter_id], quiz_ids)
+
+def delete_subject_tree(subject_id):
+    chapter_ids = [chapter_id for (chapter_id,) in db.session.query(Chapter.id).filter(Chapter.subject_id == subject_id)]
+    quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).join(Chapter, Chapter.id == Quiz.chapter_id
+                                                                          ).filter(Chapter.subject_id == subject_id)]
+    return _delete_tree([subject_id], chapter_ids, quiz_ids)
+
+# Purge everything that was soft-deleted: quizzes first, then the chapters and subjects above them.
+def purge_soft_deleted(progress=None):
+    quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).filter(Quiz.deleted_at.isnot(None))]
+    purge_quizzes(quiz_ids, progress)
+    db.session.execute(Chapter.__table__.delete().where(Chapter.deleted_at.isnot(None)))
+    db.session.execute(Subject.__table__.delete().where(Subject.deleted_at.isnot(None)))
+    db.session.commit()
+    leaderboard_broadcaster.notify()
+
+# Queue a background purge of everything soft-deleted. One queued purge is enough: a purge that
+# is already running may have missed the latest deletes, so only a queued one is reused.
+def request_purge():
+    enqueue_job('purge_deleted', unique=True)
+
+# Delete a user with set-based deletes of the scores and best-score rows.
+def purge_user(user_id):
+    for score_session in score_router.sessions():
+        # Take the user's best scores out of the quiz histograms.
+        forget_best_scores(score_session, user_id)
+        score_session.execute(UserQuizBest.__table__.delete().where(UserQuizBest.user_id == user_id))
+        score_session.execute(ShardUserPoints.__table__.delete().where(ShardUserPoints.user_id == user_id))
+        score_session.commit()
+        score_session.execute(QuizSubmission.__table__.delete().where(QuizSubmission.user_id == user_id))
+        _delete_in_chunks(Score, Score.user_id == user_id, score_session)
+        # The user's archived attempts go too; the daily rollups are anonymous and keep them.
+        _delete_in_chunks(ScoreArchive, ScoreArchive.user_id == user_id, score_session)
+    db.session.execute(ActiveAttempt.__table__.delete().where(ActiveAttempt.user_id == user_id))
+    db.session.execute(User.__table__.delete().where(User.id == user_id))
+    db.session.commit()
+    leaderboard_broadcaster.notify()
+
+##########################################
+#          CLONING                       #
+##########################################
+# Quizzes, chapters and subjects are copied with INSERT ... SELECT inside one transaction.
+# SQLite gives each new row max(rowid) + 1, so rows inserted in id order of their source get
+# consecutive ids; children are then attached with "first new id + row number of the source row".
+
+# Column names and SELECT expressions that copy every column of `model` except the primary key
+# and the soft-delete marker; `overrides` replaces the expression of individual columns.
+def _clone_columns(model, overrides):
+    names = []
+    expressions = []
+    for column in model.__table__.columns:
+        if column.name in ('id', 'deleted_at'):
+            continue
+        names.append(column.name)
+        expressions.append(overrides.get(column.name, column))
+    return names, expressions
+
+# Insert the rows produced by `source` and return the id just below the first new row.
+# Verifies that the new rows received consecutive ids.
+def _insert_consecutive(model, names, source):
+    base = db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+    inserted = db.session.execute(model.__table__.insert().from_select(names, source)).rowcount
+    last = db.session.query(func.coalesce(func.max(model.id), 0)).scalar()
+    if inserted and last != base + inserted:
+        raise RuntimeError(f'Non-consecutive ids while cloning {model.__tablename__}')
+    return base
+
+# Quiz date columns moved by `days` days (SQLite date arithmetic), or unchanged.
+def _shifted_quiz_dates(days):
+    if not days:
+        return {}
+    modifier = f'{days:+d} days'
+    return {'date_of_quiz': func.date(Quiz.date_of_quiz, modifier),
+            'scheduled_at': func.datetime(Quiz.scheduled_at, modifier)}
+
+# Days between `start_date` and the earliest quiz date of the quizzes matching `criterion`.
+def quiz_date_shift(start_date, *criterion):
+    if start_date is None:
+        return 0
+    first_date = db.session.query(func.min(Quiz.date_of_quiz)).filter(*criterion).scalar()
+    return (start_date - first_date).days if first_date else 0
+
+# Copy the questions of the ranked quizzes to the new quizzes numbered from `quiz_base` + 1.
+def _clone_questions(ranked_quizzes, quiz_base):
+    names, expressions = _clone_columns(Question, {'quiz_id': quiz_base + ranked_quizzes.c.rn})
+    source = select(*expressions).join(ranked_quizzes, ranked_quizzes.c.id == Question.quiz_id).order_by(Question.id)
+    db.session.execute(Question.__table__.insert().from_select(names, source))
+
+# Clone one quiz with its questions into `chapter_id`; returns the new quiz id.
+def clone_quiz(quiz_id, chapter_id, shift_days=0):
+    try:
+        overrides = dict(_shifted_quiz_dates(shift_days), chapter_id=literal(chapter_id))
+        names, expressions = _clone_columns(Quiz, overrides)
+        quiz_base = _insert_consecutive(Quiz, names, select(*expressions).where(Quiz.id == quiz_id))
+        ranked = select(Quiz.id, literal(1).label('rn')).where(Quiz.id == quiz_id).subquery()
+        _clone_questions(ranked, quiz_base)
+        # The new quiz joins the chapter pool of its target chapter.
+        question_pool_changed(chapter_id)
+        bump_cache_version('catalog')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return quiz_base + 1
+
+# Copy the live quizzes selected by `ranked_quizzes` (id, rn, new chapter id), ordered by source id.
+def _clone_ranked_quizzes(ranked_quizzes, shift_days):
+    overrides = dict(_shifted_quiz_dates(shift_days), chapter_id=ranked_quizzes.c.new_chapter_id)
+    names, expressions = _clone_columns(Quiz, overrides)
+    source = select(*expressions).join(ranked_quizzes, ranked_quizzes.c.id == Quiz.id).order_by(Quiz.id)
+    quiz_base = _insert_consecutive(Quiz, names, source)
+    _clone_questions(ranked_quizzes, quiz_base)
+
+# Clone a chapter with its quizzes and questions into `subject_id`; returns the new chapter id.
+def clone_chapter(chapter_id, subject_id, shift_days=0):
+    try:
+        names, expressions = _clone_columns(Chapter, {'subject_id': literal(subject_id)})
+        chapter_base = _insert_consecutive(Chapter, names, select(*expressions).where(Chapter.id == chapter_id))
+        ranked_quizzes = select(
+            Quiz.id,
+            func.row_number().over(order_by=Quiz.id).label('rn'),
+            literal(chapter_base + 1).label('new_chapter_id')
+        ).where(Quiz.chapter_id == chapter_id, Quiz.deleted_at.is_(None)).subquery()
+        _clone_ranked_quizzes(ranked_quizzes, shift_days)
+        bump_cache_version('catalog', 'questions')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return chapter_base + 1
+
+# Clone a subject with its whole chapter/quiz/question hierarchy; returns the new subject id.
+def clone_subject(subject_id, name, shift_days=0):
+    try:
+        names, expressions = _clone_columns(Subject, {'name': literal(name)})
+        subject_base = _insert_consecutive(Subject, names, select(*expressions).where(Subject.id == subject_id))
+        ranked_chapters = select(
+            Chapter.id,
+            func.row_number().over(order_by=Chapter.id).label('rn')
+        ).where(Chapter.subject_id == subject_id, Chapter.deleted_at.is_(None)).subquery()
+        names, expressions = _clone_columns(Chapter, {'subject_id': literal(subject_base + 1)})
+        source = select(*expressions).join(ranked_chapters, ranked_chapters.c.id == Chapter.id).order_by(Chapter.id)
+        chapter_base = _insert_consecutive(Chapter, names, source)
+        ranked_quizzes = select(
+            Quiz.id,
+            func.row_number().over(order_by=Quiz.id).label('rn'),
+            (chapter_base + ranked_chapters.c.rn).label('new_chapter_id')
+        ).join(ranked_chapters, ranked_chapters.c.id == Quiz.chapter_id
+        ).where(Quiz.deleted_at.is_(None)).subquery()
+        _clone_ranked_quizzes(ranked_quizzes, shift_days)
+        bump_cache_version('catalog', 'questions')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return subject_base + 1
+
+# Parse the optional "new first quiz date" of the clone form.
+def _clone_start_date():
+    start_date_str = request.form.get('start_date')
+    return datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+
+##########################################
+#          SCORE RETENTION               #
+##########################################
+# Attempts older than SCORE_RETENTION_DAYS move from Score to score_archive, and their daily
+# per-quiz totals are added to daily_quiz_stat. Best scores, histograms and points are kept in
+# their own tables and do not change, so rankings are unaffected; charts read live aggregates
+# plus the rollups; per-user histories read both tables through all_scores().
+
+SCORE_HISTORY_COLUMNS = ('id', 'quiz_id', 'user_id', 'time_stamp_of_attempt', 'total_scored',
+                         'attempt_seed', 'quiz_version')
+
+# Live and archived attempts as one subquery with Score's columns.
+# `filters` (column=value) are applied to both halves, so each can use its own indexes.
+def all_scores(**filters):
+    selects = []
+    for model in (Score, ScoreArchive):
+        stmt = select(*(getattr(model, name) for name in SCORE_HISTORY_COLUMNS))
+        for name, value in filters.items():
+            stmt = stmt.where(getattr(model, name) == value)
+        selects.append(stmt)
+    return union_all(*selects).subquery('all_scores')
+
+# Read models: listings that only show a few columns are read with Core select()s into these
+# namedtuples, so no ORM entity, identity-map entry or lazy-load state is built per row.
+# UserRow leaves out the password hash: no listing shows it.
+SubjectRow = namedtuple('SubjectRow', ['id', 'name', 'description'])
+UserRow = namedtuple('UserRow', ['id', 'full_name', 'username', 'qualification', 'dob'])
+ScoreRow = namedtuple('ScoreRow', ['id', 'user_id', 'quiz_id', 'total_scored', 'time_stamp_of_attempt'])
+
+# Select of ScoreRow's columns over live and archived attempts, plus its subquery for ordering.
+def score_rows_select(**filters):
+    scores = all_scores(**filters)
+    return select(*(scores.c[name] for name in ScoreRow._fields)), scores
+
+# Attempts of a user, live and archived, oldest first, as ScoreRows.
+# Each score session returns them in order; the shards' lists are merged.
+def user_score_history(user_id):
+    stmt, scores = score_rows_select(user_id=user_id)
+    stmt = stmt.order_by(scores.c.time_stamp_of_attempt, scores.c.id)
+    return list(heapq.merge(*(
+        map(ScoreRow._make, score_session.execute(stmt))
+        for score_session in score_router.sessions()
+    ), key=lambda score: (score.time_stamp_of_attempt, score.id)))
+
+# Number of attempts ever recorded.
+def attempt_count():
+    return sum(score_session.query(Score).count() + score_session.query(ScoreArchive).count()
+               for score_session in score_router.sessions())
+
+# {day (YYYY-MM-DD): [attempts, sum of scores]} over live and archived attempts.
+def daily_attempt_totals():
+    totals = defaultdict(lambda: [0, 0])
+    for score_session in score_router.sessions():
+        live = score_session.query(
+            func.date(Score.time_stamp_of_attempt), func.count(Score.id), func.sum(Score.total_scored)
+        ).group_by(func.date(Score.time_stamp_of_attempt))
+        archived = score_session.query(
+            DailyQuizStat.day, func.sum(DailyQuizStat.attempts), func.sum(DailyQuizStat.total_scored)
+        ).group_by(DailyQuizStat.day)
+        for day, attempts, total in list(live) + list(archived):
+            entry = totals[str(day)]
+            entry[0] += attempts
+            entry[1] += total or 0
+    return totals
+
+# {quiz id: [attempts, sum of scores]} over live and archived attempts.
+def quiz_attempt_totals():
+    totals = defaultdict(lambda: [0, 0])
+    for score_session in score_router.sessions():
+        live = score_session.query(Score.quiz_id, func.count(Score.id), func.sum(Score.total_scored)
+                                   ).group_by(Score.quiz_id)
+        archived = score_session.query(DailyQuizStat.quiz_id, func.sum(DailyQuizStat.attempts),
+                                       func.sum(DailyQuizStat.total_scored)).group_by(DailyQuizStat.quiz_id)
+        for quiz_id, attempts, total in list(live) + list(archived):
+            totals[quiz_id][0] += attempts
+            totals[quiz_id][1] += total or 0
+    return totals
+
+# (subject name, average score, attempts) of the live subjects with attempts, in id order.
+# Live quizzes are mapped to their subjects with one join instead of walking subject.chapters and
+# chapter.quizzes, which lazy-loaded every subject's and chapter's children one query at a time.
+def subject_attempt_averages():
+    quiz_totals = quiz_attempt_totals()
+    rows = db.session.query(Subject.id, Subject.name, Quiz.id).outerjoin(
+        Chapter, and_(Chapter.subject_id == Subject.id, Chapter.deleted_at.is_(None))
+    ).outerjoin(Quiz, and_(Quiz.chapter_id == Chapter.id, Quiz.deleted_at.is_(None))
+    ).filter(Subject.deleted_at.is_(None)).order_by(Subject.id)
+    averages = []
+    for (subject_id, name), quizzes in groupby(rows, key=lambda row: row[:2]):
+        attempts = 0
+        total_scored = 0
+        for _, _, quiz_id in quizzes:
+            if quiz_id in quiz_totals:
+                attempts += quiz_totals[quiz_id][0]
+                total_scored += quiz_totals[quiz_id][1]
+        if attempts:
+            averages.append((name, total_scored / attempts, attempts))
+    return averages
+
+# Move attempts made before `cutoff` to the archive, `chunk_size` rows per transaction.
+# Each chunk copies the rows, adds them to the daily rollups and deletes them in one short
+# transaction, then pauses ARCHIVE_PAUSE seconds so requests can take the write lock in between.
+# Score shards are archived one after the other; `progress(archived)` is called after every chunk.
+# Returns the number of archived attempts.
+def archive_scores(cutoff, chunk_size, progress=None):
+    archived = 0
+    for score_session in score_router.sessions():
+        archived = _archive_session_scores(score_session, cutoff, chunk_size, archived, progress)
+    return archived
+
+def _archive_session_scores(score_session, cutoff, chunk_size, archived, progress):
+    stat = sqlite_insert(DailyQuizStat)
+    add_to_stat = stat.on_conflict_do_update(
+        index_elements=['day', 'quiz_id'],
+        set_={'attempts': DailyQuizStat.attempts + stat.excluded.attempts,
+              'total_scored': DailyQuizStat.total_scored + stat.excluded.total_scored})
+    while True:
+        ids = [score_id for (score_id,) in score_session.query(Score.id).filter(
+            Score.time_stamp_of_attempt < cutoff).order_by(Score.id).limit(chunk_size)]
+        if not ids:
+            return archived
+        in_chunk = Score.id.in_(ids)
+        try:
+            score_session.execute(ScoreArchive.__table__.insert().from_select(
+                list(SCORE_HISTORY_COLUMNS) + ['archived_at'],
+                select(*(getattr(Score, name) for name in SCORE_HISTORY_COLUMNS),
+                       literal(datetime.utcnow())).where(in_chunk)))
+            rollup = score_session.query(
+                func.date(Score.time_stamp_of_attempt), Score.quiz_id,
+                func.count(Score.id), func.coalesce(func.sum(Score.total_scored), 0)
+            ).filter(in_chunk).group_by(func.date(Score.time_stamp_of_attempt), Score.quiz_id).all()
+            score_session.execute(add_to_stat, [
+                {'day': date.fromisoformat(day), 'quiz_id': quiz_id, 'attempts': attempts, 'total_scored': total}
+                for day, quiz_id, attempts, total in rollup])
+            score_session.execute(Score.__table__.delete().where(in_chunk))
+            score_session.commit()
+        except Exception:
+            score_session.rollback()
+            raise
+        archived += len(ids)
+        if progress:
+            progress(archived)
+        time.sleep(current_app.config['ARCHIVE_PAUSE'])
+
+# Run from cron, e.g. nightly: flask --app app archive-scores
+@click.command('archive-scores')
+@click.option('--days', type=int, default=None,
+              help='Archive attempts older than this many days (default: SCORE_RETENTION_DAYS).')
+@with_appcontext
+def archive_scores_command(days):
+    """Move old quiz attempts to the archive table, keeping daily rollups."""
+    days = current_app.config['SCORE_RETENTION_DAYS'] if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = archive_scores(cutoff, current_app.config['ARCHIVE_CHUNK_SIZE'])
+    click.echo(f'Archived {archived} attempts made before {cutoff:%Y-%m-%d}.')
+
+##########################################
+#          BACKGROUND JOBS               #
+##########################################
+# Heavy admin operations run as jobs instead of in the request thread. A job is a row of the job
+# table; every worker runs a dispatcher thread that claims queued jobs (an UPDATE ... WHERE
+# status = 'queued', so exactly one worker wins) and runs them on a pool of JOB_WORKERS threads.
+# The dispatcher refreshes the heartbeat of the jobs it runs; a running job whose heartbeat is
+# older than JOB_STALE_AFTER seconds belonged to a worker that died and is queued again, so
+# handlers must be safe to run again from the start. Cancellation is cooperative: handlers report
+# progress through job.progress(), which raises JobCancelled once an admin cancelled the job.
+
+JOB_STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+# kind -> handler(job, **params), registered with @job_handler
+_job_handlers = {}
+
+# Jobs admins can start from the jobs page: kind -> button label
+ADMIN_JOBS = {
+    'rebuild_best_scores': 'Rebuild best scores',
+    'archive_scores': 'Archive old attempts',
+    'report_cards': 'Generate report cards',
+}
+
+def job_handler(kind):
+    def decorator(handler):
+        _job_handlers[kind] = handler
+        return handler
+    return decorator
+
+class JobCancelled(Exception):
+    pass
+
+# Update the job rows matching `criterion` in a transaction of their own, so job bookkeeping
+# never commits (or rolls back) the work of a handler. Returns the number of rows updated.
+def _update_jobs(*criterion, **values):
+    with db.engine.begin() as connection:
+        return connection.execute(Job.__table__.update().where(*criterion).values(**values)).rowcount
+
+# Queue a job; returns its id. With `unique`, a queued job of the same kind is reused.
+def enqueue_job(kind, params=None, created_by=None, unique=False):
+    if unique:
+        queued = db.session.query(Job.id).filter(Job.kind == kind, Job.status == 'queued').first()
+        if queued is not None:
+            return queued[0]
+    job = Job(kind=kind, params=json.dumps(params or {}), created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    job_runner.wake()
+    return job.id
+
+# Cancel a job: a queued job at once, a running one at its next progress report.
+# Returns False when the job has already finished.
+def cancel_job(job_id):
+    if _update_jobs(Job.id == job_id, Job.status == 'queued', status='cancelled',
+                    message='Cancelled before it started', finished_at=datetime.utcnow()):
+        return True
+    return _update_jobs(Job.id == job_id, Job.status == 'running', cancel_requested=True) > 0
+
+# Handle passed to a job handler.
+class JobContext:
+    def __init__(self, job_id):
+        self.id = job_id
+        self._last_report = 0.0
+
+    # Record progress, at most once per JOB_PROGRESS_INTERVAL seconds unless `force`d, and stop the
+    # handler with JobCancelled when the job was cancelled.
+    def progress(self, done, total=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < current_app.config['JOB_PROGRESS_INTERVAL']:
+            return
+        self._last_report = now
+        values = {'progress': done}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        with db.engine.begin() as connection:
+            connection.execute(Job.__table__.update().where(Job.id == self.id).values(**values))
+            cancelled = connection.execute(select(Job.cancel_requested).where(Job.id == self.id)).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+# Per-worker dispatcher: claims queued jobs and runs them on a bounded thread pool.
+class JobRunner:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pool = None
+        # Ids of the jobs running in this worker
+        self._running = set()
+        self.worker_id = None
+
+    # Start the dispatcher in this worker (after the fork under gunicorn).
+    def ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                app = current_app._get_current_object()
+                self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+                self._pool = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+                self._thread = threading.Thread(target=self._run, args=(app,), name='job-dispatcher', daemon=True)
+                self._thread.start()
+
+    # Look for queued jobs now instead of at the next poll.
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                try:
+                    self._dispatch(app)
+                except Exception:
+                    app.logger.exception('Job dispatch failed')
+                finally:
+                    db.session.remove()
+                self._wake.wait(app.config['JOB_POLL_INTERVAL'])
+                self._wake.clear()
+
+    def _dispatch(self, app):
+        now = datetime.utcnow()
+        with self._lock:
+            running = list(self._running)
+        if running:
+            _update_jobs(Job.id.in_(running), Job.worker == self.worker_id, heartbeat_at=now)
+        # Jobs of workers that stopped sending heartbeats (killed, restarted) are run again.
+        stale = now - timedelta(seconds=app.config['JOB_STALE_AFTER'])
+        _update_jobs(Job.status == 'running', Job.heartbeat_at < stale,
+                     status='queued', worker=None, message='Resumed after its worker stopped')
+        free = app.config['JOB_WORKERS'] - len(running)
+        if free <= 0:
+            return
+        queued = [job_id for (job_id,) in db.session.query(Job.id).filter(
+            Job.status == 'queued').order_by(Job.id).limit(free)]
+        for job_id in queued:
+            # Claim the job; another worker may have taken it since the query.
+            if _update_jobs(Job.id == job_id, Job.status == 'queued', status='running',
+                            worker=self.worker_id, started_at=now, heartbeat_at=now):
+                with self._lock:
+                    self._running.add(job_id)
+                self._pool.submit(self._execute, app, job_id)
+
+    def _execute(self, app, job_id):
+        with app.app_context():
+            # Final states are only written while the job still belongs to this worker.
+            mine = (Job.id == job_id, Job.worker == self.worker_id)
+            try:
+                kind, params = db.session.query(Job.kind, Job.params).filter(Job.id == job_id).one()
+                db.session.commit()
+                result = _job_handlers[kind](JobContext(job_id), **json.loads(params))
+                _update_jobs(*mine, status='done', result=result, progress=func.coalesce(Job.total, Job.progress),
+                             finished_at=datetime.utcnow())
+            except JobCancelled:
+                db.session.rollback()
+                _update_jobs(*mine, status='cancelled', message='Cancelled', finished_at=datetime.utcnow())
+            except Exception as exc:
+                db.session.rollback()
+                app.logger.exception('Job %s failed', job_id)
+                _update_jobs(*mine, status='failed', message=(str(exc) or exc.__class__.__name__)[:255],
+                             finished_at=datetime.utcnow())
+            finally:
+                db.session.remove()
+                score_router.remove()
+                with self._lock:
+                    self._running.discard(job_id)
+                self._wake.set()
+
+job_runner = JobRunner()
+
+# Most recent jobs, newest first.
+def recent_jobs():
+    return Job.query.order_by(Job.id.desc()).limit(current_app.config['JOB_PAGE_SIZE']).all()
+
+# JSON view of a job for the admin endpoints.
+def job_summary(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at and job.started_at.isoformat(),
+        'finished_at': job.finished_at and job.finished_at.isoformat(),
+        'result_url': url_for('admin_job_result', job_id=job.id) if job.result and job.status == 'done' else None,
+    }
+
+# Everything soft-deleted; queued by request_purge() when a large subject, chapter or quiz is deleted.
+@job_handler('purge_deleted')
+def purge_deleted_job(job):
+    purge_soft_deleted(lambda done, total: job.progress(done, total, 'Deleting quizzes'))
+
+# Recompute the best-score and histogram tables from the attempts.
+@job_handler('rebuild_best_scores')
+def rebuild_best_scores_job(job):
+    score_sessions = score_router.sessions()
+    for done, score_session in enumerate(score_sessions):
+        job.progress(done, len(score_sessions), 'Rebuilding best scores', force=True)
+        rebuild_best_scores(score_session)
+    leaderboard_broadcaster.notify()
+
+# The "flask archive-scores" command as a job.
+@job_handler('archive_scores')
+def archive_scores_job(job, days=None):
+    days = current_app.config['SCORE_RETENTION_DAYS'] if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    message = f'Archiving attempts made before {cutoff:%Y-%m-%d}'
+    archived = archive_scores(cutoff, current_app.config['ARCHIVE_CHUNK_SIZE'],
+                              lambda archived: job.progress(archived, message=message))
+    job.progress(archived, archived, f'Archived {archived} attempts made before {cutoff:%Y-%m-%d}.', force=True)
+
+##########################################
+#          PROFILER                      #
+##########################################
+# On-demand sampling profiler for live traffic, run as a 'profile' job. While a profile runs, the
+# job thread wakes every `interval_ms`, takes the Python stack of every thread of the worker (or
+# only of the threads serving the chosen endpoints) from sys._current_frames() and counts it in
+# collapsed-stack form ("root;caller;callee count", the input of flamegraph.pl and speedscope).
+# Optionally the SQL statements issued meanwhile are timed as well. While no profile runs nothing
+# is installed except request hooks that test one attribute; a running profile is bounded by
+# PROFILER_MAX_DURATION seconds, PROFILER_MAX_STACKS distinct stacks and PROFILER_MAX_STATEMENTS
+# distinct statements. Only the worker that picks up the job is sampled.
+
+# Frames kept per sampled stack (innermost frames are dropped beyond this)
+PROFILER_MAX_DEPTH = 100
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = False
+        self.samples = 0
+        self._endpoints = None
+        self._capture_sql = False
+        # thread id -> endpoint of the request it is serving, tracked while a profile runs
+        self._requests = {}
+        # collapsed stack -> samples, statement -> [executions, seconds]
+        self._stacks = Counter()
+        self._statements = {}
+        self._max_stacks = 0
+        self._max_statements = 0
+
+    # Begin a profile of this worker; `endpoints` (a set) limits it to requests of those endpoints.
+    def start(self, endpoints, capture_sql, max_stacks, max_statements):
+        with self._lock:
+            if self.active:
+                raise RuntimeError('A profile is already running in this worker.')
+            self.samples = 0
+            self._endpoints = endpoints
+            self._capture_sql = capture_sql
+            self._requests = {}
+            self._stacks = Counter()
+            self._statements = {}
+            self._max_stacks = max_stacks
+            self._max_statements = max_statements
+            self.active = True
+        if capture_sql:
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    # End the profile; returns (stacks, statements).
+    def stop(self):
+        if self._capture_sql:
+            event.remove(Engine, 'before_cursor_execute', self._before_execute)
+            event.remove(Engine, 'after_cursor_execute', self._after_execute)
+        with self._lock:
+            self.active = False
+            self._requests = {}
+            return self._stacks, self._statements
+
+    # before_request / teardown_request hooks.
+    def request_started(self):
+        if self.active:
+            self._requests[threading.get_ident()] = request.endpoint
+
+    def request_finished(self, exc=None):
+        if self.active:
+            self._requests.pop(threading.get_ident(), None)
+
+    # Take one sample of every thread of interest except the calling one.
+    def sample(self):
+        own = threading.get_ident()
+        names = None
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            endpoint = self._requests.get(thread_id)
+            if self._endpoints is not None and endpoint not in self._endpoints:
+                continue
+            stack = []
+            while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({frame.f_globals.get('__name__', '?')}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # Root frame: the endpoint for request threads, the thread name for the others.
+            if endpoint is None:
+                if names is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(f'[thread {names.get(thread_id, thread_id)}]')
+            else:
+                stack.append(f'[{endpoint}]')
+            key = ';'.join(reversed(stack))
+            if key not in self._stacks and len(self._stacks) >= self._max_stacks:
+                key = '[other stacks]'
+            self._stacks[key] += 1
+        self.samples += 1
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['profiler_started'] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('profiler_started', None)
+        if started is None:
+            return
+        if self._endpoints is not None and self._requests.get(threading.get_ident()) not in self._endpoints:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if statement not in self._statements and len(self._statements) >= self._max_statements:
+                statement = '[other statements]'
+            entry = self._statements.setdefault(statement, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+profiler = SamplingProfiler()
+
+# Functions with the most samples: inclusive (anywhere on the stack) and self (innermost frame).
+def _profile_summary(stacks, samples, duration, limit=30):
+    inclusive = Counter()
+    exclusive = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        exclusive[frames[-1]] += count
+        for frame in set(frames[1:]):
+            inclusive[frame] += count
+    total = sum(stacks.values()) or 1
+    lines = [f'{samples} samples over {duration:.1f} s, {total} thread stacks', '', 'Inclusive:']
+    lines += [f'{count:8d} {100.0 * count / total:5.1f}%  {frame}' for frame, count in inclusive.most_common(limit)]
+    lines += ['', 'Self:']
+    lines += [f'{count:8d} {100.0 * count / total:5.1f}%  {frame}' for frame, count in exclusive.most_common(limit)]
+    return '\n'.join(lines) + '\n'
+
+# Profile the worker that runs the job. The result is a zip with stacks.collapsed (flame graph
+# input), summary.txt and, with capture_sql, sql.tsv. Cancelling the job ends the profile early
+# and keeps what was sampled.
+@job_handler('profile')
+def profile_job(job, duration=30, interval_ms=10, endpoints=None, capture_sql=False):
+    config = current_app.config
+    duration = min(float(duration), config['PROFILER_MAX_DURATION'])
+    interval = max(float(interval_ms), 1.0) / 1000
+    profiler.start(set(endpoints) if endpoints else None, capture_sql,
+                   config['PROFILER_MAX_STACKS'], config['PROFILER_MAX_STATEMENTS'])
+    started = time.monotonic()
+    try:
+        while time.monotonic() - started < duration:
+            profiler.sample()
+            try:
+                job.progress(int(time.monotonic() - started), int(duration), f'{profiler.samples} samples')
+            except JobCancelled:
+                break
+            time.sleep(interval)
+    finally:
+        stacks, statements = profiler.stop()
+    elapsed = time.monotonic() - started
+    directory = config['JOB_RESULT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    filename = f'profile-{job.id}-{datetime.utcnow():%Y%m%d-%H%M%S}.zip'
+    with zipfile.ZipFile(os.path.join(directory, filename), 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('stacks.collapsed', ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common()))
+        archive.writestr('summary.txt', _profile_summary(stacks, profiler.samples, elapsed))
+        if capture_sql:
+            rows = sorted(statements.items(), key=lambda item: item[1][1], reverse=True)
+            archive.writestr('sql.tsv', 'executions\ttotal_ms\tmean_ms\tstatement\n' + ''.join(
+                f'{count}\t{seconds * 1000:.2f}\t{seconds * 1000 / count:.3f}\t{" ".join(statement.split())}\n'
+                for statement, (count, seconds) in rows))
+    return filename
+
+##########################################
+#          LIVE LEADERBOARD              #
+##########################################
+
+LeaderboardRow = namedtuple('LeaderboardRow', ['id', 'full_name', 'total_points'])
+
+# Leaderboard rows: (id, full_name, total_points), best first.
+# Sums the best score per quiz from UserQuizBest, with users without attempts at 0.
+def compute_leaderboard():
+    total_points = func.coalesce(func.sum(UserQuizBest.best_score), 0)
+    if not score_router.partitioned:
+        return db.session.query(
+            User.id,
+            User.full_name,
+            total_points.label("total_points")
+        ).filter(User.role == 'user'
+        ).outerjoin(UserQuizBest, User.id == UserQuizBest.user_id
+        ).group_by(User.id
+        ).order_by(total_points.desc(), User.id).all()
+    # Partitioned: per-user sums from every shard, merged and joined with the users in Python.
+    totals = Counter()
+    for score_session in score_router.sessions():
+        totals.update(dict(score_session.query(UserQuizBest.user_id, total_points).group_by(UserQuizBest.user_id)))
+    rows = [LeaderboardRow(user_id, full_name, totals[user_id])
+            for user_id, full_name in db.session.query(User.id, User.full_name).filter(User.role == 'user')]
+    return sorted(rows, key=lambda row: (-row.total_points, row.id))
+
+# Format one Server-Sent Event.
+def _sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+# Single producer per process that recomputes the leaderboard when scores change
+# and fans out small rank-change messages to every connected client.
+class LeaderboardBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._wake = threading.Event()
+        self._thread = None
+        # Current standings: user_id -> {'user_id', 'name', 'points', 'rank'}
+        self._standings = {}
+        # Highest Score id seen in each score session; detects scores committed by other workers
+        self._marker = None
+        # Set by notify() until the standings are recomputed
+        self._stale = False
+        # Serializes updates of the standings; time of the last check of the marker
+        self._update_lock = threading.Lock()
+        self._checked_at = None
+
+    # Register a client queue; returns None when the connection cap is reached.
+    def subscribe(self):
+        with self._lock:
+            if len(self._clients) >= current_app.config['SSE_MAX_CONNECTIONS']:
+                return None
+            client = queue.Queue(maxsize=current_app.config['SSE_CLIENT_QUEUE'])
+            self._clients.add(client)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(current_app._get_current_object(),),
+                                                name='leaderboard-sse', daemon=True)
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    # Called after a score is committed in this process; wakes the producer immediately.
+    def notify(self):
+        self._stale = True
+        self._wake.set()
+
+    # Current standings as rows of the snapshot event, for pages and polling clients.
+    # Served from the producer's copy; the marker is checked at most every SSE_POLL_INTERVAL seconds
+    # and the leaderboard is only recomputed when a score was committed since.
+    def standings(self):
+        with self._update_lock:
+            if self._stale or self._checked_at is None or \
+                    time.monotonic() - self._checked_at >= current_app.config['SSE_POLL_INTERVAL']:
+                self._update()
+        with self._lock:
+            return sorted(self._standings.values(), key=lambda row: row['rank'])
+
+    # Full standings message, sent on connect and to clients that fell behind.
+    def snapshot_event(self):
+        with self._lock:
+            rows = sorted(self._standings.values(), key=lambda row: row['rank'])
+        return _sse_event('snapshot', rows)
+
+    # Queue an encoded message for every client. A client whose queue is full is
+    # not waited for: its backlog is dropped and replaced by a fresh snapshot.
+    def _publish(self, message):
+        with self._lock:
+            clients = list(self._clients)
+        snapshot = None
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                while True:
+                    try:
+                        client.get_nowait()
+                    except queue.Empty:
+                        break
+                if snapshot is None:
+                    snapshot = self.snapshot_event()
+                client.put_nowait(snapshot)
+
+    # Recompute the standings and return the rows that changed and the user ids that disappeared.
+    def _refresh(self):
+        standings = {}
+        for position, (user_id, full_name, points) in enumerate(compute_leaderboard(), start=1):
+            standings[user_id] = {'user_id': user_id, 'name': full_name, 'points': points, 'rank': position}
+        with self._lock:
+            changed = [row for user_id, row in standings.items() if self._standings.get(user_id) != row]
+            removed = [user_id for user_id in self._standings if user_id not in standings]
+            self._standings = standings
+        return changed, removed
+
+    # Recompute the standings if a score was committed here (notify) or in another worker (the
+    # marker moved), and send the changes to the connected clients. Called with _update_lock held.
+    def _update(self):
+        stale, self._stale = self._stale, False
+        marker = tuple(score_session.query(func.max(Score.id)).scalar() for score_session in score_router.sessions())
+        self._checked_at = time.monotonic()
+        if stale or marker != self._marker:
+            self._marker = marker
+            changed, removed = self._refresh()
+            if changed or removed:
+                self._publish(_sse_event('delta', {'changed': changed, 'removed': removed}))
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                self._wake.wait(app.config['SSE_POLL_INTERVAL'])
+                self._wake.clear()
+                with self._lock:
+                    if not self._clients:
+                        continue
+                try:
+                    with self._update_lock:
+                        self._update()
+                except Exception:
+                    app.logger.exception('Live leaderboard refresh failed')
+                finally:
+                    db.session.remove()
+                    score_router.remove()
+
+leaderboard_broadcaster = LeaderboardBroadcaster()
+
+# Hook run after an attempt's score has been committed.
+def notify_score_committed(quiz_id):
+    leaderboard_broadcaster.notify()
+
+##########################################
+#          ACTIVE ATTEMPT TRACKER        #
+##########################################
+
+# One lock-protected slice of the tracker.
+class _AttemptShard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Events not written yet: (quiz_id, user_id) -> (started_at, deadline), and -> finished_at
+        self.starts = {}
+        self.finishes = {}
+        # quiz_id -> Counter of events
+        self.counters = defaultdict(Counter)
+
+# Tracker of attempts in progress per quiz.
+# Requests only touch one in-memory shard keyed by (quiz, user), so concurrent requests rarely share
+# a lock; a background thread writes the buffered start and finish events to ActiveAttempt, where
+# the events of all workers meet, and the event totals of this worker to ActiveAttemptStat.
+class ActiveAttemptTracker:
+    EVENTS = ('started', 'saved', 'submitted', 'expired')
+
+    def __init__(self, shards):
+        self._shards = [_AttemptShard() for _ in range(shards)]
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._flush_thread = None
+        self._flush_lock = threading.Lock()
+        # One flush at a time per worker (background thread and admin requests)
+        self._write_lock = threading.Lock()
+        self._flushes = 0
+
+    def _shard(self, quiz_id, user_id):
+        return self._shards[hash((quiz_id, user_id)) % len(self._shards)]
+
+    # A student opened a new attempt with `duration_seconds` on the clock.
+    def started(self, quiz_id, user_id, duration_seconds):
+        now = datetime.utcnow()
+        deadline = now + timedelta(seconds=duration_seconds + current_app.config['ATTEMPT_EXPIRY_GRACE'])
+        shard = self._shard(quiz_id, user_id)
+        with shard.lock:
+            shard.starts[(quiz_id, user_id)] = (now, deadline)
+            shard.counters[quiz_id]['started'] += 1
+        self._ensure_flusher()
+
+    def saved(self, quiz_id, user_id):
+        shard = self._shard(quiz_id, user_id)
+        with shard.lock:
+            shard.counters[quiz_id]['saved'] += 1
+
+    # The attempt ended; `event` is 'submitted' or 'expired' (auto-submitted on timeout).
+    def finished(self, quiz_id, user_id, event):
+        shard = self._shard(quiz_id, user_id)
+        with shard.lock:
+            shard.finishes[(quiz_id, user_id)] = datetime.utcnow()
+            shard.counters[quiz_id][event] += 1
+
+    # Take the buffered start and finish events out of the shards.
+    def _drain(self):
+        starts, finishes = {}, {}
+        for shard in self._shards:
+            with shard.lock:
+                starts.update(shard.starts)
+                finishes.update(shard.finishes)
+                shard.starts, shard.finishes = {}, {}
+        return starts, finishes
+
+    # Put events back after a failed flush, keeping any newer ones recorded meanwhile.
+    def _restore(self, starts, finishes):
+        for key, start in starts.items():
+            shard = self._shard(*key)
+            with shard.lock:
+                if key not in shard.starts:
+                    shard.starts[key] = start
+        for key, finished_at in finishes.items():
+            shard = self._shard(*key)
+            with shard.lock:
+                if key not in shard.finishes:
+                    shard.finishes[key] = finished_at
+
+    # Write the buffered events to ActiveAttempt, count attempts past their deadline as expired
+    # (each by exactly one worker), and replace this worker's rows in ActiveAttemptStat.
+    def flush(self):
+        with self._write_lock:
+            starts, finishes = self._drain()
+            try:
+                self._write(starts, finishes)
+            except Exception:
+                db.session.rollback()
+                self._restore(starts, finishes)
+                raise
+
+    def _write(self, starts, finishes):
+        table = ActiveAttempt.__table__
+        if starts:
+            stmt = sqlite_insert(table)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['quiz_id', 'user_id'],
+                set_={'started_at': stmt.excluded.started_at, 'deadline': stmt.excluded.deadline},
+                where=stmt.excluded.started_at > table.c.started_at),
+                [{'quiz_id': quiz_id, 'user_id': user_id, 'started_at': started_at, 'deadline': deadline}
+                 for (quiz_id, user_id), (started_at, deadline) in starts.items()])
+        if finishes:
+            # A finish may arrive before the start written by another worker; the row it creates
+            # starts at the finish time, so that older start does not reopen it.
+            stmt = sqlite_insert(table)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['quiz_id', 'user_id'],
+                set_={'finished_at': stmt.excluded.finished_at},
+                where=or_(table.c.finished_at.is_(None), stmt.excluded.finished_at > table.c.finished_at)),
+                [{'quiz_id': quiz_id, 'user_id': user_id, 'started_at': finished_at, 'deadline': finished_at,
+                  'finished_at': finished_at}
+                 for (quiz_id, user_id), finished_at in finishes.items()])
+        # Claim the attempts that ran out unfinished; the claim and the count share one transaction.
+        # The expiry time is never before the start, which would leave the attempt open (clock skew).
+        self._flushes += 1
+        claim = f'{self.worker_id}:{self._flushes}'
+        db.session.execute(table.update().where(
+            unfinished_attempt(), table.c.deadline < datetime.utcnow()
+        ).values(finished_at=func.max(table.c.deadline, table.c.started_at), expired_by=claim))
+        for quiz_id, expired in db.session.query(ActiveAttempt.quiz_id, func.count()).filter(
+                ActiveAttempt.expired_by == claim).group_by(ActiveAttempt.quiz_id):
+            shard = self._shard(quiz_id, None)
+            with shard.lock:
+                shard.counters[quiz_id]['expired'] += expired
+        totals = defaultdict(Counter)
+        for shard in self._shards:
+            with shard.lock:
+                for quiz_id, counter in shard.counters.items():
+                    totals[quiz_id].update(counter)
+        rows = [dict(worker_id=self.worker_id, quiz_id=quiz_id, updated_at=datetime.utcnow(),
+                     **{event: counter[event] for event in self.EVENTS})
+                for quiz_id, counter in totals.items()]
+        ActiveAttemptStat.query.filter_by(worker_id=self.worker_id).delete()
+        if rows:
+            db.session.execute(ActiveAttemptStat.__table__.insert(), rows)
+        db.session.commit()
+
+    # Start the periodic flush thread on first use in this worker.
+    def _ensure_flusher(self):
+        if self._flush_thread is not None and self._flush_thread.is_alive():
+            return
+        with self._flush_lock:
+            if self._flush_thread is None or not self._flush_thread.is_alive():
+                self._flush_thread = threading.Thread(target=self._run, args=(current_app._get_current_object(),),
+                                                      name='attempt-tracker', daemon=True)
+                self._flush_thread.start()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                time.sleep(app.config['ATTEMPT_TRACKER_FLUSH'])
+                try:
+                    self.flush()
+                except Exception:
+                    app.logger.exception('Active attempt tracker flush failed')
+                finally:
+                    db.session.remove()
+
+# Condition for an ActiveAttempt row that has not been submitted or counted as expired.
+def unfinished_attempt():
+    return or_(ActiveAttempt.finished_at.is_(None), ActiveAttempt.finished_at < ActiveAttempt.started_at)
+
+# Number of lock shards of the tracker.
+ATTEMPT_TRACKER_SHARDS = 16
+
+attempt_tracker = ActiveAttemptTracker(ATTEMPT_TRACKER_SHARDS)
+
+# Attempts in progress (over all workers) and event counts per quiz, summed over all live workers.
+def active_attempt_summary():
+    # Publish this worker's events first so the caller's own worker is never stale.
+    attempt_tracker.flush()
+    active = dict(db.session.query(ActiveAttempt.quiz_id, func.count()).filter(
+        unfinished_attempt(), ActiveAttempt.deadline >= datetime.utcnow()).group_by(ActiveAttempt.quiz_id))
+    # Ignore rows from workers that stopped flushing (exited or restarted).
+    cutoff = datetime.utcnow() - timedelta(seconds=3 * current_app.config['ATTEMPT_TRACKER_FLUSH'])
+    counts = {row[0]: row[1:] for row in db.session.query(
+        ActiveAttemptStat.quiz_id,
+        func.sum(ActiveAttemptStat.started),
+        func.sum(ActiveAttemptStat.saved),
+        func.sum(ActiveAttemptStat.submitted),
+        func.sum(ActiveAttemptStat.expired)
+    ).filter(ActiveAttemptStat.updated_at >= cutoff).group_by(ActiveAttemptStat.quiz_id)}
+    summary = [{'quiz_id': quiz_id, 'active': active.get(quiz_id, 0), 'started': started, 'saved': saved,
+                'submitted': submitted, 'expired': expired}
+               for quiz_id, (started, saved, submitted, expired) in
+               ((quiz_id, counts.get(quiz_id, (0, 0, 0, 0))) for quiz_id in set(active) | set(counts))]
+    return sorted(summary, key=lambda row: (-row['active'], row['quiz_id']))
+
+##########################################
+#          ACTIVITY LOG                  #
+##########################################
+
+# Events recorded by the routes, in the order they are listed on the admin page filter.
+ACTIVITY_EVENTS = ('login', 'login_failed', 'attempt_started', 'answers_saved', 'submitted', 'auto_submitted')
+
+# In-memory ring buffer of activity events, written to activity_log by a background thread.
+# Recording is a deque append, so requests never wait for the database; if the database falls
+# behind by more than ACTIVITY_BUFFER_SIZE events the oldest ones are dropped (and counted).
+class ActivityLog:
+    def __init__(self):
+        self._buffer = None
+        self.dropped = 0
+        self._app = None
+        self._flush_thread = None
+        self._flush_lock = threading.Lock()
+
+    def record(self, event, user_id=None, quiz_id=None, detail=None):
+        if self._buffer is None:
+            with self._flush_lock:
+                if self._buffer is None:
+                    self._buffer = deque(maxlen=current_app.config['ACTIVITY_BUFFER_SIZE'])
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({'occurred_at': datetime.utcnow(), 'user_id': user_id, 'quiz_id': quiz_id,
+                             'event': event, 'detail': detail and str(detail)[:255]})
+        self._ensure_flusher()
+
+    # Write everything buffered so far, ACTIVITY_FLUSH_BATCH rows per INSERT.
+    def flush(self):
+        if not self._buffer:
+            return
+        batch_size = current_app.config['ACTIVITY_FLUSH_BATCH']
+        while self._buffer:
+            rows = []
+            while self._buffer and len(rows) < batch_size:
+                rows.append(self._buffer.popleft())
+            db.session.execute(ActivityEvent.__table__.insert(), rows)
+            db.session.commit()
+
+    # Start the periodic flush thread on first use in this worker.
+    def _ensure_flusher(self):
+        if self._flush_thread is not None and self._flush_thread.is_alive():
+            return
+        with self._flush_lock:
+            if self._flush_thread is None or not self._flush_thread.is_alive():
+                self._app = current_app._get_current_object()
+                self._flush_thread = threading.Thread(target=self._run, args=(self._app,),
+                                                      name='activity-log', daemon=True)
+                self._flush_thread.start()
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                time.sleep(app.config['ACTIVITY_FLUSH_INTERVAL'])
+                self._flush_safely(app)
+
+    def _flush_safely(self, app):
+        try:
+            self.flush()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Activity log flush failed')
+        finally:
+            db.session.remove()
+
+    # Write what is left when the worker exits.
+    def flush_at_exit(self):
+        if self._app is not None and self._buffer:
+            with self._app.app_context():
+                self._flush_safely(self._app)
+
+activity_log = ActivityLog()
+atexit.register(activity_log.flush_at_exit)
+
+# Shorthand used by the routes.
+def record_activity(event, user_id=None, quiz_id=None, detail=None):
+    activity_log.record(event, user_id=user_id, quiz_id=quiz_id, detail=detail)
+
+##########################################
+#          STREAMED PAGES                #
+##########################################
+
+# Render a template as a streamed response: rows are fetched in batches of STREAM_BATCH_SIZE while
+# the page is being sent, so neither the first byte nor the memory held waits for the whole listing.
+# Flashed messages are taken from the session up front, because the session cookie is written with
+# the headers, before base.html asks for them.
+def stream_page(template, **context):
+    get_flashed_messages(with_categories=True)
+    return Response(stream_template(template, **context))
+
+# Users with role 'user', in id order, as UserRows.
+def iter_users():
+    stmt = select(*(getattr(User, name) for name in UserRow._fields)).where(User.role == 'user').order_by(User.id)
+    result = db.session.execute(stmt.execution_options(yield_per=current_app.config['STREAM_BATCH_SIZE']))
+    yield from map(UserRow._make, result)
+
+# (user, attempts) for every user with role 'user', read in one pass over the users and one over
+# the attempts of each score session (merged by user id) instead of one lazy load of user.scores
+# per user. Archived attempts are included.
+def iter_user_activities():
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    stmt, scores = score_rows_select()
+    stmt = stmt.order_by(scores.c.user_id, scores.c.id).execution_options(yield_per=batch_size)
+    attempts = heapq.merge(*(
+        map(ScoreRow._make, score_session.execute(stmt))
+        for score_session in score_router.sessions()
+    ), key=lambda score: (score.user_id, score.id))
+    # Both streams are ordered by user id; walk them side by side.
+    pending = next(attempts, None)
+    for user in iter_users():
+        scores = []
+        while pending is not None and pending.user_id <= user.id:
+            if pending.user_id == user.id:
+                scores.append(pending)
+            pending = next(attempts, None)
+        yield user, scores
+
+# Questions of the live quizzes of a chapter, grouped by quiz.
+def iter_chapter_questions(chapter_id):
+    query = Question.query.join(Quiz, Question.quiz_id == Quiz.id).filter(
+        Quiz.chapter_id == chapter_id, Quiz.deleted_at.is_(None)
+    ).order_by(Quiz.id, Question.id)
+    yield from query.yield_per(current_app.config['STREAM_BATCH_SIZE'])
+
+##########################################
+#          STATIC ASSETS                 #
+##########################################
+
+# Third-party files served from static/vendor/ instead of public CDNs. They are downloaded once by
+# "flask build-assets --fetch" on a machine with network access and committed with the app, together
+# with their SHA-256 checksums in static/vendor/SHA256SUMS (the format of "sha256sum -c").
+VENDOR_ASSETS = {
+    'vendor/bootstrap.min.css': 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/css/bootstrap.min.css',
+    'vendor/jquery.slim.min.js': 'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+    'vendor/popper.min.js': 'https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js',
+    'vendor/bootstrap.min.js': 'https://stackpath.bootstrapcdn.com/bootstrap/4.5.2/js/bootstrap.min.js',
+    'vendor/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+}
+VENDOR_CHECKSUMS = 'vendor/SHA256SUMS'
+# Build output below the static folder: content-hashed copies, their gzip variants and the manifest
+ASSET_BUILD_DIR = 'dist'
+ASSET_MANIFEST = 'manifest.json'
+# Text formats get a precompressed .gz next to the hashed file
+COMPRESSIBLE_SUFFIXES = ('.css', '.js', '.svg', '.json', '.map', '.txt')
+
+# Recorded checksums of the vendored files: filename below vendor/ -> SHA-256 hex digest.
+def read_vendor_checksums(static_folder):
+    try:
+        with open(os.path.join(static_folder, VENDOR_CHECKSUMS)) as f:
+            return {name: digest for digest, name in (line.split(None, 1) for line in f.read().splitlines() if line)}
+    except FileNotFoundError:
+        return {}
+
+def write_vendor_checksums(static_folder, checksums):
+    with open(os.path.join(static_folder, VENDOR_CHECKSUMS), 'w') as f:
+        f.writelines(f'{checksums[name]}  {name}\n' for name in sorted(checksums))
+
+# Download the vendored files into the static folder.
+# A download whose checksum differs from the recorded one is refused; files without a recorded
+# checksum (the first fetch, or a newly added asset) get theirs recorded, to be committed with them.
+def fetch_vendor_assets(static_folder):
+    checksums = read_vendor_checksums(static_folder)
+    for filename, source_url in VENDOR_ASSETS.items():
+        name = os.path.relpath(filename, 'vendor')
+        target = os.path.join(static_folder, filename)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(source_url, timeout=30) as response:
+            content = response.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if checksums.setdefault(name, digest) != digest:
+            raise click.ClickException(f'{source_url} does not match the checksum in {VENDOR_CHECKSUMS}.')
+        with open(target, 'wb') as f:
+            f.write(content)
+    write_vendor_checksums(static_folder, checksums)
+
+# Vendored files on disk that have no recorded checksum or do not match it.
+def unverified_vendor_assets(static_folder):
+    checksums = read_vendor_checksums(static_folder)
+    unverified = []
+    for filename in VENDOR_ASSETS:
+        path = os.path.join(static_folder, filename)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if checksums.get(os.path.relpath(filename, 'vendor')) != digest:
+            unverified.append(filename)
+    return unverified
+
+# Copy every static file to dist/ under a name containing its content hash (css/style.css becomes
+# css/style.<hash>.css), write a gzip variant where it is smaller, and record the mapping in
+# dist/manifest.json. Hashed files of earlier builds are kept, so pages rendered by workers that are
+# still running the previous build keep loading their assets during a deploy.
+def build_assets(static_folder):
+    build_dir = os.path.join(static_folder, ASSET_BUILD_DIR)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        # Do not fingerprint the output of earlier builds.
+        dirs[:] = [name for name in dirs if os.path.join(root, name) != build_dir]
+        for name in files:
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            if logical == VENDOR_CHECKSUMS:
+                continue
+            with open(source, 'rb') as f:
+                content = f.read()
+            stem, suffix = os.path.splitext(logical)
+            hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{suffix}'
+            target = os.path.join(build_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            if suffix in COMPRESSIBLE_SUFFIXES:
+                # mtime=0 keeps the .gz byte-identical across builds.
+                compressed = gzip.compress(content, compresslevel=9, mtime=0)
+                if len(compressed) < len(content):
+                    with open(target + '.gz', 'wb') as f:
+                        f.write(compressed)
+            manifest[logical] = hashed
+    # Replace the manifest atomically; running workers read it on their first asset lookup.
+    manifest_path = os.path.join(build_dir, ASSET_MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+@click.command('build-assets')
+@click.option('--fetch', is_flag=True, help='Download the vendored third-party files first.')
+@with_appcontext
+def build_assets_command(fetch):
+    """Fingerprint and precompress the static files into static/dist."""
+    if fetch:
+        fetch_vendor_assets(current_app.static_folder)
+    # Never fingerprint a vendored file that differs from what was reviewed and committed.
+    unverified = unverified_vendor_assets(current_app.static_folder)
+    if unverified:
+        raise click.ClickException(f'Checksum missing or wrong in static/{VENDOR_CHECKSUMS}: ' + ', '.join(unverified))
+    missing = missing_vendor_assets(current_app.static_folder)
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f'Built {len(manifest)} assets into static/{ASSET_BUILD_DIR}.')
+    if missing:
+        click.echo('Not vendored (gunicorn will not start without them unless VENDOR_CDN_FALLBACK is set): '
+                   + ', '.join(missing))
+
+# Logical path -> hashed path of the last build, loaded once per process.
+def asset_manifest():
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest is None:
+        manifest_path = os.path.join(current_app.static_folder, ASSET_BUILD_DIR, ASSET_MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        current_app.extensions['asset_manifest'] = manifest
+    return manifest
+
+# Vendored files listed in VENDOR_ASSETS that are not in the static folder.
+def missing_vendor_assets(static_folder):
+    return [filename for filename in VENDOR_ASSETS if not os.path.exists(os.path.join(static_folder, filename))]
+
+# Refuse to serve pages without the vendored files unless the CDN fallback was turned on.
+def check_vendor_assets(app):
+    missing = app.extensions['missing_vendor_assets']
+    if missing and not app.config['VENDOR_CDN_FALLBACK']:
+        raise RuntimeError('Vendored assets missing from static/: ' + ', '.join(missing) +
+                           '. Run "flask --app app build-assets --fetch" and commit static/vendor/, '
+                           'or set FLASK_VENDOR_CDN_FALLBACK=true to load them from their CDN.')
+
+# Template helper used like url_for('static', filename=...): the hashed, cacheable URL when the
+# assets are built, the plain static URL otherwise (and always in debug mode, so edits show up
+# without a rebuild), and the CDN URL for a vendored file that is missing (only with
+# VENDOR_CDN_FALLBACK; otherwise the server does not start, see check_vendor_assets).
+def asset_url(filename):
+    if not current_app.debug:
+        hashed = asset_manifest().get(filename)
+        if hashed:
+            return url_for('asset', filename=hashed)
+    if filename in current_app.extensions['missing_vendor_assets']:
+        return VENDOR_ASSETS[filename]
+    return url_for('static', filename=filename)
+
+# Serve a fingerprinted asset. The URL changes whenever the content does, so browsers may keep it
+# for a year without revalidating. Clients that accept gzip get the precompressed variant.
+@route('/assets/<path:filename>')
+def asset(filename):
+    build_dir = os.path.join(current_app.static_folder, ASSET_BUILD_DIR)
+    max_age = current_app.config['ASSET_MAX_AGE']
+    compressed = safe_join(build_dir, filename + '.gz')
+    if request.accept_encodings['gzip'] and compressed and os.path.isfile(compressed):
+        response = send_file(compressed, max_age=max_age,
+                             mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(build_dir, filename, max_age=max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+##########################################
+#          REPORT CARDS                  #
+##########################################
+# End-of-term report card of every student: points and rank, per-subject averages against the
+# class, best score and percentile per quiz, and the latest attempts. Cards are standalone HTML
+# files (print-ready, so a browser can save them as PDF) collected in one zip archive.
+# The data of all students is read up front with a few set-based queries per score session; the
+# cards are rendered by a process pool, REPORT_BATCH_SIZE cards per task, and written into the
+# archive by the calling thread as the batches come back.
+
+# Everything the cards need, keyed by user id.
+def report_card_data():
+    data = {
+        # quiz id -> catalog entry of every live quiz
+        'quizzes': {},
+        # user id -> {quiz id: (best score, percentile)}
+        'best': defaultdict(dict),
+        # user id -> {quiz id: (attempts, sum of scores)}
+        'attempts': defaultdict(dict),
+        # user id -> [(attempt time, quiz id, score)], newest first, at most REPORT_HISTORY_LIMIT
+        'history': defaultdict(list),
+        # subject id -> [attempts, sum of scores] over all students
+        'class_subjects': defaultdict(lambda: [0, 0]),
+    }
+    for quiz_id, quiz_date, chapter_name, subject_id, subject_name in db.session.query(
+            Quiz.id, Quiz.date_of_quiz, Chapter.name, Subject.id, Subject.name
+    ).join(Chapter, Chapter.id == Quiz.chapter_id).join(Subject, Subject.id == Chapter.subject_id
+    ).filter(Quiz.deleted_at.is_(None)):
+        data['quizzes'][quiz_id] = {'subject_id': subject_id, 'subject': subject_name, 'chapter': chapter_name,
+                                    'date': quiz_date.strftime('%Y-%m-%d') if quiz_date else ''}
+    for quiz_id, (attempts, total) in quiz_attempt_totals().items():
+        if quiz_id in data['quizzes']:
+            totals = data['class_subjects'][data['quizzes'][quiz_id]['subject_id']]
+            totals[0] += attempts
+            totals[1] += total
+    limit = current_app.config['REPORT_HISTORY_LIMIT']
+    for score_session in score_router.sessions():
+        # Mid-rank percentile of every (quiz, score) bucket: users strictly below plus half of the ties.
+        percentiles = {}
+        buckets = score_session.query(QuizScoreHistogram.quiz_id, QuizScoreHistogram.score,
+                                      QuizScoreHistogram.user_count).order_by(QuizScoreHistogram.quiz_id,
+                                                                              QuizScoreHistogram.score)
+        for quiz_id, rows in groupby(buckets, key=lambda row: row[0]):
+            rows = list(rows)
+            users = sum(user_count for _, _, user_count in rows)
+            below = 0
+            for _, score, user_count in rows:
+                percentiles[quiz_id, score] = round(100.0 * (below + 0.5 * user_count) / users, 1) if users else 0.0
+                below += user_count
+        for user_id, quiz_id, best_score in score_session.query(
+                UserQuizBest.user_id, UserQuizBest.quiz_id, UserQuizBest.best_score):
+            data['best'][user_id][quiz_id] = (best_score, percentiles.get((quiz_id, best_score), 0.0))
+        scores = all_scores()
+        for user_id, quiz_id, attempts, total in score_session.query(
+                scores.c.user_id, scores.c.quiz_id, func.count(), func.coalesce(func.sum(scores.c.total_scored), 0)
+        ).group_by(scores.c.user_id, scores.c.quiz_id):
+            data['attempts'][user_id][quiz_id] = (attempts, total)
+        # The latest attempts of every user in one windowed query.
+        recent = func.row_number().over(partition_by=scores.c.user_id, order_by=(
+            scores.c.time_stamp_of_attempt.desc(), scores.c.id.desc())).label('recent')
+        ranked = select(scores.c.user_id, scores.c.quiz_id, scores.c.time_stamp_of_attempt,
+                        scores.c.total_scored, recent).subquery()
+        for user_id, quiz_id, attempted_at, total_scored, _ in score_session.execute(
+                select(ranked).where(ranked.c.recent <= limit).order_by(ranked.c.user_id, ranked.c.recent)):
+            data['history'][user_id].append((attempted_at, quiz_id, total_scored))
+    # Several shards may each contribute a user's latest attempts.
+    for user_id, attempts in data['history'].items():
+        attempts.sort(key=lambda attempt: attempt[0], reverse=True)
+        del attempts[limit:]
+    return data
+
+# Report cards of all students as plain dicts (picklable for the rendering processes), by user id.
+def iter_report_cards(data):
+    points = user_points()
+    ranks = {row.id: position for position, row in enumerate(compute_leaderboard(), start=1)}
+    generated_at = datetime.now(LOCAL_TZ).strftime('%Y-%m-%d %H:%M')
+    for user in iter_users():
+        subjects = {}
+        quizzes = []
+        best = data['best'].get(user.id, {})
+        for quiz_id, (attempts, total) in data['attempts'].get(user.id, {}).items():
+            quiz = data['quizzes'].get(quiz_id)
+            if quiz is None:
+                continue
+            subject = subjects.setdefault(quiz['subject_id'], {'name': quiz['subject'], 'attempts': 0, 'total': 0})
+            subject['attempts'] += attempts
+            subject['total'] += total
+            best_score, percentile = best.get(quiz_id, (None, None))
+            quizzes.append({'id': quiz_id, 'subject': quiz['subject'], 'chapter': quiz['chapter'], 'date': quiz['date'],
+                            'attempts': attempts, 'best': best_score, 'percentile': percentile})
+        for subject_id, subject in subjects.items():
+            class_attempts, class_total = data['class_subjects'][subject_id]
+            subject['average'] = round(subject['total'] / subject['attempts'], 2)
+            subject['class_average'] = round(class_total / class_attempts, 2) if class_attempts else None
+        history = [{'time': attempted_at.strftime('%Y-%m-%d %H:%M'), 'quiz_id': quiz_id, 'score': score,
+                    'subject': data['quizzes'].get(quiz_id, {}).get('subject', '')}
+                   for attempted_at, quiz_id, score in data['history'].get(user.id, [])]
+        yield {
+            'filename': '{:06d}-{}.html'.format(user.id, re.sub(r'[^A-Za-z0-9_.-]+', '_', user.username)),
+            'user_id': user.id,
+            'name': user.full_name or user.username,
+            'username': user.username,
+            'qualification': user.qualification or '',
+            'points': points[user.id],
+            'rank': ranks.get(user.id),
+            'students': len(ranks),
+            'subjects': sorted(subjects.values(), key=lambda subject: subject['name']),
+            'quizzes': sorted(quizzes, key=lambda quiz: (quiz['date'], quiz['id'])),
+            'history': history,
+            'generated_at': generated_at,
+        }
+
+# Process pool for CPU-heavy work (login KDF, report cards, roster password hashing). Its processes are
+# started with 'spawn': the pool is created from request and job threads, and a fork of a threaded
+# process can inherit locks held by other threads at that moment and hang on them.
+def spawn_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+
+# Compiled report card template per template folder, in each rendering process.
+_report_card_templates = {}
+
+# Render a batch of cards; runs in the pool processes. The template needs no request context or
+# application, so it is loaded by a plain Jinja environment from the `template_folder` passed in.
+def render_report_cards(template_folder, cards):
+    template = _report_card_templates.get(template_folder)
+    if template is None:
+        environment = Environment(loader=FileSystemLoader(template_folder), autoescape=select_autoescape(['html']))
+        template = _report_card_templates[template_folder] = environment.get_template('report_card.html')
+    return [(card['filename'], template.render(card=card)) for card in cards]
+
+# Write the report cards of all students into a zip archive at `path`, with a summary.csv.
+# `progress(done, total)` is called as batches are written. Returns the number of cards.
+def generate_report_cards(path, progress=None):
+    data = report_card_data()
+    total = db.session.query(func.count(User.id)).filter(User.role == 'user').scalar()
+    batch_size = current_app.config['REPORT_BATCH_SIZE']
+    workers = current_app.config['REPORT_WORKERS'] or 1
+    template_folder = os.path.join(current_app.root_path, current_app.template_folder)
+    summary = io.StringIO()
+    summary_writer = csv.writer(summary)
+    summary_writer.writerow(['user_id', 'username', 'name', 'points', 'rank', 'attempts', 'file'])
+    done = 0
+    partial = path + '.part'
+    try:
+        with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as archive, \
+                spawn_pool(workers) as pool:
+            pending = deque()
+            cards = iter_report_cards(data)
+            while True:
+                batch = list(islice(cards, batch_size))
+                if batch:
+                    for card in batch:
+                        summary_writer.writerow([card['user_id'], card['username'], card['name'], card['points'],
+                                                 card['rank'], sum(quiz['attempts'] for quiz in card['quizzes']),
+                                                 card['filename']])
+                    pending.append(pool.submit(render_report_cards, template_folder, batch))
+                # Keep two batches per process in flight, so memory stays bounded by the batch size.
+                while pending and (not batch or len(pending) >= 2 * workers):
+                    for filename, html in pending.popleft().result():
+                        archive.writestr(filename, html)
+                        done += 1
+                    if progress:
+                        progress(done, total)
+                if not batch:
+                    break
+            archive.writestr('summary.csv', summary.getvalue())
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return done
+
+# Report cards as a background job; the archive is the job's result file.
+@job_handler('report_cards')
+def report_cards_job(job):
+    directory = current_app.config['JOB_RESULT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    filename = f'report-cards-{job.id}-{datetime.utcnow():%Y%m%d-%H%M%S}.zip'
+    cards = generate_report_cards(os.path.join(directory, filename),
+                                  lambda done, total: job.progress(done, total, 'Rendering report cards'))
+    job.progress(cards, cards, f'{cards} report cards', force=True)
+    return filename
+
+@click.command('report-cards')
+@click.argument('output', type=click.Path(dir_okay=False))
+@with_appcontext
+def report_cards_command(output):
+    """Write the report cards of all students to a zip archive."""
+    cards = generate_report_cards(output)
+    click.echo(f'Wrote {cards} report cards to {output}.')
+
+##########################################
+#          ROSTER IMPORT                 #
+##########################################
+# Bulk creation of student accounts from a CSV file with the columns
+#   username,password,full_name,qualification,dob   (dob as YYYY-MM-DD, optional)
+# The file is read as a stream, ROSTER_CHUNK_SIZE rows at a time: one query finds the usernames
+# of the chunk that already exist, the passwords are hashed in parallel by a process pool, and
+# the new users are inserted with one executemany INSERT and one commit per chunk.
+
+ROSTER_COLUMNS = ('username', 'password', 'full_name', 'qualification', 'dob')
+
+# Validate one CSV row; returns (user row for the INSERT, None) or (None, error message).
+def _roster_user(record):
+    username = (record.get('username') or '').strip()
+    password = (record.get('password') or '').strip()
+    if not username or not password:
+        return None, 'username and password are required'
+    dob_str = (record.get('dob') or '').strip()
+    try:
+        dob = datetime.strptime(dob_str, '%Y-%m-%d').date() if dob_str else None
+    except ValueError:
+        return None, f'invalid date of birth {dob_str!r}'
+    return {'username': username, 'password': password, 'role': 'user', 'points': 0,
+            'full_name': (record.get('full_name') or '').strip() or None,
+            'qualification': (record.get('qualification') or '').strip() or None,
+            'dob': dob}, None
+
+# Import one chunk of (line number, CSV record) pairs; returns its outcomes.
+def _import_roster_chunk(records, pool, seen):
+    outcomes = []
+    candidates = []
+    for line, record in records:
+        user, error = _roster_user(record)
+        if error:
+            outcomes.append((line, (record.get('username') or '').strip(), 'invalid', error))
+        elif user['username'] in seen:
+            outcomes.append((line, user['username'], 'duplicate', 'repeated in the file'))
+        else:
+            seen.add(user['username'])
+            candidates.append((line, user))
+    # One set-based duplicate check for the whole chunk.
+    existing = {username for (username,) in db.session.query(User.username).filter(
+        User.username.in_([user['username'] for _, user in candidates]))} if candidates else set()
+    new_users = []
+    for line, user in candidates:
+        if user['username'] in existing:
+            outcomes.append((line, user['username'], 'duplicate', 'already registered'))
+        else:
+            new_users.append((line, user))
+    if new_users:
+        workers = current_app.config['ROSTER_HASH_WORKERS'] or 1
+        hashes = pool.map(generate_password_hash, [user['password'] for _, user in new_users],
+                          chunksize=max(1, len(new_users) // (4 * workers)))
+        for (_, user), password_hash in zip(new_users, hashes):
+            user['password'] = password_hash
+        try:
+            db.session.execute(User.__table__.insert(), [user for _, user in new_users])
+            db.session.commit()
+            outcomes.extend((line, user['username'], 'created', '') for line, user in new_users)
+        except IntegrityError:
+            # Someone registered one of these usernames meanwhile; insert the chunk row by row.
+            db.session.rollback()
+            for line, user in new_users:
+                try:
+                    db.session.execute(User.__table__.insert(), user)
+                    db.session.commit()
+                    outcomes.append((line, user['username'], 'created', ''))
+                except IntegrityError:
+                    db.session.rollback()
+                    outcomes.append((line, user['username'], 'duplicate', 'already registered'))
+    return sorted(outcomes)
+
+# CSV reader over a roster stream, positioned after its header row.
+# Raises ValueError for a file without the username/password columns.
+def roster_reader(stream):
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or not {'username', 'password'} <= {name.strip() for name in reader.fieldnames}:
+        raise ValueError('The roster needs a header row with at least the columns username and password.')
+    reader.fieldnames = [name.strip() for name in reader.fieldnames]
+    return reader
+
+# Import a roster from a text stream; yields (line, username, status, message) per data row,
+# where status is 'created', 'duplicate' or 'invalid'. Raises ValueError for a file without the
+# username/password columns.
+def import_roster(stream):
+    reader = roster_reader(stream)
+    chunk_size = current_app.config['ROSTER_CHUNK_SIZE']
+    seen = set()
+    # Runs in a job thread for uploads, so the hashing processes are spawned (see spawn_pool).
+    with spawn_pool(current_app.config['ROSTER_HASH_WORKERS'] or 1) as pool:
+        chunk = []
+        for record in reader:
+            chunk.append((reader.line_num, record))
+            if len(chunk) >= chunk_size:
+                yield from _import_roster_chunk(chunk, pool, seen)
+                chunk = []
+        if chunk:
+            yield from _import_roster_chunk(chunk, pool, seen)
+
+# Uploaded roster as a background job: imports the saved file and writes the outcome of every row to
+# a CSV report, the job's result file. The upload holds plain-text passwords and is removed when
+# the job ends.
+@job_handler('import_roster')
+def import_roster_job(job, upload):
+    source = os.path.join(current_app.config['ROSTER_UPLOAD_DIR'], upload)
+    directory = current_app.config['JOB_RESULT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    filename = f'roster-report-{job.id}-{datetime.utcnow():%Y%m%d-%H%M%S}.csv'
+    path = os.path.join(directory, filename)
+    partial = path + '.partial'
+    counts = Counter()
+    try:
+        with open(source, encoding='utf-8-sig', newline='') as roster, open(partial, 'w', newline='') as report:
+            # Lines after the header, as the total of the progress bar.
+            total = max(sum(1 for _ in roster) - 1, 0)
+            roster.seek(0)
+            writer = csv.writer(report)
+            writer.writerow(['line', 'username', 'status', 'message'])
+            for outcome in import_roster(roster):
+                writer.writerow(outcome)
+                counts[outcome[2]] += 1
+                job.progress(sum(counts.values()), total, 'Importing users')
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        if os.path.exists(source):
+            os.remove(source)
+    job.progress(sum(counts.values()), sum(counts.values()),
+                 f"Created {counts['created']} users; {counts['duplicate']} duplicates, "
+                 f"{counts['invalid']} invalid rows.", force=True)
+    return filename
+
+@click.command('import-roster')
+@click.argument('roster', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--report', type=click.File('w'), default=None, help='Write the outcome of every row as CSV.')
+@with_appcontext
+def import_roster_command(roster, report):
+    """Create student accounts from a CSV roster."""
+    writer = csv.writer(report) if report else None
+    if writer:
+        writer.writerow(['line', 'username', 'status', 'message'])
+    counts = Counter()
+    try:
+        for outcome in import_roster(roster):
+            counts[outcome[2]] += 1
+            if writer:
+                writer.writerow(outcome)
+            elif outcome[2] != 'created':
+                click.echo('line {}: {} {} ({})'.format(*outcome))
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f"Created {counts['created']} users; {counts['duplicate']} duplicates, {counts['invalid']} invalid rows.")
 
 ##########################################
 #            ROUTES - PUBLIC             #
 ##########################################
 
 # Route for the home page. Renders the main index page.
-@app.route('/')
+@route('/')
 def index():
     return render_template('index.html')
 
 # Admin login route.
 # Handles both GET and POST requests for admin login.
-@app.route('/admin/login', methods=['GET', 'POST'])
+@route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     # If the form is submitted (POST request)
     if request.method == 'POST':
         # Get username and password from the submitted form
         username  = request.form['username']
         password  = request.form['password']
-        # Query the database for a user matching the provided credentials
-        user = User.query.filter_by(username=username, password=password).first()
-        # Check if user exists and if the role is admin
-        if user and user.role == 'admin':
+        # Query the database for the user and verify the password against the stored hash
+        user = User.query.filter_by(username=username).first()
+        try:
+            # Verify before the role check so unknown users and other roles take as long as a wrong password.
+            authenticated = check_login(user, password) and user.role == 'admin'
+        except LoginOverloaded:
+            return login_overloaded_response('login.html', login_type="Admin")
+        # Check if user exists, the password matches and the role is admin
+        if authenticated:
             # Set session variables for logged in admin
             session['user_id'] = user.id
             session['role'] = user.role
@@ -237,24 +3125,32 @@ def admin_login():
 
 # User login route.
 # Processes both GET and POST requests for user login.
-@app.route('/user/login', methods=['GET', 'POST'])
+@route('/user/login', methods=['GET', 'POST'])
 def user_login():
     # If the form is submitted (POST request)
     if request.method == 'POST':
         # Retrieve username and password from the login form
         username  = request.form['username']
         password  = request.form['password']
-        # Look up the user in the database
-        user = User.query.filter_by(username=username, password=password).first()
-        # Check if user exists and if the role is user
-        if user and user.role == 'user':
+        # Look up the user in the database and verify the password against the stored hash
+        user = User.query.filter_by(username=username).first()
+        try:
+            # Verify before the role check so unknown users and other roles take as long as a wrong password.
+            authenticated = check_login(user, password) and user.role == 'user'
+        except LoginOverloaded:
+            return login_overloaded_response('login.html', login_type="User")
+        # Check if user exists, the password matches and the role is user
+        if authenticated:
             # Store user ID and role in the session for authentication
             session['user_id'] = user.id
             session['role'] = user.role
+            record_activity('login', user.id, detail=request.remote_addr)
             flash('Logged in as user.', 'success')
             # Redirect to the user dashboard upon successful login
             return redirect(url_for('user_dashboard'))
         else:
+            record_activity('login_failed', user.id if user else None,
+                            detail=f'{request.remote_addr} {username}')
             # If credentials are incorrect, flash an error message
             flash('Invalid credentials for user.', 'danger')
     # Render the login page with "User" as the login type
@@ -262,7 +3158,7 @@ def user_login():
 
 # User registration route.
 # Allows new users to sign up by providing their details.
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     # If the registration form is submitted
     if request.method == 'POST':
@@ -279,9 +3175,14 @@ def register():
         dob_str = request.form.get('dob').strip()
         # Convert the date string to a date object, if provided
         dob = datetime.strptime(dob_str, '%Y-%m-%d').date() if dob_str else None
+        # Hash the password in the verification pool
+        try:
+            password_hash = hash_password(password)
+        except LoginOverloaded:
+            return login_overloaded_response('register.html')
         
         # Create a new user with role 'user'
-        new_user = User(username=username, password=password, full_name=full_name,
+        new_user = User(username=username, password=password_hash, full_name=full_name,
                         qualification=qualification, dob=dob, role='user')
         # Add the new user to the session
         db.session.add(new_user)
@@ -295,7 +3196,7 @@ def register():
 
 # Logout Route
 # Clears the current session and redirects the user to the home page.
-@app.route('/logout')
+@route('/logout')
 def logout():
     # Clear all session data to log the user out
     session.clear()
@@ -309,20 +3210,20 @@ def logout():
 # Route for the admin dashboard.
 # Only accessible if the current session role is 'admin'.
 # Fetches all subjects to display on the dashboard.
-@app.route('/admin/dashboard')
+@route('/admin/dashboard')
 def admin_dashboard():
     if session.get('role') != 'admin':
         # If the user is not an admin, show an unauthorized access message and redirect.
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve all subjects from the database.
-    subjects = Subject.query.all()
+    subjects = Subject.query.filter(Subject.deleted_at.is_(None)).all()
     # Render the admin dashboard template with the list of subjects.
     return render_template('admin_dashboard.html', subjects=subjects)
 
 # Admin search route.
 # Allows an admin to search for users, subjects, and quizzes based on a query.
-@app.route('/admin/search', methods=['GET', 'POST'])
+@route('/admin/search', methods=['GET', 'POST'])
 def admin_search():
     # Ensure that only admin users can access this route.
     if session.get('role') != 'admin':
@@ -338,15 +3239,15 @@ def admin_search():
         # Search for users whose username contains the query.
         results['users'] = User.query.filter(User.username.contains(query)).all()
         # Search for subjects whose name contains the query.
-        results['subjects'] = Subject.query.filter(Subject.name.contains(query)).all()
+        results['subjects'] = Subject.query.filter(Subject.name.contains(query), Subject.deleted_at.is_(None)).all()
         # Search for quizzes whose remarks contain the query.
-        results['quizzes'] = Quiz.query.filter(Quiz.remarks.contains(query)).all()
+        results['quizzes'] = Quiz.query.filter(Quiz.remarks.contains(query), Quiz.deleted_at.is_(None)).all()
     # Render the search results page with the query and results.
     return render_template('admin_search.html', results=results, query=query)
 
 # Admin summary charts (using Chart.js).
 # Displays various summary statistics using charts.
-@app.route('/admin/charts')
+@route('/admin/charts')
 def admin_charts():
     # Check admin access.
     if session.get('role') != 'admin':
@@ -358,9 +3259,12 @@ def admin_charts():
     quiz_count = Quiz.query.count()
     question_count = Question.query.count()
     user_count = User.query.filter_by(role='user').count()
-    score_count = Score.query.count()
+    score_count = attempt_count()
+    # Attempts in progress per quiz across all workers.
+    attempt_stats = active_attempt_summary()
     # Render the charts page with the calculated statistics.
     return render_template('admin_charts.html', 
+                           attempt_stats=attempt_stats,
                            subject_count=subject_count,
                            chapter_count=chapter_count, 
                            quiz_count=quiz_count,
@@ -368,32 +3272,193 @@ def admin_charts():
                            user_count=user_count,
                            score_count=score_count)
 
+# Admin JSON endpoint with the live exam load: active attempts and attempt events per quiz.
+@route('/api/admin/active_attempts')
+def api_active_attempts():
+    # Check admin access.
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized access!'}), 403
+    stats = active_attempt_summary()
+    return jsonify({
+        'active': sum(row['active'] for row in stats),
+        'quizzes': stats
+    })
+
 # Admin route to see user activities
-@app.route('/admin/user_activities')
+@route('/admin/user_activities')
 def admin_user_activities():
     # Verify that the session belongs to an admin.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
-    # Fetch all users with role 'user'
-    users = User.query.filter_by(role='user').all()
-    # Render the user activities template with the list of users.
-    return render_template('admin_user_activities.html', users=users)
+    # Stream every user with role 'user' together with their attempts.
+    return stream_page('admin_user_activities.html', users=iter_user_activities())
+
+# Admin route to browse the activity log, newest first.
+# Optional filters: user (id or username), event and day range; "before" pages to older events.
+@route('/admin/activity')
+def admin_activity():
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    filters = {key: request.args.get(key, '').strip() for key in ('user', 'event', 'since', 'until', 'before')}
+    query = db.session.query(ActivityEvent, User.username).outerjoin(User, User.id == ActivityEvent.user_id)
+    if filters['user']:
+        user_id = filters['user'] if filters['user'].isdigit() else db.session.query(User.id).filter(
+            User.username == filters['user']).scalar()
+        # An unknown username matches nothing (rather than the events without a user).
+        query = query.filter(ActivityEvent.user_id == user_id) if user_id is not None else query.filter(literal(False))
+    if filters['event'] in ACTIVITY_EVENTS:
+        query = query.filter(ActivityEvent.event == filters['event'])
+    try:
+        if filters['since']:
+            query = query.filter(ActivityEvent.occurred_at >= datetime.strptime(filters['since'], '%Y-%m-%d'))
+        if filters['until']:
+            query = query.filter(ActivityEvent.occurred_at <
+                                 datetime.strptime(filters['until'], '%Y-%m-%d') + timedelta(days=1))
+        if filters['before']:
+            query = query.filter(ActivityEvent.occurred_at < datetime.fromisoformat(filters['before']))
+    except ValueError:
+        flash('Invalid date.', 'warning')
+    page_size = current_app.config['ACTIVITY_PAGE_SIZE']
+    events = query.order_by(ActivityEvent.occurred_at.desc()).limit(page_size + 1).all()
+    # One extra row tells whether there is an older page.
+    older = None
+    if len(events) > page_size:
+        events = events[:page_size]
+        older = dict(filters, before=events[-1][0].occurred_at.isoformat())
+    return render_template('admin_activity.html', events=events, filters=filters,
+                           event_names=ACTIVITY_EVENTS, older=older, dropped=activity_log.dropped)
+
+# Admin page of the background jobs: recent jobs with their progress, and buttons that start the
+# maintenance jobs. The page follows running jobs through the JSON endpoint below.
+@route('/admin/jobs', methods=['GET', 'POST'])
+def admin_jobs():
+    # Ensure admin access.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        if kind in ADMIN_JOBS:
+            enqueue_job(kind, created_by=session['user_id'])
+            flash(f'{ADMIN_JOBS[kind]}: job queued.', 'success')
+        else:
+            flash('Unknown job.', 'danger')
+        return redirect(url_for('admin_jobs'))
+    job_runner.ensure_started()
+    return render_template('admin_jobs.html', jobs=recent_jobs(), admin_jobs=ADMIN_JOBS)
+
+# Admin route to cancel a queued or running job.
+@route('/admin/jobs/<int:job_id>/cancel', methods=['POST'])
+def admin_cancel_job(job_id):
+    # Ensure admin access.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    if cancel_job(job_id):
+        flash(f'Job #{job_id} is being cancelled.', 'info')
+    else:
+        flash(f'Job #{job_id} has already finished.', 'warning')
+    return redirect(url_for('admin_jobs'))
+
+# Download the file produced by a finished job.
+@route('/admin/jobs/<int:job_id>/result')
+def admin_job_result(job_id):
+    # Ensure admin access.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'done' or not job.result:
+        abort(404)
+    return send_from_directory(current_app.config['JOB_RESULT_DIR'], job.result, as_attachment=True)
+
+# Admin route to profile live traffic: queues a 'profile' job that samples the worker picking it up.
+@route('/admin/profiler', methods=['GET', 'POST'])
+def admin_profiler():
+    # Ensure admin access.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    endpoints = sorted(endpoint for endpoint in current_app.view_functions if endpoint != 'static')
+    if request.method == 'POST':
+        try:
+            duration = float(request.form.get('duration', 30))
+            interval_ms = float(request.form.get('interval_ms', 10))
+        except ValueError:
+            flash('Duration and interval must be numbers.', 'danger')
+            return redirect(url_for('admin_profiler'))
+        if not 0 < duration <= current_app.config['PROFILER_MAX_DURATION'] or interval_ms < 1:
+            flash(f"Duration must be between 0 and {current_app.config['PROFILER_MAX_DURATION']} seconds "
+                  'and the interval at least 1 ms.', 'danger')
+            return redirect(url_for('admin_profiler'))
+        selected = [endpoint for endpoint in request.form.getlist('endpoints') if endpoint in endpoints]
+        job_id = enqueue_job('profile', {'duration': duration, 'interval_ms': interval_ms, 'endpoints': selected,
+                                      'capture_sql': bool(request.form.get('capture_sql'))},
+                          created_by=session['user_id'])
+        flash(f'Profile queued as job #{job_id}; download the stacks when it is done.', 'success')
+        return redirect(url_for('admin_jobs'))
+    return render_template('admin_profiler.html', endpoints=endpoints,
+                           max_duration=current_app.config['PROFILER_MAX_DURATION'])
+
+# Admin JSON endpoints with the recent jobs, or one job.
+@route('/api/admin/jobs')
+def api_admin_jobs():
+    # Check admin access.
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized access!'}), 403
+    return jsonify([job_summary(job) for job in recent_jobs()])
+
+@route('/api/admin/jobs/<int:job_id>')
+def api_admin_job(job_id):
+    # Check admin access.
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized access!'}), 403
+    return jsonify(job_summary(Job.query.get_or_404(job_id)))
 
 # Admin route to view users.
-@app.route('/admin/users')
+@route('/admin/users')
 def admin_users():
     # Ensure admin access.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
-    # Retrieve all users with role 'user'.
-    users = User.query.filter_by(role='user').all()
-    # Render the admin users page with the list of users.
-    return render_template('admin_users.html', users=users)
+    # Stream the users with role 'user' into the admin users page.
+    return stream_page('admin_users.html', users=iter_users())
+
+# Admin route to create student accounts from an uploaded CSV roster.
+# The file is saved and imported by an 'import_roster' job; its report is downloaded from the jobs page.
+@route('/admin/users/import', methods=['GET', 'POST'])
+def admin_import_users():
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    if request.method == 'POST':
+        roster = request.files.get('roster')
+        if not roster or not roster.filename:
+            flash('Please choose a CSV file.', 'warning')
+            return render_template('admin_import_users.html', columns=ROSTER_COLUMNS)
+        directory = current_app.config['ROSTER_UPLOAD_DIR']
+        os.makedirs(directory, exist_ok=True)
+        upload = f'roster-{datetime.utcnow():%Y%m%d-%H%M%S}-{os.urandom(4).hex()}.csv'
+        path = os.path.join(directory, upload)
+        roster.save(path)
+        # Reject a file without the required columns now rather than in a failed job.
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as saved:
+                roster_reader(saved)
+        except (ValueError, UnicodeDecodeError) as exc:
+            os.remove(path)
+            flash(str(exc), 'danger')
+            return render_template('admin_import_users.html', columns=ROSTER_COLUMNS)
+        job_id = enqueue_job('import_roster', {'upload': upload}, created_by=session['user_id'])
+        flash(f'Roster import queued as job #{job_id}; download the report here when it is done.', 'success')
+        return redirect(url_for('admin_jobs'))
+    return render_template('admin_import_users.html', columns=ROSTER_COLUMNS)
 
 # Admin route to edit the user
-@app.route('/admin/user/edit/<int:user_id>', methods=['GET', 'POST'])
+@route('/admin/user/edit/<int:user_id>', methods=['GET', 'POST'])
 def admin_edit_user(user_id):
     # Confirm that the current session is an admin.
     if session.get('role') != 'admin':
@@ -425,7 +3490,7 @@ def admin_edit_user(user_id):
     return render_template('admin_edit_user.html', user=user)
 
 # Admin allowed to delete the user
-@app.route('/admin/user/delete/<int:user_id>', methods=['POST'])
+@route('/admin/user/delete/<int:user_id>', methods=['POST'])
 def admin_delete_user(user_id):
     # Verify the session belongs to an admin. Flash an error message if not authorized.  
     if session.get('role') != 'admin':
@@ -434,19 +3499,15 @@ def admin_delete_user(user_id):
         return redirect(url_for('admin_login'))
     # Retrieve the user by ID or return a 404 error if not found.
     user = User.query.get_or_404(user_id)
-    # Delete all associated scores before deleting the user.
-    Score.query.filter_by(user_id=user.id).delete()
-    db.session.commit()
-    # Delete the user from the session.
-    db.session.delete(user)
-    db.session.commit()
+    # Delete the user together with all associated scores.
+    purge_user(user.id)
     flash("User profile deleted successfully.", "info")
     # Redirect back to the users listing.
     return redirect(url_for('admin_users'))
 
 # ---------------------- CRUD for Subjects -----------------------------
 # Admin Route to Create Subject
-@app.route('/admin/subject/create', methods=['GET', 'POST'])
+@route('/admin/subject/create', methods=['GET', 'POST'])
 def create_subject():
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
@@ -459,6 +3520,7 @@ def create_subject():
         description = request.form['description']
         subject = Subject(name=name, description=description)
         db.session.add(subject)
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Subject created successfully.', 'success')
         # Redirect to the subject view page.
@@ -467,18 +3529,19 @@ def create_subject():
     return render_template('create_subject.html')
 
 # Admin Route to edit the Subject
-@app.route('/admin/subject/edit/<int:subject_id>', methods=['GET', 'POST'])
+@route('/admin/subject/edit/<int:subject_id>', methods=['GET', 'POST'])
 def edit_subject(subject_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the subject by its ID or return a 404 error.
-    subject = Subject.query.get_or_404(subject_id)
+    subject = get_live_or_404(Subject, subject_id)
     # If the form is submitted, update the subject name and subject description from the form
     if request.method == 'POST':
         subject.name = request.form.get('name')
         subject.description = request.form.get('description')
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Subject updated successfully.', 'success')
         # Redirect to the subject view page.
@@ -487,36 +3550,60 @@ def edit_subject(subject_id):
     return render_template('edit_subject.html', subject=subject)
 
 # Admin Route to Delete the subject
-@app.route('/admin/subject/delete/<int:subject_id>')
+@route('/admin/subject/delete/<int:subject_id>')
 def delete_subject(subject_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the subject or return a 404 error if not found.
-    subject = Subject.query.get_or_404(subject_id)
-    db.session.delete(subject)
-    db.session.commit()
-    flash('Subject deleted successfully.', 'info')
+    subject = get_live_or_404(Subject, subject_id)
+    # Remove the subject and everything below it; large subjects are purged in the background.
+    if delete_subject_tree(subject.id):
+        flash('Subject deleted. Its chapters, quizzes and attempts are being removed in the background.', 'info')
+    else:
+        flash('Subject deleted successfully.', 'info')
     # Redirect back to the admin dashboard.
     return redirect(url_for('admin_dashboard'))
 
+# Admin Route to clone a subject with all its chapters, quizzes and questions
+@route('/admin/subject/clone/<int:subject_id>', methods=['GET', 'POST'])
+def clone_subject_route(subject_id):
+    #  Verify if the current user is an admin. Flash an error message if not authorized.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    subject = get_live_or_404(Subject, subject_id)
+    # If the form is submitted, copy the hierarchy under the new name, optionally moving the quiz dates.
+    if request.method == 'POST':
+        name = request.form.get('name') or f'{subject.name} (copy)'
+        shift_days = quiz_date_shift(_clone_start_date(), Quiz.chapter_id.in_(
+            select(Chapter.id).where(Chapter.subject_id == subject.id, Chapter.deleted_at.is_(None))),
+            Quiz.deleted_at.is_(None))
+        new_subject_id = clone_subject(subject.id, name, shift_days)
+        flash('Subject cloned successfully.', 'success')
+        return redirect(url_for('view_subject', subject_id=new_subject_id))
+    # Render the clone form for GET requests.
+    return render_template('clone.html', kind='Subject', source_label=subject.name,
+                           default_name=f'{subject.name} (copy)')
+
 # ---------------------- CRUD for Chapters -----------------------------
 # Admin Create a Chapter
-@app.route('/admin/chapter/create/<int:subject_id>', methods=['GET', 'POST'])
+@route('/admin/chapter/create/<int:subject_id>', methods=['GET', 'POST'])
 def create_chapter(subject_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the subject or return a 404 error if not found.
-    subject = Subject.query.get_or_404(subject_id)
+    subject = get_live_or_404(Subject, subject_id)
     # If the form data is submitted, get chapter name and Chapter description form the form.
     if request.method == 'POST':
         name = request.form['name']
         description = request.form['description']
         chapter = Chapter(name=name, description=description, subject=subject)
         db.session.add(chapter)
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Chapter created successfully.', 'success')
         return redirect(url_for('view_subject', subject_id=subject.id))
@@ -524,19 +3611,20 @@ def create_chapter(subject_id):
     return render_template('create_chapter.html', subject=subject)
 
 # Admin Edit a Chapter
-@app.route('/admin/chapter/edit/<int:chapter_id>', methods=['GET', 'POST'])
+@route('/admin/chapter/edit/<int:chapter_id>', methods=['GET', 'POST'])
 def edit_chapter(chapter_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the chapter by its ID or return a 404 error.
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = get_live_or_404(Chapter, chapter_id)
     # If the form data is submitted, update the chapter name and chapter description from the form.
     if request.method == 'POST':
         chapter.name = request.form.get('name')
         chapter.description = request.form.get('description')
         # Update any additional fields if needed.
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Chapter updated successfully.', 'success')
         return redirect(url_for('view_subject', subject_id=chapter.subject.id))
@@ -544,30 +3632,52 @@ def edit_chapter(chapter_id):
     return render_template('edit_chapter.html', chapter=chapter)
 
 # Admin Delete a Chapter
-@app.route('/admin/chapter/delete/<int:chapter_id>')
+@route('/admin/chapter/delete/<int:chapter_id>')
 def delete_chapter(chapter_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the chapter or return a 404 error if not found.
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = get_live_or_404(Chapter, chapter_id)
     subject_id = chapter.subject.id
-    db.session.delete(chapter)
-    db.session.commit()
-    flash('Chapter deleted successfully.', 'info')
+    # Remove the chapter and everything below it; large chapters are purged in the background.
+    if delete_chapter_tree(chapter.id):
+        flash('Chapter deleted. Its quizzes and attempts are being removed in the background.', 'info')
+    else:
+        flash('Chapter deleted successfully.', 'info')
     # Redirect to the subject view page.
     return redirect(url_for('view_subject', subject_id=subject_id))
 
+# Admin Clone a Chapter, with its quizzes and questions, into any subject
+@route('/admin/chapter/clone/<int:chapter_id>', methods=['GET', 'POST'])
+def clone_chapter_route(chapter_id):
+    #  Verify if the current user is an admin. Flash an error message if not authorized.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    chapter = get_live_or_404(Chapter, chapter_id)
+    # If the form is submitted, copy the chapter into the chosen subject, optionally moving the quiz dates.
+    if request.method == 'POST':
+        target = get_live_or_404(Subject, request.form.get('target_id', type=int))
+        shift_days = quiz_date_shift(_clone_start_date(), Quiz.chapter_id == chapter.id, Quiz.deleted_at.is_(None))
+        new_chapter_id = clone_chapter(chapter.id, target.id, shift_days)
+        flash('Chapter cloned successfully.', 'success')
+        return redirect(url_for('view_chapter', chapter_id=new_chapter_id))
+    # Render the clone form with the available subjects for GET requests.
+    targets = [(subject.id, subject.name) for subject in Subject.query.filter(Subject.deleted_at.is_(None))]
+    return render_template('clone.html', kind='Chapter', source_label=chapter.name,
+                           target_kind='Subject', targets=targets, selected_id=chapter.subject_id)
+
 # ---------------------- CRUD for Quizzes -----------------------------
 # Admin Create a Quiz
-@app.route('/admin/quiz/create/<int:chapter_id>', methods=['GET', 'POST'])
+@route('/admin/quiz/create/<int:chapter_id>', methods=['GET', 'POST'])
 def create_quiz(chapter_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = get_live_or_404(Chapter, chapter_id)
     # If form data is submitted, process the quiz creation form submission by parsing and localizing date/time inputs, setting defaults, and flashing an error if the scheduled time is missing.
     if request.method == 'POST':
         date_str = request.form.get('date_of_quiz')
@@ -579,6 +3689,9 @@ def create_quiz(chapter_id):
         time_duration = request.form['time_duration']
         remarks = request.form['remarks']
         question_limit = request.form.get('question_limit', type=int) or 10
+        # Question pool settings: draw from the quiz or the whole chapter, optionally per difficulty.
+        pool_scope = request.form.get('pool_scope') or 'quiz'
+        stratify_by_difficulty = 'stratify_by_difficulty' in request.form
         scheduled_at_str = request.form.get('scheduled_at')
         if scheduled_at_str:
             scheduled_dt = datetime.strptime(scheduled_at_str, '%Y-%m-%dT%H:%M')
@@ -588,9 +3701,11 @@ def create_quiz(chapter_id):
             return render_template('create_quiz.html', chapter=chapter)
         # Create a new Quiz object with the collected data.
         quiz = Quiz(chapter=chapter, date_of_quiz=quiz_date, time_duration=time_duration,
-                    remarks=remarks, question_limit=question_limit, scheduled_at=scheduled_at)
+                    remarks=remarks, question_limit=question_limit, scheduled_at=scheduled_at,
+                    pool_scope=pool_scope, stratify_by_difficulty=stratify_by_difficulty)
         # Add the new quiz to the session.
         db.session.add(quiz)
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Quiz created successfully.', 'success')
         # Redirect to the chapter view page.
@@ -599,14 +3714,14 @@ def create_quiz(chapter_id):
     return render_template('create_quiz.html', chapter=chapter)
 
 # Admin Edit the Quiz
-@app.route('/admin/quiz/edit/<int:quiz_id>', methods=['GET', 'POST'])
+@route('/admin/quiz/edit/<int:quiz_id>', methods=['GET', 'POST'])
 def edit_quiz(quiz_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the quiz by its ID or return a 404 error.
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_live_or_404(Quiz, quiz_id)
     # When the form is submitted via a POST request, the code updates quiz details by parsing and validating the submitted form data.
     if request.method == 'POST':
         date_str = request.form.get('date_of_quiz')
@@ -615,11 +3730,19 @@ def edit_quiz(quiz_id):
             quiz.date_of_quiz = dt
         quiz.time_duration = request.form.get('time_duration')
         quiz.remarks = request.form.get('remarks')
+        # Settings that change how questions are drawn; remarks, dates and duration do not.
+        draw_settings = (quiz.question_limit, quiz.pool_scope, quiz.stratify_by_difficulty)
         quiz.question_limit = request.form.get('question_limit', type=int)
+        quiz.pool_scope = request.form.get('pool_scope') or 'quiz'
+        quiz.stratify_by_difficulty = 'stratify_by_difficulty' in request.form
         scheduled_at_str = request.form.get('scheduled_at')
         if scheduled_at_str:
             scheduled_dt = datetime.strptime(scheduled_at_str, '%Y-%m-%dT%H:%M')
             quiz.scheduled_at = LOCAL_TZ.localize(scheduled_dt)
+        # Only this quiz draws differently; the chapter pool itself is unchanged.
+        if (quiz.question_limit, quiz.pool_scope, quiz.stratify_by_difficulty) != draw_settings:
+            quiz.version += 1
+        bump_cache_version('catalog')
         db.session.commit()
         flash('Quiz updated successfully.', 'success')
           # Redirect to the quiz view page.
@@ -628,33 +3751,56 @@ def edit_quiz(quiz_id):
     return render_template('edit_quiz.html', quiz=quiz)
 
 # Admin
-@app.route('/admin/quiz/delete/<int:quiz_id>')
+@route('/admin/quiz/delete/<int:quiz_id>')
 def delete_quiz(quiz_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the quiz by its ID or return a 404 error.
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_live_or_404(Quiz, quiz_id)
     chapter_id = quiz.chapter.id
-    db.session.delete(quiz)
-    db.session.commit()
-    flash('Quiz deleted successfully.', 'info')
+    # Remove the quiz with its questions and attempts; large quizzes are purged in the background.
+    if delete_quiz_tree(quiz.id):
+        flash('Quiz deleted. Its questions and attempts are being removed in the background.', 'info')
+    else:
+        flash('Quiz deleted successfully.', 'info')
       # Redirect to the chapter view page.
     return redirect(url_for('view_chapter', chapter_id=chapter_id))
 
 
 
+# Admin Clone a Quiz, with its questions, into any chapter
+@route('/admin/quiz/clone/<int:quiz_id>', methods=['GET', 'POST'])
+def clone_quiz_route(quiz_id):
+    #  Verify if the current user is an admin. Flash an error message if not authorized.
+    if session.get('role') != 'admin':
+        flash('Unauthorized access!', 'danger')
+        return redirect(url_for('admin_login'))
+    quiz = get_live_or_404(Quiz, quiz_id)
+    # If the form is submitted, copy the quiz into the chosen chapter, optionally moving its dates.
+    if request.method == 'POST':
+        target = get_live_or_404(Chapter, request.form.get('target_id', type=int))
+        new_quiz_id = clone_quiz(quiz.id, target.id, quiz_date_shift(_clone_start_date(), Quiz.id == quiz.id))
+        flash('Quiz cloned successfully.', 'success')
+        return redirect(url_for('view_quiz', quiz_id=new_quiz_id))
+    # Render the clone form with the available chapters for GET requests.
+    targets = [(chapter.id, f'{chapter.subject.name} / {chapter.name}')
+               for chapter in Chapter.query.join(Subject, Subject.id == Chapter.subject_id).filter(
+                   Chapter.deleted_at.is_(None), Subject.deleted_at.is_(None))]
+    return render_template('clone.html', kind='Quiz', source_label=f'Quiz #{quiz.id} ({quiz.date_of_quiz})',
+                           target_kind='Chapter', targets=targets, selected_id=quiz.chapter_id)
+
 # ---------------------- CRUD for Questions -----------------------------
 # Route for creating a new question for a given quiz.
-@app.route('/admin/question/create/<int:quiz_id>', methods=['GET', 'POST'])
+@route('/admin/question/create/<int:quiz_id>', methods=['GET', 'POST'])
 def create_question(quiz_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash('Unauthorized access!', 'danger')
         return redirect(url_for('admin_login'))
     # Retrieve the quiz by its ID or return a 404 error.
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_live_or_404(Quiz, quiz_id)
     # If the form is submitted, get the question text, the options and the explanation from the form.
     if request.method == 'POST':
         question_statement = request.form['question_statement']
@@ -665,6 +3811,7 @@ def create_question(quiz_id):
         correct_option = request.form['correct_option']
         # Now include the explanation field.
         explanation = request.form.get('explanation')  # Explanation is optional.
+        difficulty = request.form.get('difficulty', type=int)  # Difficulty is optional.
         
         question = Question(
             quiz=quiz,
@@ -674,9 +3821,11 @@ def create_question(quiz_id):
             option3=option3,
             option4=option4,
             correct_option=correct_option,
-            explanation=explanation
+            explanation=explanation,
+            difficulty=difficulty
         )
         db.session.add(question)
+        question_pool_changed(quiz.chapter_id, quiz.id)
         db.session.commit()
         flash("Question created successfully.", "success")
         # Redirect to the quiz view page.
@@ -685,7 +3834,7 @@ def create_question(quiz_id):
     return render_template('create_question.html', quiz=quiz)
 
 # Route for editing an existing question for a given quiz.
-@app.route('/admin/question/edit/<int:question_id>', methods=['GET', 'POST'])
+@route('/admin/question/edit/<int:question_id>', methods=['GET', 'POST'])
 def edit_question(question_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
@@ -702,6 +3851,11 @@ def edit_question(question_id):
         question.option4 = request.form.get('option4')
         question.correct_option = request.form.get('correct_option')
         question.explanation = request.form.get('explanation')
+        # Pools hold question ids and difficulties only; other edits leave them unchanged.
+        difficulty = request.form.get('difficulty', type=int)
+        if difficulty != question.difficulty:
+            question_pool_changed(question.quiz.chapter_id, question.quiz_id)
+        question.difficulty = difficulty
         db.session.commit()
         flash('Question updated successfully.', 'success')
         # Redirect to the quiz view page.
@@ -710,7 +3864,7 @@ def edit_question(question_id):
     return render_template('edit_question.html', question=question)
 
 # Define the route for deleting a question.
-@app.route('/admin/question/delete/<int:question_id>')
+@route('/admin/question/delete/<int:question_id>')
 def delete_question(question_id):
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
@@ -719,6 +3873,7 @@ def delete_question(question_id):
     # Retrieve the question by its ID or return a 404 error.
     question = Question.query.get_or_404(question_id)
     quiz_id = question.quiz.id
+    question_pool_changed(question.quiz.chapter_id, quiz_id)
     db.session.delete(question)
     db.session.commit()
     flash('Question deleted successfully.', 'info')
@@ -726,45 +3881,32 @@ def delete_question(question_id):
     return redirect(url_for('view_quiz', quiz_id=quiz_id))
 
 # Route for the performance dashboard which shows various performance metrics.
-@app.route('/admin/performance_dashboard')
+@route('/admin/performance_dashboard')
 def performance_dashboard():
     #  Verify if the current user is an admin. Flash an error message if not authorized.
     if session.get('role') != 'admin':
         flash("Unauthorized access!", "danger")
         return redirect(url_for('admin_login'))
     
-    # Quiz Performance Trends: average score per day
-    scores = Score.query.order_by(Score.time_stamp_of_attempt).all()
-    from collections import defaultdict
-    daily_scores = defaultdict(list)
-    for s in scores:
-        day = s.time_stamp_of_attempt.strftime("%Y-%m-%d")
-        daily_scores[day].append(s.total_scored)
-    daily_labels = sorted(daily_scores.keys())
-    daily_avg = [sum(daily_scores[day]) / len(daily_scores[day]) for day in daily_labels]
+    # Quiz Performance Trends: average score per day (live attempts plus the archived rollups)
+    daily_totals = daily_attempt_totals()
+    daily_labels = sorted(daily_totals.keys())
+    daily_avg = [daily_totals[day][1] / daily_totals[day][0] for day in daily_labels]
 
-    # Category/Subject Analysis: average score per subject
-    subjects = Subject.query.all()
+    # Category/Subject Analysis: average score per subject, from per-quiz attempt totals
     subject_labels = []
     subject_avg = []
     subject_attempts = []
-    for subject in subjects:
-        all_scores = []
-        attempt_count = 0
-        for chapter in subject.chapters:
-            for quiz in chapter.quizzes:
-                for score in quiz.scores:
-                    all_scores.append(score.total_scored)
-                attempt_count += len(quiz.scores)
-        if all_scores:
-            subject_labels.append(subject.name)
-            subject_avg.append(sum(all_scores) / len(all_scores))
-            subject_attempts.append(attempt_count)
+    for name, average, attempts in subject_attempt_averages():
+        subject_labels.append(name)
+        subject_avg.append(average)
+        subject_attempts.append(attempts)
     
-    # Leaderboard: users ranked by points
-    users = User.query.filter_by(role='user').order_by(User.points.desc()).all()
+    # Leaderboard: users ranked by points (including the points kept in the score shards)
+    points = user_points()
+    users = sorted(User.query.filter_by(role='user').all(), key=lambda user: points[user.id], reverse=True)
     leaderboard_names = [user.full_name for user in users]
-    leaderboard_points = [user.points for user in users]
+    leaderboard_points = [points[user.id] for user in users]
 
     # Dummy data for Quiz Completion Time (in seconds) and Question Difficulty Analysis (in percentage)
     quiz_completion_labels = ["Quiz A", "Quiz B", "Quiz C"]
@@ -786,32 +3928,38 @@ def performance_dashboard():
                            question_difficulty_data=question_difficulty_data)
 
 # (Optional) API endpoint: Get all subjects as JSON
-@app.route('/api/subjects')
+@route('/api/subjects')
 def api_subjects():
-    subjects = Subject.query.all()
-    data = []
-    for sub in subjects:
-        data.append({'id': sub.id, 'name': sub.name, 'description': sub.description})
-    return jsonify(data)
+    # Served from the worker's catalog cache until a subject is created, edited or deleted.
+    return jsonify(cache_coherence.get('catalog', 'api_subjects', load_api_subjects))
+
+def load_api_subjects():
+    return [sub._asdict() for sub in cache_coherence.get('catalog', 'subject_rows', load_subject_rows)]
+
+# Live subjects as SubjectRows, in id order.
+def load_subject_rows():
+    stmt = select(*(getattr(Subject, name) for name in SubjectRow._fields)).where(
+        Subject.deleted_at.is_(None)).order_by(Subject.id)
+    return [SubjectRow._make(row) for row in db.session.execute(stmt)]
 
 ##########################################
 #            USER ROUTES                 #
 ##########################################
 
 # User dashboard route, which displays the dashboard page for a logged-in user.
-@app.route('/user/dashboard')
+@route('/user/dashboard')
 def user_dashboard():
     #  Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
         flash('Please log in as a user.', 'danger')
         return redirect(url_for('user_login'))
-    # Retrieve all subjects from the database.
-    subjects = Subject.query.all()
+    # Live subjects, served from the worker's catalog cache.
+    subjects = cache_coherence.get('catalog', 'subject_rows', load_subject_rows)
     # Render the user dashboard template, passing the subjects.
     return render_template('user_dashboard.html', subjects=subjects)
 
 # Route for attempting a quiz. It handles both GET (display quiz) and POST (submit quiz) requests.
-@app.route('/user/quiz/<int:quiz_id>', methods=['GET', 'POST'])
+@route('/user/quiz/<int:quiz_id>', methods=['GET', 'POST'])
 def attempt_quiz(quiz_id):
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
@@ -819,7 +3967,7 @@ def attempt_quiz(quiz_id):
         #  Redirect to the user login page.
         return redirect(url_for('user_login'))
     # Retrieve the quiz by quiz_id or return 404 if not found.
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = get_live_or_404(Quiz, quiz_id)
     
     # Prevent early access to the quiz based on its scheduled start time.
     # Get the current time in the defined local timezone.
@@ -835,68 +3983,31 @@ def attempt_quiz(quiz_id):
         # Redirect to the user dashboard.
         return redirect(url_for('user_dashboard'))
     
-    # Define session keys to store the fixed order of quiz questions and randomized options.
-    quiz_order_key = f"quiz_order_{quiz_id}"
-    quiz_options_key = f"quiz_options_{quiz_id}"
-    
-    # On first load, if the order or options are not already in the session, generate and store them.
-    if quiz_order_key not in session or quiz_options_key not in session:
-        # Get all question IDs and shuffle thier order.
-        question_ids = [q.id for q in quiz.questions]
-        random.shuffle(question_ids)
-        # If a question limit is set and is less than total questions, limit the questions to that number.
-        if quiz.question_limit and quiz.question_limit < len(question_ids):
-            question_ids = question_ids[:quiz.question_limit]
-        # Save the fixed order of questions in the session.
-        session[quiz_order_key] = question_ids
-        
-        # Build a mapping of question id to randomized options.
-        # Initialize an empty dictionary to hold options mapping.
-        options_mapping = {}
-        # Iterate over each question in the quiz.
-        for q in quiz.questions:
-            # Process only if the question is in the selected order.
-            if q.id in session[quiz_order_key]:
-                # Initialize a list to hold the options for the question.
-                opts = []
-                if q.option1:
-                    opts.append(('option1', q.option1))
-                if q.option2:
-                    opts.append(('option2', q.option2))
-                if q.option3:
-                    opts.append(('option3', q.option3))
-                if q.option4:
-                    opts.append(('option4', q.option4))
-                # Randomize the order of options.
-                random.shuffle(opts)
-                # Map the string version of question id to its randomized options.
-                options_mapping[str(q.id)] = opts
-        # Save the options mapping in the session.
-        session[quiz_options_key] = options_mapping
+    # Session key holding the compact state of the attempt: [seed, quiz version, start time].
+    attempt_key = f"quiz_attempt_{quiz_id}"
     
-    # Retrieve the fixed question order and options mapping from session.
-    quiz_order = session.get(quiz_order_key, [])
-    options_mapping = session.get(quiz_options_key, {})
+    # On first load, start a new attempt with a fresh seed at the current quiz version.
+    seed, version, start, attempt_started = attempt_state(quiz)
     
-    # Reconstruct the list of questions in the randomized order with their corresponding options.
-    # Initialize an empty list to hold the reconstructed questions.
+    # Regenerate the paper of the attempt from its seed and version, with the options ordered by the seed.
+    # Build the list of questions in the randomized order with their corresponding options.
     randomized_questions = []
-    # Iterate over each question ID in the fixed order.
-    for qid in quiz_order:
-        # Find the question object matching the current id. If the question exists, append a dictionary containing question details, include the question ID, question text, randomized options, correct answer identifier and explanation text for the answer.
-        question_obj = next((q for q in quiz.questions if q.id == qid), None)
-        if question_obj:
-            randomized_questions.append({
-                'id': question_obj.id,
-                'question_statement': question_obj.question_statement,
-                'options': options_mapping.get(str(question_obj.id), []),
-                'correct_option': question_obj.correct_option,
-                'explanation': question_obj.explanation
-            })
+    for question_obj, options in attempt_questions(quiz, seed, version):
+        # Include the question ID, question text, randomized options, correct answer identifier and explanation text for the answer.
+        randomized_questions.append({
+            'id': question_obj.id,
+            'question_statement': question_obj.question_statement,
+            'options': options,
+            'correct_option': question_obj.correct_option,
+            'explanation': question_obj.explanation
+        })
     
     # Calculate total_seconds from quiz.time_duration (format "HH:MM")
-    parts = quiz.time_duration.split(':')
-    total_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60
+    total_seconds = quiz_duration_seconds(quiz)
+    # Register a freshly generated attempt with the active-attempt tracker.
+    if attempt_started:
+        attempt_tracker.started(quiz.id, session['user_id'], total_seconds)
+        record_activity('attempt_started', session['user_id'], quiz.id)
 
     # Handle form submission when the user interacts with the quiz.
     if request.method == 'POST':
@@ -909,6 +4020,8 @@ def attempt_quiz(quiz_id):
                 if ans:
                     saved_answers[str(q['id'])] = ans
             session['saved_answers'] = saved_answers
+            attempt_tracker.saved(quiz.id, session['user_id'])
+            record_activity('answers_saved', session['user_id'], quiz.id, detail=len(saved_answers))
             flash("Your answers have been saved.", "success")
             return redirect(url_for('attempt_quiz', quiz_id=quiz.id))
         # If the user clicked the 'submit' button, retrieve saved answers if they exist; otherwise, collect answers from the form.
@@ -921,35 +4034,103 @@ def attempt_quiz(quiz_id):
                     ans = request.form.get(str(q['id']))
                     if ans:
                         saved_answers[str(q['id'])] = ans
-            score = 0
-            for q in randomized_questions:
-                # If the saved answer for the question matches the correct option, increment the score.
-                if saved_answers.get(str(q['id'])) == q['correct_option']:
-                    score += 1
             user = User.query.get(session['user_id'])
-            user.points += score * 10  # Award points (example: 10 per correct answer)
-            new_score = Score(quiz_id=quiz.id, user_id=user.id, total_scored=score)
-            db.session.add(new_score)
-            db.session.commit()
-            flash(f'You scored {score} out of {len(randomized_questions)}.', 'success')
+            # Grade the attempt's paper and record the attempt once (a resent form gets the first result).
+            submission, created = submit_attempt(user, quiz, seed, clean_answers(saved_answers), version)
+            if created:
+                notify_score_committed(quiz.id)
+                attempt_tracker.finished(quiz.id, user.id, 'submitted')
+                record_activity('submitted', user.id, quiz.id,
+                                detail=f'{submission.total_scored}/{submission.question_count}')
+            flash(f'You scored {submission.total_scored} out of {submission.question_count}.', 'success')
             # Clear quiz-specific session data since the quiz is now submitted.
             session.pop('saved_answers', None)
-            session.pop(quiz_order_key, None)
-            session.pop(quiz_options_key, None)
+            session.pop(attempt_key, None)
             # Redirect to the public view of the chapter associated with the quiz.
             return redirect(url_for('view_chapter_public', chapter_id=quiz.chapter.id))
     
     # Retrieve any saved answers to pre-fill the form.
     saved_answers = session.get('saved_answers', {})
     # Render the quiz attempt template with the quiz details, randomized questions, saved answers, and total duration.
+    # The signed token lets the page submit the attempt in one request, even after going offline.
     return render_template('attempt_quiz.html',
                            quiz=quiz,
                            questions=randomized_questions,
                            saved_answers=saved_answers,
-                           total_seconds=total_seconds)
+                           total_seconds=total_seconds,
+                           attempt={'token': attempt_token(session['user_id'], quiz.id, seed, version, start),
+                                    'submit_url': url_for('submit_quiz_attempt', quiz_id=quiz.id),
+                                    'sync_url': url_for('sync_quiz_answers', quiz_id=quiz.id),
+                                    'auto_submit_url': url_for('auto_submit_quiz', quiz_id=quiz.id)})
+
+# The whole paper of the current attempt as one JSON document, without the correct answers.
+# The bundle does not change during the attempt, so clients may cache it until the deadline.
+@route('/user/quiz/<int:quiz_id>/bundle')
+def quiz_bundle(quiz_id):
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Please log in as a user.'}), 401
+    quiz = get_live_or_404(Quiz, quiz_id)
+    quiz_start = quiz.scheduled_at
+    if quiz_start.tzinfo is None:
+        quiz_start = LOCAL_TZ.localize(quiz_start)
+    if datetime.now(LOCAL_TZ) < quiz_start:
+        return jsonify({'error': 'This quiz is not yet available.'}), 403
+    seed, version, start, attempt_started = attempt_state(quiz)
+    bundle = attempt_bundle(quiz, seed, version, start)
+    if attempt_started:
+        attempt_tracker.started(quiz.id, session['user_id'], bundle['duration_seconds'])
+        record_activity('attempt_started', session['user_id'], quiz.id)
+    response = jsonify(bundle)
+    response.cache_control.private = True
+    response.cache_control.max_age = max(0, bundle['deadline'] - int(time.time()))
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
+# Opportunistic upload of the answers kept in the browser, so the server-side auto-submit
+# has them if the final submission never arrives. Only the session is updated.
+@route('/user/quiz/<int:quiz_id>/answers', methods=['POST'])
+def sync_quiz_answers(quiz_id):
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Please log in as a user.'}), 401
+    payload = request.get_json(silent=True) or {}
+    if load_attempt_token(payload.get('token'), session['user_id'], quiz_id) is None:
+        return jsonify({'error': 'Invalid attempt token.'}), 400
+    session['saved_answers'] = clean_answers(payload.get('answers'))
+    attempt_tracker.saved(quiz_id, session['user_id'])
+    record_activity('answers_saved', session['user_id'], quiz_id, detail=len(session['saved_answers']))
+    return '', 204
+
+# Single-shot final submission: {"token": ..., "answers": {question id: option key}}.
+# Idempotent per attempt, so the browser may retry until it gets an answer.
+@route('/user/quiz/<int:quiz_id>/submit', methods=['POST'])
+def submit_quiz_attempt(quiz_id):
+    if session.get('role') != 'user':
+        return jsonify({'error': 'Please log in as a user.'}), 401
+    quiz = get_live_or_404(Quiz, quiz_id)
+    payload = request.get_json(silent=True) or {}
+    attempt = load_attempt_token(payload.get('token'), session['user_id'], quiz.id)
+    if attempt is None:
+        return jsonify({'error': 'Invalid attempt token.'}), 400
+    seed, version, start = attempt
+    deadline = start + quiz_duration_seconds(quiz) + current_app.config['OFFLINE_SUBMIT_GRACE']
+    if time.time() > deadline:
+        return jsonify({'error': 'The submission window for this attempt has closed.'}), 403
+    user = User.query.get(session['user_id'])
+    submission, created = submit_attempt(user, quiz, seed, clean_answers(payload.get('answers')), version)
+    if created:
+        notify_score_committed(quiz.id)
+        attempt_tracker.finished(quiz.id, user.id, 'submitted')
+        record_activity('submitted', user.id, quiz.id, detail=f'{submission.total_scored}/{submission.question_count}')
+        flash(f'You scored {submission.total_scored} out of {submission.question_count}.', 'success')
+    # Clear quiz-specific session data since the quiz is now submitted.
+    session.pop('saved_answers', None)
+    session.pop(f'quiz_attempt_{quiz.id}', None)
+    return jsonify({'score': submission.total_scored,
+                    'total': submission.question_count,
+                    'redirect': url_for('view_chapter_public', chapter_id=quiz.chapter_id)})
 
 # Route for editing the user's profile.
-@app.route('/user/profile/edit', methods=['GET', 'POST'])
+@route('/user/profile/edit', methods=['GET', 'POST'])
 def edit_user_profile():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
@@ -984,33 +4165,33 @@ def edit_user_profile():
     return render_template('edit_user_profile.html', user=user)
 
 # Route for deleting the user's profile.
-@app.route('/user/profile/delete', methods=['POST'])
+@route('/user/profile/delete', methods=['POST'])
 def delete_user_profile():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
         flash("Unauthorized access!", "danger")
         return redirect(url_for('user_login'))
     user = User.query.get_or_404(session['user_id'])
-    db.session.delete(user)
-    db.session.commit()
+    # Delete the user together with all associated scores.
+    purge_user(user.id)
     session.clear()  # Log the user out
     flash("Your profile has been deleted.", "info")
     # Redirect to the home page.
     return redirect(url_for('index'))
 
-@app.route('/user/scores')
+@route('/user/scores')
 def user_scores():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
         flash('Please log in as a user.', 'danger')
         return redirect(url_for('user_login'))
-    # Retrieve all scores for the logged-in user.
-    scores = Score.query.filter_by(user_id=session['user_id']).all()
+    # Retrieve all scores for the logged-in user, including archived attempts.
+    scores = user_score_history(session['user_id'])
     # Render the template with the scores.
     return render_template('user_scores.html', scores=scores)
 
 # Route for displaying the user's quiz performance.
-@app.route('/user/quiz/performance')
+@route('/user/quiz/performance')
 def user_quiz_performance():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
@@ -1018,53 +4199,63 @@ def user_quiz_performance():
         return redirect(url_for('user_login'))
     user = User.query.get_or_404(session['user_id'])
     
-    # Query the Score table: for each quiz, get the maximum score for this user.
-    best_scores = db.session.query(
-        Score.quiz_id,
-        func.max(Score.total_scored).label("best_score")
-    ).filter(Score.user_id == user.id).group_by(Score.quiz_id).all()
-    
-    # Build a list of tuples: (quiz_date, quiz_name, best_score)
-    performance_data = []
-    # Iterate over each quiz and its best score.
-    for quiz_id, best_score in best_scores:
-        quiz = Quiz.query.get(quiz_id)
-        # Use a quiz.name attribute if available; otherwise, default to "Quiz #id".
-        quiz_name = getattr(quiz, 'name', f'Quiz #{quiz.id}')
-        # Use quiz.date_of_quiz as the release date.
-        performance_data.append((quiz.date_of_quiz, quiz_name, best_score))
-    
-    # Sort by release date (ascending)
-    performance_data.sort(key=lambda x: x[0])
+    # Percentile inputs from the histogram of the quiz: users below, equal to, and in total.
+    below = func.sum(case((QuizScoreHistogram.score < UserQuizBest.best_score, QuizScoreHistogram.user_count), else_=0))
+    equal = func.sum(case((QuizScoreHistogram.score == UserQuizBest.best_score, QuizScoreHistogram.user_count), else_=0))
+    total = func.sum(QuizScoreHistogram.user_count)
+    # One indexed query per score session: the user's best score per quiz joined with its histogram.
+    rows = []
+    for score_session in score_router.sessions():
+        rows.extend(score_session.query(
+            UserQuizBest.quiz_id,
+            UserQuizBest.best_score,
+            below,
+            equal,
+            total
+        ).join(QuizScoreHistogram, QuizScoreHistogram.quiz_id == UserQuizBest.quiz_id
+        ).filter(UserQuizBest.user_id == user.id
+        ).group_by(UserQuizBest.quiz_id).all())
+    # The quizzes' dates come from the main database; order by date.
+    quiz_dates = dict(db.session.query(Quiz.id, Quiz.date_of_quiz).filter(
+        Quiz.id.in_([row[0] for row in rows]))) if rows else {}
+    rows = sorted((row for row in rows if row[0] in quiz_dates), key=lambda row: quiz_dates[row[0]] or date.min)
     
-    # Prepare separate lists for labels (quiz names) and scores for Chart.js visualization.
-    labels = [item[1] for item in performance_data]
-    scores = [item[2] for item in performance_data]
+    # Prepare separate lists for labels (quiz names), scores and percentiles for Chart.js visualization.
+    labels = []
+    scores = []
+    percentiles = []
+    for quiz_id, best_score, below_count, equal_count, total_count in rows:
+        labels.append(f'Quiz #{quiz_id}')
+        scores.append(best_score)
+        # Mid-rank percentile: users strictly below plus half of the ties.
+        percentile = 100.0 * (below_count + 0.5 * equal_count) / total_count if total_count else 0.0
+        percentiles.append(round(percentile, 1))
     
     # Render the quiz performance template with the prepared labels and scores.
-    return render_template("user_quiz_performance.html", labels=labels, scores=scores)
+    return render_template("user_quiz_performance.html", labels=labels, scores=scores,
+                           percentiles=percentiles)
 
 # Public Route to view details of a subject (accessible to all users).
-@app.route('/subject/<int:subject_id>')
+@route('/subject/<int:subject_id>')
 def view_subject_public(subject_id):
     # Retrieve the subject or return 404 if not found.
-    subject = Subject.query.get_or_404(subject_id)
+    subject = get_live_or_404(Subject, subject_id)
     # Render the subject view template.
     return render_template('view_subject.html', subject=subject)
 
 # Public view of a chapter (for users) to see available quizzes
-@app.route('/chapter/<int:chapter_id>')
+@route('/chapter/<int:chapter_id>')
 def view_chapter_public(chapter_id):
     # Retrieve the chapter or return 404 if not found.
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = get_live_or_404(Chapter, chapter_id)
     # Render the chapter view template.
     return render_template('view_chapter.html', chapter=chapter)
 
 # Optional API endpoint for getting user scores as JSON for a given user.
-@app.route('/api/user/<int:user_id>/scores')
+@route('/api/user/<int:user_id>/scores')
 def api_user_scores(user_id):
-    # Retrieve all scores for the specified user.
-    scores = Score.query.filter_by(user_id=user_id).all()
+    # Retrieve all scores for the specified user, including archived attempts.
+    scores = user_score_history(user_id)
     # Initialize an empty list to store score data.
     data = []
     # Iterate over each score, append a dictionary with score details, include quiz ID, score and the timestamp. 
@@ -1078,7 +4269,7 @@ def api_user_scores(user_id):
     return jsonify(data)
 
 # API endpoint to get overall quiz statistics as JSON.
-@app.route('/api/quiz_stats')
+@route('/api/quiz_stats')
 def api_quiz_stats():
     # Count the total number of subjects, chapters, quizzes, questions, users and quiz attempts.
     subjects = Subject.query.count()
@@ -1086,7 +4277,7 @@ def api_quiz_stats():
     quizzes = Quiz.query.count()
     questions = Question.query.count()
     users = User.query.filter_by(role='user').count()
-    scores = Score.query.count()
+    scores = attempt_count()
     # Return the statistics as a JSON object.
     return jsonify({
         'subjects': subjects,
@@ -1097,63 +4288,77 @@ def api_quiz_stats():
         'scores': scores
     })
 
-# Route for auto-submitting a quiz when the time expires.
-@app.route('/user/quiz/<int:quiz_id>/auto_submit', methods=['GET'])
+# Route for auto-submitting a quiz when the time expires (the attempt page posts its form here).
+# Graded like any submission: against the paper of the token's seed and version, and only once per attempt.
+@route('/user/quiz/<int:quiz_id>/auto_submit', methods=['POST'])
 def auto_submit_quiz(quiz_id):
-    # Flash an info message indicating auto-submission.
-    flash("Time's up! Your quiz was auto‑submitted.", "info")
+    # Verify if the current user is a user. Flash an error message if not authorized.
+    if session.get('role') != 'user':
+        flash('Please log in as a user.', 'danger')
+        return redirect(url_for('user_login'))
     # Retrieve the quiz or return 404 if not found.
-    quiz = Quiz.query.get_or_404(quiz_id)
-    # Retrieve any saved answers from the session.
-    saved_answers = session.get('saved_answers', {})
-    # Convert the quiz questions to a list.
-    questions = list(quiz.questions)
-    # Shuffle the questions randomly.
-    random.shuffle(questions)
-    # Apply question limit if necessary.
-    if quiz.question_limit and quiz.question_limit < len(questions):
-        questions = questions[:quiz.question_limit]
-    # Initialize the score counter.
-    score = 0
-    # Iterate over each question. If the saved answer matches the correct option, increment the score.
-    for q in questions:
-        if saved_answers.get(str(q.id)) == q.correct_option:
-            score += 1
-    # Retrieve the current user.
+    quiz = get_live_or_404(Quiz, quiz_id)
+    # The attempt comes from the signed token; without one there is nothing to submit.
+    attempt = load_attempt_token(request.form.get('token'), session['user_id'], quiz.id)
+    if attempt is None:
+        flash('There is no quiz attempt to submit.', 'danger')
+        return redirect(url_for('view_chapter_public', chapter_id=quiz.chapter_id))
+    seed, version, start = attempt
+    deadline = start + quiz_duration_seconds(quiz) + current_app.config['OFFLINE_SUBMIT_GRACE']
+    if time.time() > deadline:
+        flash('The submission window for this attempt has closed.', 'danger')
+        return redirect(url_for('view_chapter_public', chapter_id=quiz.chapter_id))
+    # Answers saved earlier in the session, updated with those on the posted form.
+    answers = dict(session.get('saved_answers', {}))
+    answers.update((str(question_id), request.form[str(question_id)])
+                   for question_id in attempt_question_ids(quiz, seed, version) if request.form.get(str(question_id)))
     user = User.query.get(session['user_id'])
-    # Award points based on the score.
-    user.points += score * 10
-    # Create a new score record.
-    new_score = Score(quiz_id=quiz.id, user_id=user.id, total_scored=score)
-    db.session.add(new_score)
-    db.session.commit()
-    # Remove saved answers from the session.
+    submission, created = submit_attempt(user, quiz, seed, clean_answers(answers), version)
+    if created:
+        notify_score_committed(quiz.id)
+        attempt_tracker.finished(quiz.id, user.id, 'expired')
+        record_activity('auto_submitted', user.id, quiz.id,
+                        detail=f'{submission.total_scored}/{submission.question_count}')
+    # Remove saved answers and the attempt state from the session.
     session.pop('saved_answers', None)
-    # Remove the quiz start time key from the session if present.
     session.pop(f'quiz_start_{quiz_id}', None)
+    session.pop(f'quiz_attempt_{quiz_id}', None)
     # Flash the auto-submission score.
-    flash(f'Auto‑submitted: You scored {score} out of {len(questions)}.', 'success')
+    flash(f"Time's up! Auto‑submitted: You scored {submission.total_scored} out of {submission.question_count}.",
+          'success')
     # Redirect to the public view of the quiz's chapter.
-    return redirect(url_for('view_chapter_public', chapter_id=quiz.chapter.id))
+    return redirect(url_for('view_chapter_public', chapter_id=quiz.chapter_id))
 
 # Route to view the quiz results.
-@app.route('/user/quiz/results/<int:quiz_id>')
+@route('/user/quiz/results/<int:quiz_id>')
 def quiz_results(quiz_id):
-    # For demonstration, retrieve the quiz and its questions. Retrieve the quiz by ID or return 404.
-    quiz = Quiz.query.get_or_404(quiz_id)
-    # In a real app, retrieve the user's submitted answers and compare them.
-    return render_template('quiz_results.html', quiz=quiz)
+    # Retrieve the quiz by ID or return 404.
+    quiz = get_live_or_404(Quiz, quiz_id)
+    # Review the user's latest attempt exactly as it was shown, from the pool of the quiz version it was drawn at.
+    last_score = None
+    if session.get('user_id'):
+        last_score = score_router.session(quiz.id).query(Score).filter_by(
+            user_id=session['user_id'], quiz_id=quiz.id).order_by(Score.id.desc()).first()
+    if (last_score and last_score.attempt_seed is not None and last_score.quiz_version is not None
+            and question_pool(quiz, last_score.quiz_version) is not None):
+        questions = attempt_questions(quiz, last_score.attempt_seed, last_score.quiz_version)
+    else:
+        # Attempts recorded before seeds and pool snapshots: list the quiz's own questions with
+        # their options in stored order.
+        questions = [(question, [(key, getattr(question, key)) for key in ('option1', 'option2', 'option3', 'option4')
+                                 if getattr(question, key)]) for question in quiz.questions]
+    return render_template('quiz_results.html', quiz=quiz, questions=questions)
 
 # Route for the user's overall performance.
-@app.route('/user/performance')
+@route('/user/performance')
 def user_performance():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if session.get('role') != 'user':
         flash("Please log in as a user.", "danger")
         return redirect(url_for('user_login'))
     user = User.query.get_or_404(session['user_id'])
-    # Retrieve all quiz scores for the user, sorted by timestamp
-    scores = Score.query.filter_by(user_id=user.id).order_by(Score.time_stamp_of_attempt).all()
+    # Retrieve all quiz scores for the user (archived ones included), sorted by timestamp
+    scores = user_score_history(user.id)
     # Prepare lists of labels (timestamps) and corresponding scores for visualization.
     labels = [score.time_stamp_of_attempt.strftime("%Y-%m-%d %H:%M") for score in scores]
     data = [score.total_scored for score in scores]
@@ -1161,42 +4366,286 @@ def user_performance():
     return render_template("user_performance.html", labels=labels, data=data)
 
 # Route for displaying the leaderboard.
-@app.route('/leaderboard')
+@route('/leaderboard')
 def leaderboard():
     # Verify if the current user is a user. Flash an error message if not authorized.
     if not session.get('user_id'):
         flash("Please log in to view the leaderboard.", "warning")
         return redirect(url_for('user_login'))
     
-    # Subquery: For each user and quiz, get the maximum score.
-    subq = (
-        db.session.query(
-            Score.user_id,
-            Score.quiz_id,
-            func.max(Score.total_scored).label("best_score")
-        )
-        .group_by(Score.user_id, Score.quiz_id)
-        .subquery()
-    )
-    
-    # Main query: Left outer join all users with the subquery, using COALESCE to treat null as 0.
-    leaderboard_data = (
-        db.session.query(
-            User.full_name,
-            func.coalesce(func.sum(subq.c.best_score), 0).label("total_points")
-        )
-        .filter(User.role == 'user')
-        .outerjoin(subq, User.id == subq.c.user_id)
-        .group_by(User.id)
-        .order_by(func.coalesce(func.sum(subq.c.best_score), 0).desc())
-        .all()
-    )
+    # Sum of the best score per quiz for every user, from the live leaderboard's current standings
+    # (recomputed only when a score was committed since).
+    leaderboard_data = leaderboard_broadcaster.standings()
     # Render the leaderboard template with the gathered leaderboard data.
-    return render_template("leaderboard.html", leaderboard_data=leaderboard_data)
+    return render_template("leaderboard.html", leaderboard_data=leaderboard_data,
+                           poll_interval=current_app.config['LEADERBOARD_POLL_INTERVAL'])
+
+# Current standings as JSON, in the format of the stream's snapshot event.
+# Polled by browsers that could not get a live stream (no EventSource or the connection cap was reached);
+# served from the same cached standings as the streams, so polls do not recompute the leaderboard.
+@route('/leaderboard/standings')
+def leaderboard_standings():
+    # Verify that the visitor is logged in.
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    return jsonify(leaderboard_broadcaster.standings())
+
+# Live leaderboard updates as Server-Sent Events.
+# Sends a snapshot on connect and then only the rows whose rank or points changed.
+@route('/leaderboard/stream')
+def leaderboard_stream():
+    # Verify that the visitor is logged in.
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    client = leaderboard_broadcaster.subscribe()
+    # Refuse new streams once the per-process connection cap is reached; the page then polls
+    # /leaderboard/standings instead.
+    if client is None:
+        return Response('Too many live leaderboard connections.', status=503, headers={'Retry-After': '30'})
+    leaderboard_broadcaster.notify()
+    keepalive = current_app.config['SSE_KEEPALIVE']
+    # Each stream holds a request thread, so it is closed after SSE_MAX_DURATION seconds and the
+    # browser reconnects, giving the other viewers a chance at a slot.
+    closes_at = time.monotonic() + current_app.config['SSE_MAX_DURATION']
+
+    def generate():
+        try:
+            # Ask the browser to reconnect after 3 seconds if the stream drops.
+            yield 'retry: 3000\n\n'
+            yield leaderboard_broadcaster.snapshot_event()
+            while True:
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    yield client.get(timeout=min(keepalive, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            leaderboard_broadcaster.unsubscribe(client)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+##########################################
+#          APPLICATION FACTORY           #
+##########################################
+
+# Build and configure an application instance.
+# Settings come from the defaults below, then the file named by QUIZ_MASTER_SETTINGS, then
+# FLASK_-prefixed environment variables (e.g. FLASK_SECRET_KEY), then `test_config`.
+def create_app(test_config=None):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = '#KAS22f3000668'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Password verification: number of KDF worker processes (0 verifies inline in the request thread)
+    app.config['LOGIN_VERIFY_WORKERS'] = os.cpu_count() or 1
+    # Maximum number of logins waiting for or running a KDF in this process; the rest are turned away
+    app.config['LOGIN_MAX_PENDING'] = 64
+    # Seconds a login waits for a verification slot before it is rejected with 503
+    app.config['LOGIN_ADMISSION_TIMEOUT'] = 2.0
+    # Seconds a successful verification is remembered so repeated logins skip the KDF
+    app.config['LOGIN_CACHE_TTL'] = 300
+    app.config['LOGIN_CACHE_SIZE'] = 10000
+    # Live leaderboard (SSE): connection cap per process, per-client queue length,
+    # seconds between checks for scores committed by other workers, keep-alive interval and
+    # seconds after which a stream is closed (the browser reconnects).
+    # Every open stream holds one request thread of the worker (gunicorn.conf.py: threads = 8), so the
+    # cap stays well below the thread count; viewers over the cap poll LEADERBOARD_POLL_INTERVAL instead.
+    app.config['SSE_MAX_CONNECTIONS'] = 2
+    app.config['SSE_CLIENT_QUEUE'] = 16
+    app.config['SSE_POLL_INTERVAL'] = 2.0
+    app.config['SSE_KEEPALIVE'] = 15.0
+    app.config['SSE_MAX_DURATION'] = 300
+    # Seconds between refreshes of the leaderboard page when it has no live stream
+    app.config['LEADERBOARD_POLL_INTERVAL'] = 30
+    # Active-attempt tracker: seconds between writes of this worker's counts to the shared table,
+    # and grace period after the quiz deadline before an unsubmitted attempt counts as expired
+    app.config['ATTEMPT_TRACKER_FLUSH'] = 5.0
+    app.config['ATTEMPT_EXPIRY_GRACE'] = 60
+    # Deletes: rows removed per transaction, and the number of questions plus scores above which
+    # a subject/chapter/quiz is soft-deleted and purged in the background instead of inline
+    app.config['PURGE_CHUNK_SIZE'] = 2000
+    app.config['PURGE_INLINE_LIMIT'] = 20000
+    # Seconds a worker keeps the question-id array of a quiz or chapter pool before reloading it.
+    # Changes reach every worker through the cache version counters, so this only bounds memory.
+    app.config['QUESTION_POOL_TTL'] = 300
+    # Seconds between checks of the cache version counters (0 checks on every request)
+    app.config['CACHE_CHECK_INTERVAL'] = 1.0
+    # Token buckets per user and endpoint: endpoint -> (burst capacity, seconds to refill it completely)
+    app.config['RATE_LIMITS'] = {
+        'attempt_quiz': (30, 60.0),
+        'auto_submit_quiz': (3, 60.0),
+        'quiz_bundle': (30, 60.0),
+        'sync_quiz_answers': (30, 60.0),
+        'submit_quiz_attempt': (10, 60.0),
+    }
+    # Seconds between reloads of the blocks shared by all workers, and bucket count before pruning
+    app.config['RATE_LIMIT_SYNC_INTERVAL'] = 1.0
+    app.config['RATE_LIMIT_MAX_BUCKETS'] = 10000
+    # Quiz submissions written concurrently by all workers of the host, where their slot lock files
+    # live, seconds one waits for a slot before being answered with 429 (polling every
+    # WRITE_SLOT_POLL_INTERVAL seconds), and the Retry-After sent then
+    app.config['WRITE_MAX_INFLIGHT'] = 8
+    app.config['WRITE_SLOT_DIR'] = os.path.join(app.instance_path, 'write_slots')
+    app.config['WRITE_ADMISSION_TIMEOUT'] = 1.0
+    app.config['WRITE_SLOT_POLL_INTERVAL'] = 0.01
+    app.config['WRITE_RETRY_AFTER'] = 2
+    # Seconds after an attempt's deadline in which a submission made offline is still accepted
+    app.config['OFFLINE_SUBMIT_GRACE'] = 900
+    # Activity log: events buffered per worker, seconds between flushes, rows per INSERT,
+    # and events per page of the admin view
+    app.config['ACTIVITY_BUFFER_SIZE'] = 50000
+    app.config['ACTIVITY_FLUSH_INTERVAL'] = 2.0
+    app.config['ACTIVITY_FLUSH_BATCH'] = 1000
+    app.config['ACTIVITY_PAGE_SIZE'] = 100
+    # Score retention: attempts older than this many days are moved to score_archive by
+    # "flask archive-scores", in transactions of ARCHIVE_CHUNK_SIZE rows with ARCHIVE_PAUSE seconds between them
+    app.config['SCORE_RETENTION_DAYS'] = 365
+    app.config['ARCHIVE_CHUNK_SIZE'] = 1000
+    app.config['ARCHIVE_PAUSE'] = 0.05
+    # Roster import: rows per duplicate check and INSERT, and processes hashing the passwords
+    app.config['ROSTER_CHUNK_SIZE'] = 500
+    app.config['ROSTER_HASH_WORKERS'] = os.cpu_count() or 1
+    # Where uploaded rosters wait for their import job
+    app.config['ROSTER_UPLOAD_DIR'] = os.path.join(app.instance_path, 'roster_uploads')
+    # Largest request body accepted (roster uploads); larger requests get 413 Request Entity Too Large
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    # Partitioned score storage: number of SQLite shard files holding the attempts (0 keeps them in
+    # the main database), what picks a quiz's shard ('subject' or 'quiz'), and the shard URI
+    # ({} is the shard number). Move existing attempts with "flask split-scores" after changing these.
+    app.config['SCORE_SHARDS'] = 0
+    app.config['SCORE_SHARD_KEY'] = 'subject'
+    app.config['SCORE_SHARD_URI'] = 'sqlite:///scores_{}.db'
+    # Background jobs: handler threads per worker, seconds between polls of the job table,
+    # seconds without a heartbeat before a running job is resumed by another worker, minimum
+    # seconds between progress writes, jobs listed on the admin page, and where result files go
+    app.config['JOB_WORKERS'] = 2
+    app.config['JOB_POLL_INTERVAL'] = 2.0
+    app.config['JOB_STALE_AFTER'] = 60
+    app.config['JOB_PROGRESS_INTERVAL'] = 1.0
+    app.config['JOB_PAGE_SIZE'] = 50
+    app.config['JOB_RESULT_DIR'] = os.path.join(app.instance_path, 'job_results')
+    # Sampling profiler: longest profile in seconds, and distinct stacks and SQL statements kept per profile
+    app.config['PROFILER_MAX_DURATION'] = 300
+    app.config['PROFILER_MAX_STACKS'] = 5000
+    app.config['PROFILER_MAX_STATEMENTS'] = 500
+    # Report cards: rendering processes, cards per rendering task, and attempts listed per card
+    app.config['REPORT_WORKERS'] = os.cpu_count() or 1
+    app.config['REPORT_BATCH_SIZE'] = 100
+    app.config['REPORT_HISTORY_LIMIT'] = 20
+    # Rows fetched per round trip by the streamed listing pages
+    app.config['STREAM_BATCH_SIZE'] = 200
+    # Directory of compiled template bytecode shared by all workers (empty disables the cache);
+    # defaults to instance/jinja_cache
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.path.join(app.instance_path, 'jinja_cache')
+    # Seconds browsers may cache fingerprinted assets (see "flask build-assets")
+    app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600
+    # Load vendored files that are missing from static/vendor/ from their public CDN. Off by default:
+    # gunicorn refuses to start without them (see warm_up), as pages would lose Bootstrap and the charts
+    # on a network without internet access.
+    app.config['VENDOR_CDN_FALLBACK'] = False
+
+    # Deployment overrides
+    app.config.from_envvar('QUIZ_MASTER_SETTINGS', silent=True)
+    app.config.from_prefixed_env()
+    if test_config:
+        app.config.update(test_config)
+
+    # Templates compiled by one worker (or by the warm-up) are loaded from disk by the others.
+    # Cache files are keyed by template name and checked against the source's checksum.
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
+    # Each score shard is an extra SQLAlchemy bind.
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for index in range(app.config['SCORE_SHARDS']):
+        binds.setdefault(shard_bind_key(index), app.config['SCORE_SHARD_URI'].format(index))
+
+    # Bind the extensions, register the routes and the CLI commands.
+    db.init_app(app)
+    migrate.init_app(app, db)
+    for rule, view_func, options in _routes:
+        app.add_url_rule(rule, view_func=view_func, **options)
+    app.before_request(check_cache_versions)
+    app.before_request(admit_request)
+    app.before_request(profiler.request_started)
+    app.teardown_request(release_write_slot)
+    app.teardown_request(profiler.request_finished)
+    app.teardown_appcontext(score_router.remove)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(archive_scores_command)
+    app.cli.add_command(import_roster_command)
+    app.cli.add_command(split_scores_command)
+    app.cli.add_command(report_cards_command)
+    app.add_template_global(asset_url)
+    # Vendored files missing on disk, resolved once here instead of on every asset_url() call.
+    app.extensions['missing_vendor_assets'] = missing_vendor_assets(app.static_folder)
+    if app.extensions['missing_vendor_assets']:
+        app.logger.warning('Vendored assets missing from static/ (run "flask build-assets --fetch"): %s',
+                           ', '.join(app.extensions['missing_vendor_assets']))
+    return app
+
+# Warm-up before gunicorn forks its workers (gunicorn --preload, see gunicorn.conf.py).
+# Everything loaded here lives in the master process and is shared copy-on-write by the workers,
+# so their first request runs at steady-state latency.
+def warm_up(app):
+    # Fail the start-up, not the pages, when vendored assets are missing.
+    check_vendor_assets(app)
+    with app.app_context():
+        # Resolve all mapper relationships (otherwise done lazily by the first query of each worker).
+        configure_mappers()
+        # Compile every template into the Jinja environment's cache (and the shared bytecode cache).
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        # Record the current cache versions first, so the workers' first check keeps what is loaded
+        # below instead of treating every namespace as changed.
+        cache_coherence.check(0)
+        # Preload the catalog: the question pools of all live quizzes and the cached catalog entries
+        # read by the subject listings, the quiz list and the API.
+        for quiz in Quiz.query.filter(Quiz.deleted_at.is_(None)).all():
+            question_pool(quiz)
+        cache_coherence.get('catalog', 'subject_rows', load_subject_rows)
+        cache_coherence.get('catalog', 'api_subjects', load_api_subjects)
+        cache_coherence.get('catalog', 'quiz_subjects', load_quiz_subjects)
+        compute_leaderboard()
+        db.session.remove()
+        score_router.remove()
+        # Workers must not share the master's SQLite connections (main database and score shards).
+        for engine in db.engines.values():
+            engine.dispose()
+    # Move everything allocated so far out of the garbage collector's reach, so collections in the
+    # workers do not touch (and un-share) these pages.
+    gc.freeze()
+
+# Per-worker start-up after the fork.
+def on_worker_start(app):
+    with app.app_context():
+        # Drop connection objects inherited from the master without closing them for it.
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        # The attempt tracker was created in the master (gunicorn --preload); give it this worker's id
+        # so its rows in ActiveAttemptStat do not overwrite those of the other workers.
+        attempt_tracker.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        # Pick up queued jobs and the jobs of workers that stopped, and finish purging soft-deleted
+        # subjects, chapters and quizzes left over from a previous run.
+        job_runner.ensure_started()
+        if purge_pending():
+            request_purge()
+        db.session.remove()
+
+# Application instance used by "gunicorn app:app" and "flask --app app".
+app = create_app()
 
 ##########################################
 #             MAIN FUNCTION              #
 ##########################################
 
 if __name__ == '__main__':
+    # The development server initializes the database itself.
+    with app.app_context():
+        init_db()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,279 @@
+# benchmarks/hot_paths.py
+# Microbenchmarks and query budgets for the hot paths of app.py.
+#
+#   python benchmarks/hot_paths.py --output hot_paths.json
+#   python benchmarks/hot_paths.py --quick          # two smallest sizes per unit (CI)
+#
+# Units, each timed in isolation over synthetic datasets of increasing size:
+#   attempt_questions  question sampling and option shuffling of one attempt, by question pool size
+#   grading            submit_attempt (regenerate, grade and record an attempt), by attempts on record
+#   leaderboard        compute_leaderboard, by number of students
+#   dashboard          subject averages of the performance dashboard, by number of subjects
+# The scaling exponent of a unit is log(time ratio) / log(size ratio) between its smallest and
+# largest size: about 0 for a unit that should not depend on the size, 1 for a linear one and 2 for a
+# quadratic one. Each unit has a ceiling for it in UNITS.
+# Query budgets: every route in ROUTE_BUDGETS is requested once with the test client against a
+# small and a large dataset and its SQL statements are counted; the count must stay within the
+# route's budget on both, so a lazy load per row (N+1) fails as soon as the data grows.
+# Every dataset is built in a fresh process and SQLite file. All numbers are written as JSON so
+# runs can be compared across commits; the exit status is 1 when any check fails.
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as quiz_app  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+# unit -> (dataset dimension, sizes, maximum scaling exponent)
+UNITS = {
+    'attempt_questions': ('questions_per_quiz', [50, 500, 5000], 0.5),
+    'grading': ('attempts', [2000, 20000, 100000], 0.5),
+    'leaderboard': ('students', [250, 1000, 4000], 1.3),
+    'dashboard': ('subjects', [10, 40, 160], 1.3),
+}
+
+# Datasets of the query budget runs.
+BUDGET_DATASETS = [
+    {'students': 20, 'subjects': 3, 'questions_per_quiz': 20, 'attempts': 200},
+    {'students': 400, 'subjects': 30, 'questions_per_quiz': 60, 'attempts': 8000},
+]
+
+# (role, path) -> maximum SQL statements for one request; '{quiz}' and '{user}' are filled in.
+ROUTE_BUDGETS = {
+    ('admin', '/admin/dashboard'): 3,
+    ('admin', '/admin/users'): 3,
+    ('admin', '/admin/user_activities'): 4,
+    ('admin', '/admin/performance_dashboard'): 9,
+    ('admin', '/api/subjects'): 3,
+    ('admin', '/api/quiz_stats'): 9,
+    ('admin', '/api/user/{user}/scores'): 3,
+    ('user', '/user/dashboard'): 3,
+    ('user', '/user/scores'): 3,
+    ('user', '/user/performance'): 4,
+    ('user', '/user/quiz/performance'): 5,
+    ('user', '/leaderboard'): 3,
+    ('user', '/leaderboard/standings'): 3,
+    ('user', '/user/quiz/{quiz}'): 6,
+}
+
+STUDENT_PASSWORD = 'student'
+
+# Dataset parameters not being varied.
+DEFAULT_DATASET = {'students': 200, 'subjects': 5, 'questions_per_quiz': 30, 'attempts': 2000}
+
+
+def scenario_app(directory):
+    return quiz_app.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/database.db',
+        'JINJA_BYTECODE_CACHE_DIR': '',
+        'JOB_RESULT_DIR': os.path.join(directory, 'jobs'),
+        # Verify passwords inline: no login verification processes inside the benchmark processes.
+        'LOGIN_VERIFY_WORKERS': 0,
+    })
+
+
+# Subjects with two chapters of one quiz each, questions for every quiz, students and their
+# attempts (with best scores and histograms rebuilt from them). Rows are inserted in bulk.
+def build_dataset(app, students, subjects, questions_per_quiz, attempts, seed=1):
+    db = quiz_app.db
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with app.app_context():
+        quiz_app.init_db()
+        db.session.execute(quiz_app.Subject.__table__.insert(), [
+            {'id': i, 'name': f'Subject {i}', 'description': 'Synthetic subject'} for i in range(1, subjects + 1)])
+        db.session.execute(quiz_app.Chapter.__table__.insert(), [
+            {'id': i, 'subject_id': (i + 1) // 2, 'name': f'Chapter {i}', 'description': ''}
+            for i in range(1, 2 * subjects + 1)])
+        quizzes = 2 * subjects
+        db.session.execute(quiz_app.Quiz.__table__.insert(), [
+            {'id': i, 'chapter_id': i, 'date_of_quiz': (now - timedelta(days=i)).date(), 'time_duration': '00:30',
+             'remarks': '', 'question_limit': 20, 'scheduled_at': now - timedelta(days=i), 'pool_scope': 'quiz',
+             'stratify_by_difficulty': False, 'version': 1}
+            for i in range(1, quizzes + 1)])
+        db.session.execute(quiz_app.Question.__table__.insert(), [
+            {'quiz_id': quiz_id, 'question_statement': f'Question {n} of quiz {quiz_id}', 'option1': 'A',
+             'option2': 'B', 'option3': 'C', 'option4': 'D', 'correct_option': f'option{rng.randint(1, 4)}',
+             'explanation': '', 'difficulty': rng.randint(1, 3)}
+            for quiz_id in range(1, quizzes + 1) for n in range(questions_per_quiz)])
+        password = generate_password_hash(STUDENT_PASSWORD)
+        first_student = db.session.query(func.max(quiz_app.User.id)).scalar() + 1
+        db.session.execute(quiz_app.User.__table__.insert(), [
+            {'id': first_student + i, 'username': f'student{i}@example.com', 'password': password,
+             'full_name': f'Student {i}', 'qualification': 'B.Sc', 'role': 'user', 'points': 0}
+            for i in range(students)])
+        rows = [{'quiz_id': rng.randint(1, quizzes), 'user_id': first_student + rng.randrange(students),
+                 'time_stamp_of_attempt': now - timedelta(minutes=rng.randrange(60 * 24 * 90)),
+                 'total_scored': rng.randint(0, 20), 'attempt_seed': rng.getrandbits(48), 'quiz_version': 1}
+                for _ in range(attempts)]
+        for start in range(0, len(rows), 10000):
+            db.session.execute(quiz_app.Score.__table__.insert(), rows[start:start + 10000])
+        quiz_app.rebuild_best_scores(db.session)
+        db.session.execute(quiz_app.User.__table__.update().where(quiz_app.User.role == 'user').values(
+            points=select(func.coalesce(func.sum(quiz_app.UserQuizBest.best_score), 0) * 10)
+            .where(quiz_app.UserQuizBest.user_id == quiz_app.User.id).scalar_subquery()))
+        db.session.commit()
+    return first_student
+
+
+# Best time per call of `fn` over `repeat` rounds of `number` calls.
+def best_time(fn, number, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+# The callable measured for a unit, set up inside the app context.
+def unit_callable(unit, first_student, counter):
+    if unit == 'attempt_questions':
+        quiz = quiz_app.db.session.get(quiz_app.Quiz, 1)
+
+        def call():
+            quiz_app.attempt_questions(quiz, next(counter), quiz.version)
+        return call, 200
+    if unit == 'grading':
+        quiz = quiz_app.db.session.get(quiz_app.Quiz, 1)
+        user = quiz_app.db.session.get(quiz_app.User, first_student)
+        answers = {}
+
+        def call():
+            seed = next(counter)
+            quiz_app.submit_attempt(user, quiz, seed, answers, quiz.version)
+        return call, 50
+    if unit == 'leaderboard':
+        return quiz_app.compute_leaderboard, 5
+    if unit == 'dashboard':
+        return quiz_app.subject_attempt_averages, 5
+    raise ValueError(unit)
+
+
+# Worker: time one unit at one size against a fresh dataset.
+def time_unit(args):
+    unit, size = args
+    dimension = UNITS[unit][0]
+    directory = tempfile.mkdtemp(prefix='hot-paths-')
+    try:
+        app = scenario_app(directory)
+        first_student = build_dataset(app, **dict(DEFAULT_DATASET, **{dimension: size}))
+        with app.app_context():
+            counter = iter(range(1, 10 ** 9))
+            call, number = unit_callable(unit, first_student, counter)
+            call()  # warm caches (question pools, compiled statements)
+            return best_time(call, number)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# Worker: count the SQL statements of every budgeted route against one dataset.
+def count_queries(dataset):
+    directory = tempfile.mkdtemp(prefix='hot-paths-')
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    try:
+        app = scenario_app(directory)
+        first_student = build_dataset(app, **dataset)
+        clients = {'admin': app.test_client(), 'user': app.test_client()}
+        clients['admin'].post('/admin/login', data={'username': 'admin@example.com', 'password': 'admin'})
+        clients['user'].post('/user/login', data={'username': 'student0@example.com', 'password': STUDENT_PASSWORD})
+        counts = {}
+        for (role, path), budget in ROUTE_BUDGETS.items():
+            url = path.format(quiz=1, user=first_student)
+            del statements[:]
+            event.listen(Engine, 'before_cursor_execute', count)
+            try:
+                # Read the whole body: streamed pages run their queries while it is being sent.
+                response = clients[role].get(url)
+                response.get_data()
+                response.close()
+            finally:
+                event.remove(Engine, 'before_cursor_execute', count)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            counts[f'{role} {path}'] = len(statements)
+        # Write buffered activity events now; the exit-time flush would find the database gone.
+        quiz_app.activity_log.flush_at_exit()
+        return counts
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# Run fn(arg) in a freshly spawned process, so module-level caches never leak from one dataset into
+# the next. Spawned rather than forked, because importing app starts threads.
+def isolated(fn, arg):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(fn, arg).result()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot path microbenchmarks and query budgets')
+    parser.add_argument('--output', default='hot_paths.json', help='JSON results file')
+    parser.add_argument('--quick', action='store_true', help='two smallest sizes per unit only')
+    parser.add_argument('--units', nargs='+', choices=sorted(UNITS), default=sorted(UNITS))
+    parser.add_argument('--skip-queries', action='store_true', help='do not check the query budgets')
+    args = parser.parse_args()
+
+    results = {'revision': git_revision(), 'python': platform.python_version(),
+               'created_at': datetime.utcnow().isoformat(timespec='seconds'), 'units': {}, 'queries': {}}
+    failed = []
+    for unit in args.units:
+        dimension, sizes, max_exponent = UNITS[unit]
+        sizes = sizes[:2] if args.quick else sizes
+        seconds = [isolated(time_unit, (unit, size)) for size in sizes]
+        exponent = math.log(seconds[-1] / seconds[0]) / math.log(sizes[-1] / sizes[0])
+        ok = exponent <= max_exponent
+        results['units'][unit] = {'dimension': dimension, 'sizes': sizes, 'seconds_per_call': seconds,
+                                  'exponent': round(exponent, 3), 'max_exponent': max_exponent, 'ok': ok}
+        print(f'{unit:<18} ' + '  '.join(f'{dimension}={size}: {s * 1000:.3f} ms' for size, s in zip(sizes, seconds))
+              + f'  exponent {exponent:.2f} (max {max_exponent}) {"ok" if ok else "FAILED"}')
+        if not ok:
+            failed.append(unit)
+    if not args.skip_queries:
+        runs = [isolated(count_queries, dataset) for dataset in BUDGET_DATASETS]
+        for (role, path), budget in ROUTE_BUDGETS.items():
+            name = f'{role} {path}'
+            counts = [run[name] for run in runs]
+            ok = max(counts) <= budget
+            results['queries'][name] = {'counts': counts, 'budget': budget, 'ok': ok}
+            print(f'{name:<40} queries {counts} (budget {budget}) {"ok" if ok else "FAILED"}')
+            if not ok:
+                failed.append(name)
+    results['ok'] = not failed
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'Results written to {args.output}')
+    if failed:
+        print('Failed: ' + ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/login_burst.py
+# Simulates a class-wide login burst against the password verification layer of app.py.
+#
+#   python benchmarks/login_burst.py --students 200 --threads 32
+#
+# Every simulated student verifies a freshly hashed password once (cold burst) and once more
+# shortly afterwards (re-login served by the auth cache). The inline run verifies in the request
+# threads the way the old code path would; the pooled run uses the bounded verification pool.
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as quiz_app  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+
+# Minimal stand-in for a User row; check_login only reads username and password.
+class FakeUser:
+    def __init__(self, username, password_hash):
+        self.username = username
+        self.password = password_hash
+
+
+# Run one burst of logins over `threads` request threads and collect latencies and rejections.
+def run_burst(users, password, threads):
+    latencies = []
+    rejected = 0
+
+    def login(user):
+        start = time.perf_counter()
+        try:
+            with quiz_app.app.app_context():
+                quiz_app.check_login(user, password)
+        except quiz_app.LoginOverloaded:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for latency in executor.map(login, users):
+            if latency is None:
+                rejected += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, rejected
+
+
+# Reset the module-level pool and cache so each scenario starts cold.
+def reset(workers):
+    quiz_app.app.config['LOGIN_VERIFY_WORKERS'] = workers
+    if quiz_app._verify_pool is not None:
+        quiz_app._verify_pool.shutdown()
+    quiz_app._verify_pool = None
+    quiz_app._verify_slots = None
+    quiz_app._auth_cache.clear()
+
+
+def report(name, elapsed, latencies, rejected):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+    print(f'{name:<22} {len(latencies) / elapsed:8.1f} logins/s  '
+          f'p50 {statistics.median(latencies) * 1000 if latencies else 0:8.1f} ms  '
+          f'p95 {p95 * 1000:8.1f} ms  rejected {rejected}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Class-wide login burst benchmark')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='verification processes')
+    args = parser.parse_args()
+
+    password = 'correct horse battery staple'
+    password_hash = generate_password_hash(password)
+    users = [FakeUser(f'student{i}@example.com', password_hash) for i in range(args.students)]
+
+    for name, workers in (('inline', 0), ('pool', args.workers)):
+        reset(workers)
+        report(f'{name} cold burst', *run_burst(users, password, args.threads))
+        report(f'{name} re-login', *run_burst(users, password, args.threads))
+    reset(0)
+
+
+if __name__ == '__main__':
+    main()
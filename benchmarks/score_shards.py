@@ -0,0 +1,101 @@
+# benchmarks/score_shards.py
+# Measures quiz-submission write throughput with the attempts in the main database and with
+# them partitioned over score shards.
+#
+#   python benchmarks/score_shards.py --processes 8 --attempts 200 --shards 0 2 4
+#
+# Every process plays one gunicorn worker: it records `attempts` submissions (Score row, best
+# score, histogram and points, one commit each) for quizzes of random subjects. Each scenario
+# runs against fresh SQLite files in a temporary directory.
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as quiz_app  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+
+def scenario_app(directory, shards):
+    return quiz_app.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/database.db',
+        'SCORE_SHARDS': shards,
+        'SCORE_SHARD_URI': f'sqlite:///{directory}/scores_{{}}.db',
+        'JINJA_BYTECODE_CACHE_DIR': '',
+    })
+
+
+# `subjects` subjects with one chapter and one quiz each, and `users` students.
+def seed(app, subjects, users):
+    db = quiz_app.db
+    with app.app_context():
+        quiz_app.init_db()
+        for number in range(subjects):
+            subject = quiz_app.Subject(name=f'Subject {number}', description='')
+            chapter = quiz_app.Chapter(name='Chapter', description='', subject=subject)
+            db.session.add(quiz_app.Quiz(chapter=chapter, date_of_quiz=datetime.utcnow().date(),
+                                         time_duration='00:10', scheduled_at=datetime.utcnow()))
+        db.session.add_all(quiz_app.User(username=f'student{i}@example.com', password='x', role='user', points=0)
+                           for i in range(users))
+        db.session.commit()
+
+
+# Worker process: record `attempts` submissions; returns (recorded, lock timeouts).
+def submit(args):
+    directory, shards, attempts, worker = args
+    app = scenario_app(directory, shards)
+    rng = random.Random(worker)
+    recorded = failed = 0
+    with app.app_context():
+        quizzes = quiz_app.Quiz.query.all()
+        users = quiz_app.User.query.filter_by(role='user').all()
+        for _ in range(attempts):
+            quiz = rng.choice(quizzes)
+            try:
+                quiz_app.record_quiz_score(rng.choice(users), quiz, rng.randint(0, 10))
+                quiz_app.score_router.session(quiz.id).commit()
+                recorded += 1
+            except OperationalError:
+                quiz_app.score_router.session(quiz.id).rollback()
+                quiz_app.db.session.rollback()
+                failed += 1
+    return recorded, failed
+
+
+def run(shards, processes, attempts, subjects, users):
+    directory = tempfile.mkdtemp(prefix='score-shards-')
+    try:
+        seed(scenario_app(directory, shards), subjects, users)
+        start = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(submit, [(directory, shards, attempts, worker) for worker in range(processes)])
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    recorded = sum(done for done, _ in results)
+    failed = sum(errors for _, errors in results)
+    name = 'main database' if shards == 0 else f'{shards} shards'
+    print(f'{name:<14} {recorded / elapsed:8.1f} submissions/s  {recorded} recorded  {failed} lock timeouts')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score shard write throughput benchmark')
+    parser.add_argument('--processes', type=int, default=8, help='concurrent worker processes')
+    parser.add_argument('--attempts', type=int, default=200, help='submissions per process')
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4])
+    args = parser.parse_args()
+    for shards in args.shards:
+        run(shards, args.processes, args.attempts, args.subjects, args.users)
+
+
+if __name__ == '__main__':
+    main()
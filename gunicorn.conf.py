@@ -0,0 +1,25 @@
+# gunicorn.conf.py
+# Production settings for "gunicorn app:app".
+# Run "flask --app app init-db" once before the first start.
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+# Threaded workers keep live leaderboard streams from tying up a whole worker; each stream still holds
+# one thread, so SSE_MAX_CONNECTIONS (app.py) stays well below `threads`.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Load the application once in the master so the warm-up below is shared by all workers.
+preload_app = True
+
+
+# Runs in the master after the application is loaded and before any worker is forked.
+def when_ready(server):
+    from app import app, warm_up
+    warm_up(app)
+
+
+# Runs in each worker right after the fork.
+def post_fork(server, worker):
+    from app import app, on_worker_start
+    on_worker_start(app)
@@ -0,0 +1,108 @@
+# tests/conftest.py
+# Fixtures shared by the test suite: one application on a temporary SQLite database for the whole
+# session (the app keeps per-process caches, so every test works on its own subject tree and
+# students instead of a fresh database), logged-in clients and helpers to build quizzes.
+import itertools
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as quiz_app  # noqa: E402
+
+QUIZ_FORM = {'date_of_quiz': '2024-01-01', 'time_duration': '00:10', 'remarks': 'Test quiz',
+             'scheduled_at': '2024-01-01T10:00'}
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('quiz-master')
+    app = quiz_app.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/database.db',
+        'JINJA_BYTECODE_CACHE_DIR': '',
+        'JOB_RESULT_DIR': str(directory / 'jobs'),
+        'ROSTER_UPLOAD_DIR': str(directory / 'rosters'),
+        'WRITE_SLOT_DIR': str(directory / 'write_slots'),
+        # Verify passwords inline: no login verification processes inside the test process.
+        'LOGIN_VERIFY_WORKERS': 0,
+    })
+    with app.app_context():
+        quiz_app.init_db()
+    yield app
+    # Write buffered activity events while the database still exists.
+    quiz_app.activity_log.flush_at_exit()
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'admin@example.com', 'password': 'admin'})
+    return client
+
+
+# A logged-in student with a new account.
+@pytest.fixture
+def student(app):
+    username = f'student{next(_names)}@example.com'
+    client = app.test_client()
+    client.post('/register', data={'username': username, 'password': 'secret', 'full_name': username,
+                                   'qualification': 'B.Sc', 'dob': ''})
+    client.post('/user/login', data={'username': username, 'password': 'secret'})
+    with app.app_context():
+        client.user_id = quiz_app.User.query.filter_by(username=username).one().id
+    return client
+
+
+# Add a question whose correct answer is option2 to a quiz, through the admin route.
+def add_question(admin, quiz_id):
+    response = admin.post(f'/admin/question/create/{quiz_id}', data={
+        'question_statement': f'Question {next(_names)}', 'option1': 'A', 'option2': 'B', 'option3': 'C',
+        'option4': 'D', 'correct_option': 'option2', 'explanation': ''})
+    assert response.status_code == 302
+
+
+# Build a subject with one chapter and one quiz of `questions` questions, `question_limit` per attempt.
+# Returns (subject id, quiz id).
+@pytest.fixture
+def make_quiz(app, admin):
+    def make(questions=8, question_limit=5):
+        name = f'Subject {next(_names)}'
+        admin.post('/admin/subject/create', data={'name': name, 'description': ''})
+        with app.app_context():
+            subject_id = quiz_app.Subject.query.filter_by(name=name).one().id
+        admin.post(f'/admin/chapter/create/{subject_id}', data={'name': f'{name} chapter', 'description': ''})
+        with app.app_context():
+            chapter_id = quiz_app.Chapter.query.filter_by(subject_id=subject_id).one().id
+        admin.post(f'/admin/quiz/create/{chapter_id}', data=dict(QUIZ_FORM, question_limit=str(question_limit)))
+        with app.app_context():
+            quiz_id = quiz_app.Quiz.query.filter_by(chapter_id=chapter_id).one().id
+        for _ in range(questions):
+            add_question(admin, quiz_id)
+        return subject_id, quiz_id
+    return make
+
+
+# Number of recorded attempts of a user at a quiz.
+def score_count(app, user_id, quiz_id):
+    with app.app_context():
+        return sum(score_session.query(quiz_app.Score).filter_by(user_id=user_id, quiz_id=quiz_id).count()
+                   for score_session in quiz_app.score_router.sessions())
+
+
+# Wait for the job runner of this process to finish job `job_id`; returns the job.
+def wait_for_job(app, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    with app.app_context():
+        while True:
+            job = quiz_app.db.session.get(quiz_app.Job, job_id)
+            if job.status in ('done', 'failed', 'cancelled') or time.monotonic() > deadline:
+                quiz_app.db.session.expunge(job)
+                return job
+            quiz_app.db.session.remove()
+            time.sleep(0.1)
@@ -0,0 +1,81 @@
+# tests/test_activity_log.py
+# Regression tests for the activity log: events are buffered and written in batches by the flush,
+# the ring buffer drops the oldest events when full, per-user lookups use the composite index, and
+# the admin page shows what a student did.
+import re
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+import app as quiz_app
+
+# User ids no real account has, so the rows of these tests are easy to find.
+USER = 900001
+
+
+def rows_of(user_id):
+    return quiz_app.ActivityEvent.query.filter_by(user_id=user_id).order_by(quiz_app.ActivityEvent.id).all()
+
+
+def test_events_are_buffered_and_flushed_in_batches(app, monkeypatch):
+    # A log of its own whose flush thread sleeps through the test.
+    monkeypatch.setitem(app.config, 'ACTIVITY_FLUSH_INTERVAL', 3600)
+    monkeypatch.setitem(app.config, 'ACTIVITY_FLUSH_BATCH', 2)
+    log = quiz_app.ActivityLog()
+    inserts = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO activity_log'):
+            inserts.append(len(parameters) if executemany else 1)
+    with app.app_context():
+        for number in range(5):
+            log.record('answers_saved', USER, 7, detail=number)
+        # Recording does not touch the database.
+        assert rows_of(USER) == []
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            log.flush()
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        assert inserts == [2, 2, 1]
+        assert [(row.event, row.quiz_id, row.detail) for row in rows_of(USER)] == [
+            ('answers_saved', 7, str(number)) for number in range(5)]
+        # Nothing is written twice.
+        log.flush()
+        assert len(rows_of(USER)) == 5
+
+
+def test_full_buffer_drops_the_oldest_events(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'ACTIVITY_FLUSH_INTERVAL', 3600)
+    monkeypatch.setitem(app.config, 'ACTIVITY_BUFFER_SIZE', 3)
+    log = quiz_app.ActivityLog()
+    with app.app_context():
+        for number in range(5):
+            log.record('login', USER + 1, detail=number)
+        assert log.dropped == 2
+        log.flush()
+        assert [row.detail for row in rows_of(USER + 1)] == ['2', '3', '4']
+
+
+def test_per_user_lookups_use_the_composite_index(app):
+    with app.app_context():
+        indexes = {index['name']: index['column_names']
+                   for index in quiz_app.inspect(quiz_app.db.engine).get_indexes('activity_log')}
+        assert indexes['ix_activity_log_user_time'] == ['user_id', 'occurred_at']
+        assert indexes['ix_activity_log_occurred_at'] == ['occurred_at']
+        plan = ' '.join(row[-1] for row in quiz_app.db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT * FROM activity_log WHERE user_id = 1 ORDER BY occurred_at DESC LIMIT 101')))
+        assert 'ix_activity_log_user_time' in plan
+        assert 'TEMP B-TREE' not in plan
+
+
+def test_admin_page_lists_student_activity(app, admin, make_quiz, student):
+    _, quiz_id = make_quiz()
+    student.get(f'/user/quiz/{quiz_id}/bundle')
+    with app.app_context():
+        quiz_app.activity_log.flush()
+        assert [row.event for row in rows_of(student.user_id)] == ['login', 'attempt_started']
+    page = admin.get('/admin/activity', query_string={'user': student.user_id, 'event': 'attempt_started'})
+    assert page.status_code == 200
+    assert re.findall(r'<td>(attempt_started|login)</td>\s*<td>(\d*)</td>', page.get_data(as_text=True)) == [
+        ('attempt_started', str(quiz_id))]
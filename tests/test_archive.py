@@ -0,0 +1,67 @@
+# tests/test_archive.py
+# Regression test for score retention: old attempts move to score_archive with daily rollups, and
+# histories, totals and best scores read through all_scores() and the rollups stay the same.
+from datetime import datetime, timedelta
+
+import app as quiz_app
+from conftest import score_count, wait_for_job
+
+
+def submit(student, quiz_id, correct):
+    bundle = student.get(f'/user/quiz/{quiz_id}/bundle').get_json()
+    answers = {str(question['id']): 'option2' for question in bundle['questions'][:correct]}
+    response = student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': answers})
+    assert response.status_code == 200
+
+
+def observe(admin, quiz_id, user_ids):
+    return {
+        'history': {user_id: [(row['quiz_id'], row['score'], row['attempt_time'])
+                              for row in admin.get(f'/api/user/{user_id}/scores').get_json()] for user_id in user_ids},
+        'quiz_totals': quiz_app.quiz_attempt_totals()[quiz_id],
+        'best': sorted((best.user_id, best.best_score)
+                       for best in quiz_app.UserQuizBest.query.filter_by(quiz_id=quiz_id)),
+    }
+
+
+def test_archived_attempts_stay_visible(app, admin, make_quiz, student, monkeypatch):
+    monkeypatch.setitem(app.config, 'ARCHIVE_CHUNK_SIZE', 2)
+    monkeypatch.setitem(app.config, 'ARCHIVE_PAUSE', 0)
+    _, quiz_id = make_quiz()
+    submit(student, quiz_id, 2)
+    submit(student, quiz_id, 4)
+    with app.app_context():
+        # Age the attempts past the retention period, one day apart.
+        old = datetime.utcnow() - timedelta(days=app.config['SCORE_RETENTION_DAYS'] + 10)
+        scores = quiz_app.Score.query.filter_by(quiz_id=quiz_id).order_by(quiz_app.Score.id).all()
+        for offset, score in enumerate(scores):
+            score.time_stamp_of_attempt = old + timedelta(days=offset)
+        scores = [(score.id, score.total_scored, score.time_stamp_of_attempt) for score in scores]
+        quiz_app.db.session.commit()
+        before = observe(admin, quiz_id, [student.user_id])
+        attempts = quiz_app.attempt_count()
+
+    response = admin.post('/admin/jobs', data={'kind': 'archive_scores'})
+    assert response.status_code == 302
+    with app.app_context():
+        job_id = quiz_app.Job.query.filter_by(kind='archive_scores').order_by(quiz_app.Job.id.desc()).first().id
+    assert wait_for_job(app, job_id).status == 'done'
+
+    assert score_count(app, student.user_id, quiz_id) == 0
+    with app.app_context():
+        archived = quiz_app.ScoreArchive.query.filter_by(quiz_id=quiz_id).order_by(quiz_app.ScoreArchive.id).all()
+        assert [(row.id, row.total_scored, row.time_stamp_of_attempt) for row in archived] == scores
+        rollups = quiz_app.DailyQuizStat.query.filter_by(quiz_id=quiz_id).order_by(quiz_app.DailyQuizStat.day).all()
+        assert [(row.day, row.attempts, row.total_scored) for row in rollups] == [
+            (attempted_at.date(), 1, total_scored) for _, total_scored, attempted_at in scores]
+        # Reads over live and archived attempts do not change.
+        assert observe(admin, quiz_id, [student.user_id]) == before
+        assert quiz_app.attempt_count() == attempts
+
+    # A new live attempt is listed after the archived ones.
+    submit(student, quiz_id, 5)
+    with app.app_context():
+        history = quiz_app.user_score_history(student.user_id)
+        assert [(row.id, row.total_scored) for row in history] == [
+            (score_id, total_scored) for score_id, total_scored, _ in scores] + [(history[-1].id, 5)]
+        assert quiz_app.quiz_attempt_totals()[quiz_id] == [3, before['quiz_totals'][1] + 5]
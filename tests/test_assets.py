@@ -0,0 +1,27 @@
+# tests/test_assets.py
+# Vendored third-party assets: a missing file stops the server start-up unless the CDN fallback is on.
+import pytest
+
+import app as quiz_app
+
+
+def test_missing_vendor_assets_stop_start_up(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'missing_vendor_assets', ['vendor/chart.umd.js'])
+    monkeypatch.setitem(app.config, 'VENDOR_CDN_FALLBACK', False)
+    with pytest.raises(RuntimeError, match='vendor/chart.umd.js'):
+        quiz_app.check_vendor_assets(app)
+
+
+def test_cdn_fallback_only_for_missing_files(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'missing_vendor_assets', ['vendor/chart.umd.js'])
+    monkeypatch.setitem(app.config, 'VENDOR_CDN_FALLBACK', True)
+    quiz_app.check_vendor_assets(app)
+    with app.test_request_context():
+        assert quiz_app.asset_url('vendor/chart.umd.js') == quiz_app.VENDOR_ASSETS['vendor/chart.umd.js']
+        assert quiz_app.asset_url('css/style.css').startswith('/')
+
+
+def test_vendored_files_are_served_locally(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'missing_vendor_assets', [])
+    with app.test_request_context():
+        assert quiz_app.asset_url('vendor/bootstrap.min.css').startswith('/')
@@ -0,0 +1,66 @@
+# tests/test_attempt_tracker.py
+# The active-attempt tracker: attempts started in one worker and finished in another, expiry
+# counted once over all workers, and saves from the JSON sync endpoint.
+import app as quiz_app
+
+
+def quiz_summary(quiz_id):
+    rows = {row['quiz_id']: row for row in quiz_app.active_attempt_summary()}
+    return rows.get(quiz_id, {'active': 0, 'started': 0, 'saved': 0, 'submitted': 0, 'expired': 0})
+
+
+# Two trackers standing in for two gunicorn workers.
+def two_workers():
+    first, second = quiz_app.ActiveAttemptTracker(4), quiz_app.ActiveAttemptTracker(4)
+    first.worker_id, second.worker_id = 'test:1', 'test:2'
+    return first, second
+
+
+def test_attempt_finished_in_another_worker(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    first, second = two_workers()
+    with app.app_context():
+        first.started(quiz_id, student.user_id, 600)
+        assert quiz_summary(quiz_id)['active'] == 0
+        first.flush()
+        assert quiz_summary(quiz_id)['active'] == 1
+        # The submission reaches the other worker, whose events may even be written first.
+        second.finished(quiz_id, student.user_id, 'submitted')
+        second.flush()
+        first.flush()
+        summary = quiz_summary(quiz_id)
+    assert (summary['active'], summary['started'], summary['submitted'], summary['expired']) == (0, 1, 1, 0)
+
+
+def test_finish_written_before_start(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    first, second = two_workers()
+    with app.app_context():
+        first.started(quiz_id, student.user_id, 600)
+        second.finished(quiz_id, student.user_id, 'submitted')
+        second.flush()
+        first.flush()
+        assert quiz_summary(quiz_id)['active'] == 0
+
+
+def test_unfinished_attempt_expires_once(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    first, second = two_workers()
+    with app.app_context():
+        # Already past its deadline, grace included.
+        first.started(quiz_id, student.user_id, -app.config['ATTEMPT_EXPIRY_GRACE'] - 1)
+        first.flush()
+        second.flush()
+        first.flush()
+        summary = quiz_summary(quiz_id)
+    assert (summary['active'], summary['expired']) == (0, 1)
+
+
+def test_sync_counts_saves(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    bundle = student.get(f'/user/quiz/{quiz_id}/bundle').get_json()
+    answers = {str(bundle['questions'][0]['id']): 'option2'}
+    assert student.post(bundle['sync_url'], json={'token': bundle['token'], 'answers': answers}).status_code == 204
+    with app.app_context():
+        summary = quiz_summary(quiz_id)
+    assert (summary['active'], summary['started'], summary['saved']) == (1, 1, 1)
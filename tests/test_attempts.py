@@ -0,0 +1,100 @@
+# tests/test_attempts.py
+# Regression tests for quiz attempts: the paper pinned by the attempt's seed and quiz version,
+# idempotent submission and auto-submit.
+import re
+
+import app as quiz_app
+from conftest import add_question, score_count
+
+
+def start_attempt(student, quiz_id):
+    response = student.get(f'/user/quiz/{quiz_id}/bundle')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_submit_is_idempotent(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    bundle = start_attempt(student, quiz_id)
+    answers = {str(question['id']): 'option2' for question in bundle['questions']}
+    first = student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': answers})
+    assert first.status_code == 200
+    assert first.get_json()['score'] == 5
+    # A retry (e.g. after a lost response) returns the recorded result instead of grading again.
+    retry = student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': {}})
+    assert retry.status_code == 200
+    assert retry.get_json()['score'] == 5
+    assert score_count(app, student.user_id, quiz_id) == 1
+
+
+def test_submit_rejects_invalid_token(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    bundle = start_attempt(student, quiz_id)
+    response = student.post(bundle['submit_url'], json={'token': 'forged', 'answers': {}})
+    assert response.status_code == 400
+    assert score_count(app, student.user_id, quiz_id) == 0
+
+
+def test_token_pins_paper_and_version(app, admin, make_quiz, student):
+    _, quiz_id = make_quiz()
+    with app.app_context():
+        version = quiz_app.db.session.get(quiz_app.Quiz, quiz_id).version
+    bundle = start_attempt(student, quiz_id)
+    paper = [question['id'] for question in bundle['questions']]
+    # The token names the attempt by seed and version only.
+    serializer = quiz_app.URLSafeSerializer(app.config['SECRET_KEY'], salt='quiz-attempt')
+    assert serializer.loads(bundle['token'])[3:] == [version, bundle['started_at']]
+    # New questions change the pool, and with it the quiz version, in the middle of the attempt.
+    for _ in range(4):
+        add_question(admin, quiz_id)
+    with app.app_context():
+        assert quiz_app.db.session.get(quiz_app.Quiz, quiz_id).version > version
+    # The open attempt keeps its paper ...
+    assert [question['id'] for question in start_attempt(student, quiz_id)['questions']] == paper
+    # ... and is graded against it and recorded with the version it was drawn from.
+    response = student.post(bundle['submit_url'], json={
+        'token': bundle['token'], 'answers': {str(question_id): 'option2' for question_id in paper}})
+    assert response.status_code == 200
+    assert (response.get_json()['score'], response.get_json()['total']) == (5, 5)
+    with app.app_context():
+        score = quiz_app.Score.query.filter_by(user_id=student.user_id, quiz_id=quiz_id).one()
+        assert score.quiz_version == version
+    # The review shows the same questions, in the same order, although the pool has changed since.
+    page = student.get(f'/user/quiz/results/{quiz_id}').get_data(as_text=True)
+    statements = {question['id']: question['question_statement'] for question in bundle['questions']}
+    assert re.findall(r'<h5>([^<]+)</h5>', page) == [statements[question_id] for question_id in paper]
+
+
+def test_remarks_edit_keeps_quiz_version(app, admin, make_quiz):
+    _, quiz_id = make_quiz()
+    with app.app_context():
+        quiz = quiz_app.db.session.get(quiz_app.Quiz, quiz_id)
+        version = quiz.version
+        form = {'date_of_quiz': quiz.date_of_quiz.isoformat(), 'time_duration': quiz.time_duration,
+                'remarks': 'Changed remarks', 'question_limit': str(quiz.question_limit),
+                'scheduled_at': quiz.scheduled_at.strftime('%Y-%m-%dT%H:%M')}
+    admin.post(f'/admin/quiz/edit/{quiz_id}', data=form)
+    with app.app_context():
+        quiz = quiz_app.db.session.get(quiz_app.Quiz, quiz_id)
+        assert quiz.remarks == 'Changed remarks'
+        assert quiz.version == version
+
+
+def test_auto_submit_requires_an_attempt(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    assert student.get(f'/user/quiz/{quiz_id}/auto_submit').status_code == 405
+    response = student.post(f'/user/quiz/{quiz_id}/auto_submit', data={}, follow_redirects=True)
+    assert b'no quiz attempt' in response.data
+    assert score_count(app, student.user_id, quiz_id) == 0
+
+
+def test_auto_submit_records_once(app, make_quiz, student):
+    _, quiz_id = make_quiz()
+    page = student.get(f'/user/quiz/{quiz_id}').get_data(as_text=True)
+    token = re.search(r'name="token" value="([^"]+)"', page).group(1)
+    paper = re.findall(r'name="(\d+)" value="option2"', page)
+    form = dict({question_id: 'option2' for question_id in paper[:3]}, token=token)
+    response = student.post(f'/user/quiz/{quiz_id}/auto_submit', data=form, follow_redirects=True)
+    assert b'You scored 3 out of 5' in response.data
+    student.post(f'/user/quiz/{quiz_id}/auto_submit', data=form)
+    assert score_count(app, student.user_id, quiz_id) == 1
@@ -0,0 +1,65 @@
+# tests/test_cache_coherence.py
+# Regression tests for cross-worker cache coherence: each CacheCoherence instance below stands in
+# for one gunicorn worker's caches, kept coherent only through the cache_version counters.
+import app as quiz_app
+from conftest import add_question
+
+
+def subject_name(subject_id):
+    return quiz_app.db.session.get(quiz_app.Subject, subject_id).name
+
+
+def test_edit_in_one_worker_invalidates_the_others(app, admin, make_quiz):
+    subject_id, quiz_id = make_quiz()
+    workers = [quiz_app.CacheCoherence(), quiz_app.CacheCoherence()]
+    changed = []
+    workers[1].on_change('questions', lambda: changed.append('questions'))
+    with app.app_context():
+        for worker in workers:
+            worker.check(0)
+            assert worker.get('catalog', 'name', lambda: subject_name(subject_id)) == subject_name(subject_id)
+        original = subject_name(subject_id)
+        # The first check of a worker counts every namespace as changed.
+        assert changed == ['questions']
+        del changed[:]
+        # The second worker checks the counters at most once an hour from now on.
+        workers[1].check(3600)
+
+    admin.post(f'/admin/subject/edit/{subject_id}', data={'name': f'{original} renamed', 'description': ''})
+    with app.app_context():
+        quiz_app.db.session.remove()
+        # Until its next check a worker serves its cached copy ...
+        workers[1].check(3600)
+        assert workers[1].get('catalog', 'name', lambda: subject_name(subject_id)) == original
+        # ... and then loads the new value (recheck() stands in for the hour passing); only the
+        # catalog namespace changed.
+        workers[1].recheck()
+        for worker in workers:
+            worker.check(0)
+            assert worker.get('catalog', 'name', lambda: subject_name(subject_id)) == f'{original} renamed'
+        assert changed == []
+
+    # A question change bumps the "questions" namespace and runs its handlers once.
+    add_question(admin, quiz_id)
+    with app.app_context():
+        workers[1].check(0)
+        workers[1].check(0)
+    assert changed == ['questions']
+    # The worker that made the change sees it on its own next request.
+    assert f'{original} renamed' in [subject['name'] for subject in admin.get('/api/subjects').get_json()]
+
+
+def test_rolled_back_bump_keeps_the_caches(app):
+    worker = quiz_app.CacheCoherence()
+    with app.app_context():
+        worker.check(0)
+        worker.get('catalog', 'key', lambda: 'cached')
+        quiz_app.bump_cache_version('catalog')
+        quiz_app.db.session.rollback()
+        worker.check(0)
+        assert worker.get('catalog', 'key', lambda: 'reloaded') == 'cached'
+        # A committed bump does invalidate.
+        quiz_app.bump_cache_version('catalog')
+        quiz_app.db.session.commit()
+        worker.check(0)
+        assert worker.get('catalog', 'key', lambda: 'reloaded') == 'reloaded'
@@ -0,0 +1,67 @@
+# tests/test_clone.py
+# Regression tests for set-based cloning: questions land on the copy of their own quiz (the clone
+# relies on new rows getting consecutive ids) and quiz dates move by the requested shift.
+from datetime import date, timedelta
+
+import app as quiz_app
+from conftest import QUIZ_FORM, add_question
+
+
+# Chapters of a subject as [(name, [(date, scheduled_at, remarks, [question statements])])], by id.
+def subject_tree(app, subject_id):
+    with app.app_context():
+        chapters = quiz_app.Chapter.query.filter_by(subject_id=subject_id).order_by(quiz_app.Chapter.id)
+        return [(chapter.name, [quiz_tree(quiz) for quiz in sorted(chapter.quizzes, key=lambda quiz: quiz.id)])
+                for chapter in chapters]
+
+
+def quiz_tree(quiz):
+    return (quiz.date_of_quiz, quiz.scheduled_at, quiz.remarks,
+            [question.question_statement for question in sorted(quiz.questions, key=lambda question: question.id)])
+
+
+def shifted(tree, days):
+    return [(name, [(quiz_date + timedelta(days), scheduled_at + timedelta(days), remarks, statements)
+                    for quiz_date, scheduled_at, remarks, statements in quizzes]) for name, quizzes in tree]
+
+
+def test_clone_subject_round_trip(app, admin, make_quiz):
+    subject_id, _ = make_quiz(questions=3)
+    # Rows of another subject in between, so the source ids are not consecutive.
+    make_quiz(questions=2)
+    admin.post(f'/admin/chapter/create/{subject_id}', data={'name': 'Second chapter', 'description': ''})
+    with app.app_context():
+        chapter_id = quiz_app.Chapter.query.filter_by(subject_id=subject_id, name='Second chapter').one().id
+    for day in ('2024-01-08', '2024-01-15'):
+        admin.post(f'/admin/quiz/create/{chapter_id}',
+                   data=dict(QUIZ_FORM, date_of_quiz=day, remarks=f'Quiz of {day}', question_limit='5'))
+    with app.app_context():
+        quiz_ids = [quiz.id for quiz in quiz_app.Quiz.query.filter_by(chapter_id=chapter_id).order_by(quiz_app.Quiz.id)]
+    for quiz_id, questions in zip(quiz_ids, (2, 4)):
+        for _ in range(questions):
+            add_question(admin, quiz_id)
+    source = subject_tree(app, subject_id)
+
+    response = admin.post(f'/admin/subject/clone/{subject_id}', data={'name': 'Cloned', 'start_date': '2024-03-01'})
+    assert response.status_code == 302
+    with app.app_context():
+        clone_id = quiz_app.Subject.query.filter_by(name='Cloned').one().id
+    # The earliest quiz (2024-01-01) moves to 2024-03-01 and the others keep their spacing.
+    assert subject_tree(app, clone_id) == shifted(source, (date(2024, 3, 1) - date(2024, 1, 1)).days)
+    # The source is untouched.
+    assert subject_tree(app, subject_id) == source
+
+
+def test_clone_quiz_into_another_chapter(app, admin, make_quiz):
+    _, quiz_id = make_quiz(questions=3)
+    target_subject, _ = make_quiz(questions=1)
+    with app.app_context():
+        target_chapter = quiz_app.Chapter.query.filter_by(subject_id=target_subject).one().id
+        source = quiz_tree(quiz_app.db.session.get(quiz_app.Quiz, quiz_id))
+    response = admin.post(f'/admin/quiz/clone/{quiz_id}', data={'target_id': target_chapter})
+    assert response.status_code == 302
+    with app.app_context():
+        quizzes = quiz_app.Quiz.query.filter_by(chapter_id=target_chapter).order_by(quiz_app.Quiz.id).all()
+        assert len(quizzes) == 2
+        # Without a start date the dates are kept.
+        assert quiz_tree(quizzes[-1]) == source
@@ -0,0 +1,31 @@
+# tests/test_leaderboard.py
+# The leaderboard page and its polling endpoint share the live leaderboard's standings, which are
+# only recomputed when a score was committed.
+import app as quiz_app
+
+
+def test_standings_recomputed_only_after_a_score(app, make_quiz, student, monkeypatch):
+    _, quiz_id = make_quiz()
+    computations = []
+    compute_leaderboard = quiz_app.compute_leaderboard
+
+    def counting_compute_leaderboard():
+        computations.append(1)
+        return compute_leaderboard()
+    monkeypatch.setattr(quiz_app, 'compute_leaderboard', counting_compute_leaderboard)
+    monkeypatch.setitem(app.config, 'SSE_POLL_INTERVAL', 3600)
+
+    student.get('/leaderboard/standings')
+    del computations[:]
+    # Polls and page views without new scores are served from the cached standings.
+    for _ in range(3):
+        assert student.get('/leaderboard/standings').status_code == 200
+    assert student.get('/leaderboard').status_code == 200
+    assert computations == []
+
+    bundle = student.get(f'/user/quiz/{quiz_id}/bundle').get_json()
+    student.post(bundle['submit_url'], json={
+        'token': bundle['token'], 'answers': {str(question['id']): 'option2' for question in bundle['questions']}})
+    rows = {row['user_id']: row for row in student.get('/leaderboard/standings').get_json()}
+    assert len(computations) == 1
+    assert rows[student.user_id]['points'] > 0
@@ -0,0 +1,30 @@
+# tests/test_purge.py
+# Regression test for large deletes: the tree is soft-deleted at once, hidden everywhere, and its
+# rows are removed by the purge.
+import app as quiz_app
+from conftest import score_count, wait_for_job
+
+
+def test_soft_deleted_subject_is_hidden_and_purged(app, admin, make_quiz, student, monkeypatch):
+    subject_id, quiz_id = make_quiz()
+    bundle = student.get(f'/user/quiz/{quiz_id}/bundle').get_json()
+    student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': {}})
+    assert score_count(app, student.user_id, quiz_id) == 1
+
+    # Every tree counts as large: the delete only marks it and queues the purge job.
+    monkeypatch.setitem(app.config, 'PURGE_INLINE_LIMIT', 0)
+    response = admin.get(f'/admin/subject/delete/{subject_id}', follow_redirects=True)
+    assert b'being removed in the background' in response.data
+    assert subject_id not in [subject['id'] for subject in admin.get('/api/subjects').get_json()]
+    assert student.get(f'/user/quiz/{quiz_id}/bundle').status_code == 404
+
+    # The job runner of this process picks the job up.
+    with app.app_context():
+        job_id = quiz_app.Job.query.filter_by(kind='purge_deleted').order_by(quiz_app.Job.id.desc()).first().id
+    assert wait_for_job(app, job_id).status == 'done'
+    with app.app_context():
+        assert not quiz_app.purge_pending()
+        assert quiz_app.db.session.get(quiz_app.Subject, subject_id) is None
+        assert quiz_app.db.session.get(quiz_app.Quiz, quiz_id) is None
+        assert quiz_app.Question.query.filter_by(quiz_id=quiz_id).count() == 0
+    assert score_count(app, student.user_id, quiz_id) == 0
@@ -0,0 +1,19 @@
+# tests/test_query_budgets.py
+# The per-route SQL statement budgets of benchmarks/hot_paths.py, on its small and large datasets.
+# Each dataset is built and counted in a spawned process, as in the benchmark.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import hot_paths  # noqa: E402
+
+
+@pytest.mark.parametrize('dataset', hot_paths.BUDGET_DATASETS, ids=lambda dataset: f"{dataset['attempts']}-attempts")
+def test_route_query_budgets(dataset):
+    counts = hot_paths.isolated(hot_paths.count_queries, dataset)
+    over_budget = {f'{role} {path}': (counts[f'{role} {path}'], budget)
+                   for (role, path), budget in hot_paths.ROUTE_BUDGETS.items() if counts[f'{role} {path}'] > budget}
+    assert not over_budget, f'(queries, budget) per route over its budget: {over_budget}'
@@ -0,0 +1,59 @@
+# tests/test_roster_import.py
+# Regression tests for roster uploads: the file is imported by a background job whose result is a
+# per-row report, and files without the required columns are rejected at upload.
+import csv
+import io
+import os
+
+import app as quiz_app
+from conftest import wait_for_job
+
+
+def upload(admin, text):
+    return admin.post('/admin/users/import', data={'roster': (io.BytesIO(text.encode()), 'roster.csv')},
+                      content_type='multipart/form-data')
+
+
+def test_roster_upload_is_imported_by_a_job(app, admin, student, monkeypatch):
+    monkeypatch.setitem(app.config, 'ROSTER_HASH_WORKERS', 1)
+    with app.app_context():
+        existing = quiz_app.db.session.get(quiz_app.User, student.user_id).username
+    response = upload(admin, 'username,password,full_name\n'
+                             'roster1@example.com,pw1,Roster One\n'
+                             f'{existing},pw2,Already There\n'
+                             ',pw3,No Name\n')
+    # The request only queues the import.
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/admin/jobs')
+    with app.app_context():
+        job_id = quiz_app.Job.query.filter_by(kind='import_roster').order_by(quiz_app.Job.id.desc()).first().id
+    job = wait_for_job(app, job_id)
+    assert job.status == 'done'
+    # The upload, with its plain-text passwords, is gone once the job has run.
+    assert os.listdir(app.config['ROSTER_UPLOAD_DIR']) == []
+    report = admin.get(f'/admin/jobs/{job_id}/result')
+    assert report.status_code == 200
+    rows = list(csv.reader(io.StringIO(report.get_data(as_text=True))))
+    assert rows == [['line', 'username', 'status', 'message'],
+                    ['2', 'roster1@example.com', 'created', ''],
+                    ['3', existing, 'duplicate', 'already registered'],
+                    ['4', '', 'invalid', 'username and password are required']]
+    with app.app_context():
+        user = quiz_app.User.query.filter_by(username='roster1@example.com').one()
+        assert user.full_name == 'Roster One'
+        assert quiz_app.check_password_hash(user.password, 'pw1')
+
+
+def test_roster_without_required_columns_is_rejected(app, admin):
+    with app.app_context():
+        jobs = quiz_app.Job.query.count()
+    response = upload(admin, 'name,email\nOne,one@example.com\n')
+    assert b'header row with at least the columns username and password' in response.data
+    with app.app_context():
+        assert quiz_app.Job.query.count() == jobs
+
+
+def test_oversized_upload_is_refused(app, admin, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1024)
+    response = upload(admin, 'username,password\n' + 'user@example.com,secret\n' * 100)
+    assert response.status_code == 413
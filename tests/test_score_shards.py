@@ -0,0 +1,128 @@
+# tests/test_score_shards.py
+# Regression test for partitioned score storage: "flask split-scores" moves every per-attempt row
+# to the shard of its quiz, reads give the same answers before and after, and new attempts are
+# written to their shard only. The scenario needs two app configurations on one database, so it
+# runs in a spawned process, away from the caches of the session app.
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from multiprocessing import get_context
+
+import app as quiz_app
+
+SHARDS = 3
+
+
+# What the app reports about the recorded attempts, whatever their storage.
+def observe(users):
+    sessions = quiz_app.score_router.sessions()
+    return {
+        'history': {user.id: [(score.quiz_id, score.total_scored) for score in quiz_app.user_score_history(user.id)]
+                    for user in users},
+        'points': dict(quiz_app.user_points()),
+        'best': sorted((best.user_id, best.quiz_id, best.best_score)
+                       for session in sessions for best in session.query(quiz_app.UserQuizBest)),
+        'histogram': sorted((bucket.quiz_id, bucket.score, bucket.user_count)
+                            for session in sessions for bucket in session.query(quiz_app.QuizScoreHistogram)),
+    }
+
+
+# {table name: {quiz id: shard}} of the sharded rows, and the per-attempt rows left in the main database.
+def placement():
+    shards = {}
+    for index, session in enumerate(quiz_app.score_router.sessions()):
+        for model in quiz_app.SHARDED_MODELS:
+            if model is quiz_app.ShardUserPoints:
+                continue
+            for (quiz_id,) in session.query(model.quiz_id).distinct():
+                shards.setdefault(model.__tablename__, {}).setdefault(quiz_id, set()).add(index)
+    left = sum(quiz_app.db.session.query(model).count() for model in quiz_app.SHARDED_MODELS
+               if model is not quiz_app.ShardUserPoints)
+    return shards, left
+
+
+def submit(user, quiz, seed, correct):
+    paper = quiz_app.attempt_question_ids(quiz, seed, quiz.version)
+    answers = {str(question_id): 'option2' for question_id in paper[:correct]}
+    quiz_app.submit_attempt(user, quiz, seed, answers, quiz.version)
+
+
+def split_scenario(directory):
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{directory}/database.db',
+              'SCORE_SHARD_URI': f'sqlite:///{directory}/scores_{{}}.db', 'JINJA_BYTECODE_CACHE_DIR': '',
+              'JOB_RESULT_DIR': f'{directory}/jobs', 'LOGIN_VERIFY_WORKERS': 0}
+    db = quiz_app.db
+    app = quiz_app.create_app(config)
+    with app.app_context():
+        quiz_app.init_db()
+        for subject_number in range(SHARDS):
+            subject = quiz_app.Subject(name=f'Subject {subject_number}')
+            chapter = quiz_app.Chapter(name='Chapter', subject=subject)
+            for _ in range(2):
+                quiz = quiz_app.Quiz(chapter=chapter, date_of_quiz=date(2024, 1, 1), time_duration='00:10',
+                                     question_limit=3, scheduled_at=datetime(2024, 1, 1, 10))
+                for number in range(4):
+                    db.session.add(quiz_app.Question(quiz=quiz, question_statement=f'Q{number}', option1='A',
+                                                     option2='B', correct_option='option2'))
+            db.session.add(subject)
+        for number in range(4):
+            db.session.add(quiz_app.User(username=f'user{number}', password='-', role='user', points=0))
+        db.session.commit()
+        users = quiz_app.User.query.filter_by(role='user').order_by(quiz_app.User.id).all()
+        quizzes = quiz_app.Quiz.query.order_by(quiz_app.Quiz.id).all()
+        seed = 0
+        for user in users:
+            for quiz in quizzes:
+                for correct in (user.id % 3, (user.id + quiz.id) % 4):
+                    seed += 1
+                    submit(user, quiz, seed, correct)
+        user_ids = [user.id for user in users]
+        quiz_subjects = {quiz.id: quiz.chapter.subject_id for quiz in quizzes}
+        before = observe(users)
+
+    sharded = quiz_app.create_app(dict(config, SCORE_SHARDS=SHARDS))
+    output = sharded.test_cli_runner().invoke(args=['split-scores', '--chunk-size', '4']).output
+    with sharded.app_context():
+        users = quiz_app.User.query.filter(quiz_app.User.id.in_(user_ids)).order_by(quiz_app.User.id).all()
+        after = observe(users)
+        shards, left = placement()
+        expected = {quiz_id: {quiz_app.score_router.shard_of(quiz_id)} for quiz_id in quiz_subjects}
+        # Running the split again finds nothing to move.
+        moved_again = dict(quiz_app.split_scores(4))
+        # A new attempt is written to its quiz's shard, and its points next to it.
+        quiz = db.session.get(quiz_app.Quiz, max(quiz_subjects))
+        submit(users[0], quiz, seed + 1, 3)
+        shards_after_submit, left_after_submit = placement()
+        points_after_submit = dict(quiz_app.user_points())
+    return {'output': output, 'before': before, 'after': after, 'shards': shards, 'left': left,
+            'expected': expected, 'quiz_subjects': quiz_subjects, 'moved_again': moved_again,
+            'shards_after_submit': shards_after_submit, 'left_after_submit': left_after_submit,
+            'points_after_submit': points_after_submit, 'user': user_ids[0]}
+
+
+def test_split_scores_routes_rows_to_their_shard():
+    directory = tempfile.mkdtemp(prefix='score-shards-')
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            result = executor.submit(split_scenario, directory).result()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    assert 'score: moved 48 rows' in result['output']
+    # Reads see the same attempts, points, best scores and histograms after the split.
+    assert result['after'] == result['before']
+    # Every row of a quiz is in the quiz's shard, and nothing is left in the main database.
+    assert result['left'] == 0
+    for table in ('score', 'quiz_submission', 'user_quiz_best', 'quiz_score_histogram'):
+        assert result['shards'][table] == result['expected'], table
+    # Sharding by subject keeps the quizzes of a subject together and spreads the subjects.
+    by_subject = {}
+    for quiz_id, subject_id in result['quiz_subjects'].items():
+        by_subject.setdefault(subject_id, set()).update(result['expected'][quiz_id])
+    assert all(len(shards) == 1 for shards in by_subject.values())
+    assert len(set.union(*by_subject.values())) == SHARDS
+    assert result['moved_again'] == {}
+    assert result['left_after_submit'] == 0
+    assert result['shards_after_submit']['score'] == result['expected']
+    user = result['user']
+    assert result['points_after_submit'][user] == result['before']['points'][user] + 30
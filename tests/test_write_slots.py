@@ -0,0 +1,38 @@
+# tests/test_write_slots.py
+# Regression tests for write admission control: the WRITE_MAX_INFLIGHT slots are shared by every
+# worker of the host (each WriteSlots instance below stands in for one worker).
+import app as quiz_app
+
+
+def test_write_slots_are_shared_between_workers(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'WRITE_MAX_INFLIGHT', 2)
+    first, second = quiz_app.WriteSlots(), quiz_app.WriteSlots()
+    with app.app_context():
+        held = [first.acquire(0), first.acquire(0)]
+        assert None not in held
+        # The other worker finds every slot taken ...
+        assert second.acquire(0.05) is None
+        # ... until one is released.
+        first.release(held.pop())
+        slot = second.acquire(0)
+        assert slot is not None
+        first.release(held[0])
+        second.release(slot)
+
+
+def test_submission_without_a_slot_gets_429(app, make_quiz, student, monkeypatch):
+    monkeypatch.setitem(app.config, 'WRITE_MAX_INFLIGHT', 1)
+    monkeypatch.setitem(app.config, 'WRITE_ADMISSION_TIMEOUT', 0.05)
+    _, quiz_id = make_quiz()
+    bundle = student.get(f'/user/quiz/{quiz_id}/bundle').get_json()
+    other_worker = quiz_app.WriteSlots()
+    with app.app_context():
+        slot = other_worker.acquire(0)
+    try:
+        response = student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': {}})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == str(app.config['WRITE_RETRY_AFTER'])
+    finally:
+        other_worker.release(slot)
+    response = student.post(bundle['submit_url'], json={'token': bundle['token'], 'answers': {}})
+    assert response.status_code == 200